@@ -1,42 +1,116 @@
+import json
+import math
 import os
-import uuid
-from io import BytesIO
-from datetime import datetime
-from flask import Flask, render_template, request, session, redirect, url_for, flash, jsonify, send_file
+import zlib
+from datetime import date, datetime
+from flask import Blueprint, Flask, Response, current_app, render_template, request, session, redirect, url_for, flash, jsonify, stream_with_context
+from flask.cli import with_appcontext
 from functools import wraps
 import logging
+import click
+from werkzeug.middleware.proxy_fix import ProxyFix
 # Import local calculator instead of AI
-from utils.system_calculator import get_system_recommendations
-from models import db, LoanApplication
-from utils.database_pg import db_manager
+from utils.system_calculator import (
+    UNPARSEABLE_INPUT_ERROR, api_response_cache, get_cached_system_recommendations, get_structured_recommendations,
+    get_system_recommendations_data, missing_api_fields, recommendation_cache, recommendation_cache_key,
+    recommendation_etag
+)
+from utils.batch_quotes import (
+    BATCH_MAX_BYTES, BATCH_MAX_SITES, batch_rate_limiter, batch_slots, parse_sites, stream_quotes
+)
+from utils.appliance_load import appliance_load
+from utils.application_numbers import new_application_number
+from utils.compression import compress, negotiate_encoding
+from models import db
+from utils.database_pg import db_manager, oversized_fields
+from utils.db_engine import engine_options, init_engine_metrics
+from utils.migrations import upgrade_database
+from utils.lead_import import DEFAULT_BATCH_SIZE, import_leads
+from utils.lead_rollups import DEFAULT_TREND_DAYS, MAX_TREND_DAYS, lead_trends, refresh_in_background, refresh_lead_rollups
+from utils.system_optimizer import optimize_user_system
+from utils.monte_carlo import DEFAULT_SAMPLES
+from utils.pricing_catalog import current_catalog
+from utils import metrics
+from utils.write_behind import lead_writer
 
-# Configure logging with more details
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+site = Blueprint('site', __name__)
+api = Blueprint('api', __name__, url_prefix='/api/v1')
 
-app = Flask(__name__)
-app.secret_key = os.environ.get("SESSION_SECRET", "dev_key_123")
-app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL")
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-db.init_app(app)
+def create_app(config=None):
+    """Create and configure the Flask application.
 
-# Create database tables if they don't exist
-with app.app_context():
-    try:
-        # Create tables if they don't exist (don't drop existing data)
-        db.create_all()
-        logging.info("Database tables created/verified successfully")
-    except Exception as e:
-        logging.error(f"Error creating database tables: {str(e)}")
-
-# Nigerian states and average sun hours
-NIGERIA_LOCATIONS = {
-    "Lagos": 5.5,
-    "Abuja": 6.0,
-    "Kano": 6.5,
-    "Port Harcourt": 5.0,
-    "Ibadan": 5.8,
-    "Enugu": 5.6
-}
+    Building the app does not touch the database: tables are created and
+    migrated by `flask --app app upgrade-db`, run once per deploy rather
+    than by every worker at boot. ``config`` overrides settings taken from
+    the environment.
+    """
+    # Configure logging with more details
+    logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO'), format='%(asctime)s - %(levelname)s - %(message)s')
+
+    app = Flask(__name__)
+    app.secret_key = os.environ.get("SESSION_SECRET", "dev_key_123")
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL")
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    # Reverse proxies in front of the app (load balancer, platform router).
+    # Only that many X-Forwarded-For entries are trusted for the client
+    # address the rate limits key on; with 0 the header is ignored, since
+    # any client could set it.
+    app.config["PROXY_HOPS"] = int(os.environ.get("PROXY_HOPS", 0))
+    if config:
+        app.config.update(config)
+    if app.config["PROXY_HOPS"]:
+        hops = app.config["PROXY_HOPS"]
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops, x_host=hops)
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", engine_options(app.config["SQLALCHEMY_DATABASE_URI"]))
+    db.init_app(app)
+    metrics.init_app(app)
+    metrics.register_cache('recommendations', recommendation_cache)
+    metrics.register_cache('api_responses', api_response_cache)
+    lead_writer.init_app(app)
+    with app.app_context():
+        # Creates the engine only; the first connection is made by the first query
+        init_engine_metrics(db.engine)
+
+    app.cli.add_command(upgrade_db_command)
+    app.cli.add_command(import_leads_command)
+    app.cli.add_command(refresh_rollups_command)
+    app.register_blueprint(site)
+    app.register_blueprint(api)
+    return app
+
+@click.command('upgrade-db')
+@with_appcontext
+def upgrade_db_command():
+    """Create missing tables and migrate an existing database to the current schema (typed columns, indexes)."""
+    upgrade_database()
+    print("Database schema is up to date")
+
+@click.command('import-leads')
+@click.argument('csv_file', type=click.File('r', encoding='utf-8'))
+@click.option('--batch-size', default=DEFAULT_BATCH_SIZE, show_default=True, help='Rows per transaction')
+@with_appcontext
+def import_leads_command(csv_file, batch_size):
+    """Bulk-load leads from a CSV in the LoanApplicationLogger layout ('-' reads stdin)."""
+    def progress(loaded, elapsed):
+        print(f"{loaded} rows loaded, {loaded / elapsed:,.0f} rows/s")
+
+    result = import_leads(csv_file, batch_size, progress)
+    print(f"Read {result['rows_read']} rows in {result['seconds']:.1f}s ({result['rows_per_second']:,.0f} rows/s): "
+          f"{result['rows_loaded']} loaded, {result['rows_superseded']} superseded by a later row, "
+          f"{result['rows_rejected']} rejected")
+    for example in result['rejected_examples']:
+        print(f"  rejected {example}")
+    # Imported rows keep their own updated_at, which may be behind the rollup watermark
+    rollup = refresh_lead_rollups(full=True)
+    print(f"Rebuilt lead rollups for {rollup['days']} days in {rollup['seconds']:.1f}s")
+
+@click.command('refresh-rollups')
+@click.option('--full', is_flag=True, help='Rebuild every day instead of those with changed applications')
+@with_appcontext
+def refresh_rollups_command(full):
+    """Update the dashboard's lead rollups with applications saved since the last refresh."""
+    result = refresh_lead_rollups(full)
+    print(f"Refreshed lead rollups for {result['days']} days ({result['rows']} rows) in {result['seconds']:.2f}s")
 
 def check_auth(username, password):
     """Check if the username / password combination is valid"""
@@ -59,44 +133,43 @@ def requires_auth(f):
         return f(*args, **kwargs)
     return decorated
 
-@app.route('/admin/dashboard')
+def _page_cursor(value):
+    """Parse a dashboard page cursor ('<created_at ISO>_<id>'); None if absent or malformed"""
+    created_at, _, application_id = (value or '').rpartition('_')
+    try:
+        return datetime.fromisoformat(created_at), int(application_id)
+    except ValueError:
+        return None
+
+def _format_cursor(cursor):
+    return f"{cursor[0].isoformat()}_{cursor[1]}" if cursor else None
+
+@site.route('/admin/dashboard')
 @requires_auth
 def admin_dashboard():
     """Admin dashboard to view all applications"""
     try:
-        page = request.args.get('page', 1, type=int)
+        page = max(request.args.get('page', 1, type=int), 1)
         per_page = 10
-        
-        # Get all applications
-        applications = LoanApplication.query.order_by(LoanApplication.created_at.desc()).all()
-        
-        # Calculate pagination
-        total = len(applications)
-        pages = (total + per_page - 1) // per_page  # Ceiling division
-        
-        # Get page of applications
-        start = (page - 1) * per_page
-        end = min(start + per_page, total)
-        page_applications = applications[start:end]
-        
-        # Calculate statistics
-        home_count = sum(1 for app in applications if app.usage_type == 'home')
-        business_count = sum(1 for app in applications if app.usage_type == 'business')
-        
-        # Calculate average energy consumption
-        energy_values = [float(app.daily_energy) for app in applications if app.daily_energy and app.daily_energy.replace('.', '', 1).isdigit()]
-        avg_energy = round(sum(energy_values) / len(energy_values), 2) if energy_values else 0
-        
-        stats = {
-            'total': total,
-            'home': home_count,
-            'business': business_count,
-            'avg_energy': avg_energy
-        }
-        
+
+        # Counters, and the total the page count comes from, are read from the
+        # lead rollups, refreshed off the request. The listing pages by
+        # keyset (?after=/?before= the edge row of the page it came from)
+        # rather than OFFSET, so every page costs the same.
+        refresh_in_background(current_app._get_current_object())
+        stats = db_manager.get_dashboard_stats()
+        listing = db_manager.get_applications_page(
+            per_page, after=_page_cursor(request.args.get('after')), before=_page_cursor(request.args.get('before')))
+        if not listing['newer']:
+            page = 1
+        # The rollups may not have caught up with the newest applications yet
+        pages = max((stats['total'] + per_page - 1) // per_page, page + (1 if listing['older'] else 0))
+
         return render_template(
             'admin_dashboard.html',
-            applications=[app.to_dict() for app in page_applications],
+            applications=listing['applications'],
+            newer=_format_cursor(listing['newer']),
+            older=_format_cursor(listing['older']),
             page=page,
             pages=pages,
             stats=stats
@@ -104,55 +177,103 @@ def admin_dashboard():
     
     except Exception as e:
         logging.error(f"Error in admin dashboard: {str(e)}")
-        return render_template('admin_dashboard.html', applications=[], page=1, pages=1, stats={'total': 0, 'home': 0, 'business': 0, 'avg_energy': 0})
+        return render_template('admin_dashboard.html', applications=[], newer=None, older=None, page=1, pages=1,
+                               stats={'total': 0, 'home': 0, 'business': 0, 'avg_energy': 0})
+
+@site.route('/admin/analytics')
+@requires_auth
+def admin_analytics():
+    """Lead trends over the last ?days= days, read from the lead rollups only"""
+    try:
+        days = min(max(request.args.get('days', DEFAULT_TREND_DAYS, type=int), 1), MAX_TREND_DAYS)
+        refresh_in_background(current_app._get_current_object())
+        return render_template('admin_analytics.html', trends=lead_trends(days))
+    except Exception as e:
+        logging.error(f"Error in admin analytics: {str(e)}")
+        return "Error loading analytics", 500
 
-@app.route('/admin/download-applications')
+def _gzip_chunks(chunks):
+    """Compress a stream of text chunks into a gzip byte stream"""
+    compressor = zlib.compressobj(wbits=31)  # 31 = gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+@site.route('/admin/download-applications')
 @requires_auth
 def download_applications():
-    """Secure endpoint to download loan applications CSV"""
+    """Secure endpoint to download loan applications CSV
+
+    Optional query parameters: start and end (YYYY-MM-DD, inclusive),
+    location, and gzip=1 to download a compressed file.
+    """
     try:
-        # Get CSV data from the database manager
-        csv_data = db_manager.export_to_csv()
-        
-        if csv_data:
-            # Create a BytesIO object from the CSV string
-            csv_buffer = BytesIO(csv_data.encode())
-            
-            # Return the CSV as a file attachment
-            return send_file(
-                csv_buffer,
-                mimetype='text/csv',
-                as_attachment=True,
-                download_name=f'loan_applications_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
-            )
-        else:
+        try:
+            start_date = date.fromisoformat(request.args['start']) if request.args.get('start') else None
+            end_date = date.fromisoformat(request.args['end']) if request.args.get('end') else None
+        except ValueError:
+            return "Invalid date, expected YYYY-MM-DD", 400
+        location = request.args.get('location') or None
+
+        if not db_manager.has_applications(start_date, end_date, location):
             logging.error("No applications data available")
             return "No applications data available", 404
+
+        chunks = db_manager.iter_csv_export(start_date, end_date, location)
+        filename = f'loan_applications_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+        if request.args.get('gzip') in ('1', 'true', 'yes'):
+            body = _gzip_chunks(chunks)
+            mimetype = 'application/gzip'
+            filename += '.gz'
+        else:
+            body = (chunk.encode() for chunk in chunks)
+            mimetype = 'text/csv'
+
+        # Stream the file; the export reads the table in batches as it is sent
+        return Response(
+            stream_with_context(body),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename={filename}'}
+        )
     except Exception as e:
         logging.error(f"Error downloading CSV: {str(e)}")
         return "Error downloading file", 500
 
-@app.route('/')
+@site.route('/admin/cache-stats')
+@requires_auth
+def cache_stats():
+    """Hit/miss counters for the in-process recommendation cache"""
+    return jsonify(recommendation_cache.stats())
+
+@site.route('/metrics')
+@requires_auth
+def metrics_endpoint():
+    """Request, stage and cache metrics in the Prometheus text format"""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@site.route('/')
 def index():
     # Clear any existing application number when returning to landing page
     session.pop('application_number', None)
     return render_template('index.html')
 
-@app.route('/calculator')
+@site.route('/calculator')
 def calculator():
     # Always generate a new application number when starting calculator
-    application_number = f"SOL-{datetime.now().year}-{str(uuid.uuid4().int)[:5]}"
+    application_number = new_application_number()
     session['application_number'] = application_number
-    return render_template('calculator.html', locations=NIGERIA_LOCATIONS, application_number=session.get('application_number'))
+    return render_template('calculator.html', locations=current_catalog().location_sun_hours(), application_number=session.get('application_number'))
 
-@app.route('/loan_application')
+@site.route('/loan_application')
 def loan_application():
     if 'application_number' not in session:
         flash('Please start from the calculator page', 'error')
-        return redirect(url_for('calculator'))
+        return redirect(url_for('.calculator'))
     return render_template('loan_application.html', application_number=session.get('application_number'))
 
-@app.route('/submit_lead', methods=['POST'])
+@site.route('/submit_lead', methods=['POST'])
 def submit_lead():
     try:
         # Check if the request is JSON (from JavaScript) or form (from HTML form)
@@ -165,9 +286,13 @@ def submit_lead():
             
             if not all([name, email, phone]):
                 return jsonify({'success': False, 'error': 'Missing required fields'}), 400
+            too_long = oversized_fields(
+                {'full_name': name, 'email': email, 'phone': phone, 'application_number': application_number})
+            if too_long:
+                return jsonify({'success': False, 'error': f"Too long: {', '.join(too_long)}"}), 400
                 
             # Save to database with application number
-            db_manager.save_application(name, email, phone, application_number)
+            lead_writer.save_application(name, email, phone, application_number)
             
             return jsonify({
                 'success': True, 
@@ -183,13 +308,16 @@ def submit_lead():
 
             if not all([name, email, phone, application_number]):
                 flash('Please fill in all required fields', 'error')
-                return redirect(url_for('loan_application'))
+                return redirect(url_for('.loan_application'))
+            if oversized_fields({'full_name': name, 'email': email, 'phone': phone}):
+                flash('Your name, email or phone number is too long', 'error')
+                return redirect(url_for('.loan_application'))
 
             # Save to database with application number
-            db_manager.save_application(name, email, phone, application_number)
+            lead_writer.save_application(name, email, phone, application_number)
 
             flash('Thank you! We appreciate your time.', 'success')
-            return redirect(url_for('thank_you'))
+            return redirect(url_for('.thank_you'))
 
     except Exception as e:
         logging.error(f"Error saving lead data: {str(e)}")
@@ -197,16 +325,16 @@ def submit_lead():
             return jsonify({'success': False, 'error': str(e)}), 500
         else:
             flash('There was an error submitting your application. Please try again.', 'error')
-            return redirect(url_for('loan_application'))
+            return redirect(url_for('.loan_application'))
 
-@app.route('/thank-you')
+@site.route('/thank-you')
 def thank_you():
     application_number = session.get('application_number')
     if not application_number:
-        return redirect(url_for('calculator'))
+        return redirect(url_for('.calculator'))
     return render_template('thank-you.html', application_number=application_number)
 
-@app.route('/get_recommendations', methods=['POST'])
+@site.route('/get_recommendations', methods=['POST'])
 def get_recommendations():
     try:
         if not request.is_json:
@@ -224,19 +352,28 @@ def get_recommendations():
         # Save calculator data to database
         application_number = session.get('application_number')
         if application_number:
-            db_manager.save_calculator_data(application_number, user_data)
+            lead_writer.save_calculator_data(application_number, user_data)
             logging.info(f"Saved calculator data for application {application_number}")
 
         # Generate a new application number if one doesn't exist
         if not application_number:
-            application_number = str(uuid.uuid4())[:8].upper()
+            application_number = new_application_number()
             session['application_number'] = application_number
             
             # Initial save with just the application number
-            db_manager.save_calculator_data(application_number, user_data)
+            lead_writer.save_calculator_data(application_number, user_data)
             logging.info(f"Created new application {application_number}")
             
-        result = get_system_recommendations(user_data)
+        # ?format=json returns the raw sizing and costs instead of the HTML fragment
+        if request.args.get('format') == 'json':
+            # &uncertainty=1 adds Monte Carlo payback percentiles (&samples=N, default 10000)
+            uncertainty_samples = None
+            if request.args.get('uncertainty') == '1':
+                uncertainty_samples = request.args.get('samples', DEFAULT_SAMPLES, type=int)
+            result = get_system_recommendations_data(
+                user_data, uncertainty_samples, user_data.get('distributions'))
+        else:
+            result = get_cached_system_recommendations(user_data)
 
         if result.get('success'):
             # Include application number in the response
@@ -249,10 +386,174 @@ def get_recommendations():
         logging.error(f"Error in get_recommendations: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@app.errorhandler(404)
+def _too_many_requests(wait):
+    """A 429 response for a client over the heavy-request rate, retryable after wait seconds"""
+    return (jsonify({'error': 'Too many requests, please retry later'}), 429,
+            {'Retry-After': str(math.ceil(wait))})
+
+def _rate_limit_key():
+    """Who a rate limit counts against: the logged-in admin, else the client address"""
+    auth = request.authorization
+    if auth and check_auth(auth.username, auth.password):
+        return f'user:{auth.username}'
+    return request.remote_addr
+
+def _no_free_slot():
+    """A 429 response for a worker already running BATCH_MAX_CONCURRENT heavy requests"""
+    return jsonify({'error': 'Too many requests in progress, please retry later'}), 429, {'Retry-After': '5'}
+
+@site.route('/optimize_system', methods=['POST'])
+def optimize_system():
+    """Search for the cheapest system meeting a reliability target.
+
+    The search fans out to the optimizer's process pool like a batch quote,
+    so it shares the batch endpoint's per-client rate and per-worker slots.
+    """
+    try:
+        wait = batch_rate_limiter.acquire(_rate_limit_key())
+        if wait:
+            return _too_many_requests(wait)
+        if not request.is_json:
+            return jsonify({'error': 'Request must be JSON'}), 400
+
+        user_data = request.get_json()
+        required_fields = ['location', 'grid_hours', 'daily_energy']
+        missing_fields = [field for field in required_fields if not user_data.get(field)]
+
+        if missing_fields:
+            error_msg = f"Missing required fields: {', '.join(missing_fields)}"
+            logging.error(error_msg)
+            return jsonify({'error': error_msg}), 400
+
+        lolp_target = user_data.get('lolp_target')
+        if lolp_target is not None:
+            try:
+                lolp_target = float(lolp_target)
+            except (TypeError, ValueError):
+                return jsonify({'error': 'lolp_target must be a number'}), 400
+
+        if not batch_slots.acquire(blocking=False):
+            return _no_free_slot()
+        try:
+            result = optimize_user_system(user_data, lolp_target=lolp_target)
+        finally:
+            batch_slots.release()
+        if result.get('success'):
+            return jsonify(result)
+        else:
+            return jsonify({'error': 'Failed to optimize system', 'details': result.get('error')}), 500
+
+    except Exception as e:
+        logging.error(f"Error in optimize_system: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+def _api_request_data():
+    """Calculator fields from a JSON body (POST) or the query string (GET, appliances as a JSON list)"""
+    if request.method == 'POST':
+        return request.get_json(silent=True)
+    data = request.args.to_dict()
+    if 'appliances' in data:
+        try:
+            data['appliances'] = json.loads(data['appliances'])
+        except ValueError:
+            return None
+    return data
+
+@api.route('/recommendations', methods=['GET', 'POST'])
+def api_recommendations():
+    """Structured sizing and costs for calculator inputs, for partner and mobile clients.
+
+    Takes location, grid_hours, usage_type and either appliances or
+    daily_energy; nothing is saved. The strong ETag covers the normalized
+    inputs and both catalogs, so a client repeating a request with
+    If-None-Match gets a bodiless 304 without anything being recomputed.
+    Bodies are brotli or gzip compressed when the client accepts it.
+    """
+    user_data = _api_request_data()
+    if not isinstance(user_data, dict):
+        return jsonify({'error': 'Expected a JSON object, or query parameters with appliances as a JSON list'}), 400
+    missing_fields = missing_api_fields(user_data)
+    if missing_fields:
+        return jsonify({'error': f"Missing required fields: {', '.join(missing_fields)}"}), 400
+
+    try:
+        load = appliance_load(user_data.get('appliances'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    key = recommendation_cache_key(user_data, load=load)
+    if key is None:
+        return jsonify({'error': UNPARSEABLE_INPUT_ERROR}), 400
+
+    entity = recommendation_etag(key)
+    encoding = negotiate_encoding(request.accept_encodings)
+    # Each content coding is a different representation with its own tag
+    etag = entity if encoding == 'identity' else f'{entity}-{encoding}'
+    headers = {'Vary': 'Accept-Encoding', 'Cache-Control': 'no-cache'}
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304, headers=headers)
+        response.set_etag(etag)
+        return response
+
+    bodies = api_response_cache.get(entity)
+    if bodies is None:
+        try:
+            recommendations = get_structured_recommendations(user_data, load)
+        except Exception as e:
+            logging.error(f"Error in api_recommendations: {str(e)}")
+            return jsonify({'error': str(e)}), 500
+        bodies = {'identity': json.dumps({'recommendations': recommendations}, sort_keys=True).encode()}
+        api_response_cache.set(entity, bodies)
+    body = bodies.get(encoding)
+    if body is None:
+        # Encoded once per entry; concurrent requests may both encode, with identical results
+        body = bodies[encoding] = compress(bodies['identity'], encoding)
+
+    response = Response(body, content_type='application/json', headers=headers)
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    return response
+
+@api.route('/quotes/batch', methods=['POST'])
+def api_batch_quotes():
+    """Quote many sites in one request, streaming an NDJSON line per site as it is computed.
+
+    The body is a JSON array of sites, or NDJSON (one site per line) with
+    Content-Type application/x-ndjson; each site takes the fields of
+    /recommendations plus an optional ``id`` echoed back. Sites are only
+    saved, each as a new lead, with ?save=1, which needs the admin login.
+    Bodies over BATCH_MAX_BYTES get a 413. A client over its rate, or a
+    worker already running BATCH_MAX_CONCURRENT batches and optimizer
+    searches, gets a 429.
+    """
+    wait = batch_rate_limiter.acquire(_rate_limit_key())
+    if wait:
+        return _too_many_requests(wait)
+    save = request.args.get('save') in ('1', 'true', 'yes')
+    if save and not (request.authorization and check_auth(request.authorization.username,
+                                                          request.authorization.password)):
+        return authenticate()
+
+    request.max_content_length = BATCH_MAX_BYTES
+    ndjson = request.mimetype == 'application/x-ndjson'
+    try:
+        sites = parse_sites(request.get_data(), ndjson)
+    except ValueError as e:
+        return jsonify({'error': f"Invalid batch: {str(e)}"}), 400
+    if len(sites) > BATCH_MAX_SITES:
+        return jsonify({'error': f"At most {BATCH_MAX_SITES} sites can be quoted at once"}), 413
+
+    if not batch_slots.acquire(blocking=False):
+        return _no_free_slot()
+    logging.info(f"Batch quote of {len(sites)} sites (save={save})")
+    response = Response(stream_with_context(stream_quotes(sites, save)), content_type='application/x-ndjson')
+    response.call_on_close(batch_slots.release)
+    return response
+
+@site.app_errorhandler(404)
 def not_found_error(error):
     return render_template('404.html'), 404
 
-@app.errorhandler(500)
+@site.app_errorhandler(500)
 def internal_error(error):
     return render_template('500.html'), 500
\ No newline at end of file
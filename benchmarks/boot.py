@@ -0,0 +1,146 @@
+"""Startup benchmark: how fast a new process is ready to serve.
+
+Measures, over --runs fresh starts:
+  create_app              importing app and building it, in a new interpreter
+  worker boot             a gunicorn worker from fork until the app is loaded
+  first response          starting gunicorn until GET /calculator answers
+and the same gunicorn figures with --preload, where the master loads the
+app once and workers inherit it when they fork.
+
+Usage:
+    python benchmarks/boot.py [--runs 5] [--workers 2] [--database URL]
+
+Booting must not touch the database, so by default DATABASE_URL points at a
+SQLite file that does not exist yet; the run fails if a worker tries to use
+it at boot.
+"""
+import argparse
+import http.client
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import common
+from common import free_port, print_table, summarize, write_results
+
+# Optional integrations that should be imported on first use, not at boot
+LAZY_MODULES = ("anthropic", "multiprocessing")
+
+CREATE_APP = f"""
+import sys, time
+start = time.perf_counter_ns()
+from app import create_app
+create_app()
+print(time.perf_counter_ns() - start)
+print(" ".join(name for name in {LAZY_MODULES!r} if name in sys.modules))
+"""
+
+
+def time_create_app(env):
+    """Nanoseconds to import and build the app, and the lazy modules that got imported anyway"""
+    output = subprocess.run(
+        [sys.executable, "-c", CREATE_APP], cwd=common.ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout.splitlines()
+    return int(output[0]), output[1].split() if len(output) > 1 else []
+
+
+def _first_response(port, process, timeout=60):
+    """Poll GET /calculator until it answers"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("gunicorn exited during startup; see its log")
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+        try:
+            connection.request("GET", "/calculator")
+            response = connection.getresponse()
+            response.read()
+            if response.status != 200:
+                raise RuntimeError(f"GET /calculator returned HTTP {response.status}")
+            return
+        except OSError:
+            time.sleep(0.005)
+        finally:
+            connection.close()
+    raise RuntimeError("gunicorn did not answer in time")
+
+
+def _boot_times(path, workers, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                lines = f.read().split()
+            if len(lines) >= workers:
+                return [float(line) * 1e9 for line in lines]
+        time.sleep(0.01)
+    raise RuntimeError("workers did not finish booting in time")
+
+
+def time_gunicorn(env, workers, preload, log):
+    """(nanoseconds to the first response, per-worker boot nanoseconds) for one gunicorn start"""
+    port = free_port()
+    fd, times_file = tempfile.mkstemp(prefix="solar-boot-")
+    os.close(fd)
+    command = [sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{port}", "--workers", str(workers),
+               "--config", os.path.join("benchmarks", "gunicorn_boot.py")]
+    if preload:
+        command.append("--preload")
+    try:
+        start = time.perf_counter_ns()
+        process = subprocess.Popen(command + ["main:app"], cwd=common.ROOT, env=dict(env, BOOT_TIMES_FILE=times_file),
+                                   stdout=log, stderr=subprocess.STDOUT)
+        try:
+            _first_response(port, process)
+            first_response = time.perf_counter_ns() - start
+            return first_response, _boot_times(times_file, workers)
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+    finally:
+        os.unlink(times_file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="starts measured per mode")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn worker processes")
+    parser.add_argument("--database", help="SQLAlchemy URL (default: a SQLite file that is never created)")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/boot-<commit>-<time>.json)")
+    args = parser.parse_args()
+
+    if args.database is None:
+        args.database = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='solar-boot-'), 'absent', 'boot.db')}"
+    env = dict(os.environ, DATABASE_URL=args.database, LOG_LEVEL=os.environ.get("LOG_LEVEL", "WARNING"))
+
+    timings = {"create_app": []}
+    eager = set()
+    for _ in range(args.runs):
+        elapsed, loaded = time_create_app(env)
+        timings["create_app"].append(elapsed)
+        eager.update(loaded)
+
+    log_path = os.path.join(tempfile.gettempdir(), "bench-boot-gunicorn.log")
+    with open(log_path, "w") as log:
+        for preload in (False, True):
+            suffix = " (preload)" if preload else ""
+            boots = timings[f"worker boot{suffix}"] = []
+            responses = timings[f"first response{suffix}"] = []
+            for _ in range(args.runs):
+                first_response, worker_boots = time_gunicorn(env, args.workers, preload, log)
+                responses.append(first_response)
+                boots.extend(worker_boots)
+
+    results = {name: summarize(values) for name, values in timings.items()}
+    print_table(results)
+    if eager:
+        print(f"\nImported at boot but meant to load lazily: {', '.join(sorted(eager))}")
+    config = dict(vars(args), database=args.database.split("://", 1)[0])  # keep credentials out of results
+    path = write_results("boot", config, results, args.output)
+    print(f"\nResults written to {path}\ngunicorn log: {log_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+# Make the app importable when a benchmark is run as a script
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def summarize(latencies_ns, wall_seconds=None):
+    """Latency percentiles (milliseconds) and throughput for a list of per-call timings"""
+    latencies_ms = np.asarray(latencies_ns, dtype=float) / 1e6
+    busy_seconds = latencies_ms.sum() / 1000
+    return {
+        "count": int(latencies_ms.size),
+        "mean_ms": float(latencies_ms.mean()),
+        "min_ms": float(latencies_ms.min()),
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+        "max_ms": float(latencies_ms.max()),
+        # Sequential runs have no separate wall clock; throughput is then 1 / mean latency
+        "requests_per_second": float(latencies_ms.size / (wall_seconds or busy_seconds)),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def environment():
+    """Where and on what code the benchmark ran, stored with every result file"""
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def write_results(kind, config, results, output=None):
+    """Save a result file as JSON and return its path.
+
+    By default files go to benchmarks/results/<kind>-<commit>-<timestamp>.json,
+    so runs on different commits can be compared with benchmarks/compare.py.
+    """
+    env = environment()
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = env["timestamp"].replace(":", "").replace("-", "").replace("+0000", "Z")
+        output = os.path.join(RESULTS_DIR, f"{kind}-{env['commit']}-{stamp}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"kind": kind, "environment": env, "config": config, "results": results}, f, indent=2)
+        f.write("\n")
+    return output
+
+
+def print_table(results, unit="ms"):
+    """Print one line of percentiles per benchmark, in milliseconds or microseconds ("us")"""
+    scale = 1000 if unit == "us" else 1
+    width = max(len(name) for name in results)
+    print(f"{'benchmark':<{width}}  {'p50 ' + unit:>9}  {'p95 ' + unit:>9}  {'p99 ' + unit:>9}  {'per sec':>10}")
+    for name, stats in results.items():
+        print(f"{name:<{width}}  {stats['p50_ms'] * scale:>9.3f}  {stats['p95_ms'] * scale:>9.3f}  "
+              f"{stats['p99_ms'] * scale:>9.3f}  {stats['requests_per_second']:>10.1f}")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("server exited during startup; see its log")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("server did not start listening in time")
@@ -0,0 +1,70 @@
+"""Compare two benchmark result files.
+
+Usage:
+    python benchmarks/compare.py baseline.json candidate.json [--threshold 10]
+
+Prints the change in p50/p95/p99 for every benchmark present in both files
+and exits with status 1 if any percentile got slower by more than
+--threshold percent, so it can gate a CI job.
+"""
+import argparse
+import json
+import sys
+
+PERCENTILES = ("p50_ms", "p95_ms", "p99_ms")
+
+
+def load(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(baseline, candidate, threshold):
+    """Rows of (name, {percentile: (old, new, change %)}) and the list of regressions"""
+    rows, regressions = [], []
+    for name, old in baseline["results"].items():
+        new = candidate["results"].get(name)
+        if new is None:
+            continue
+        changes = {}
+        for key in PERCENTILES:
+            change = (new[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            changes[key] = (old[key], new[key], change)
+            if change > threshold:
+                regressions.append(f"{name} {key[:3]}: {old[key]:.3f} -> {new[key]:.3f} ms (+{change:.1f}%)")
+        rows.append((name, changes))
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0, help="allowed slowdown in percent")
+    args = parser.parse_args()
+
+    baseline, candidate = load(args.baseline), load(args.candidate)
+    if baseline.get("kind") != candidate.get("kind"):
+        print(f"Warning: comparing {baseline.get('kind')} results with {candidate.get('kind')} results")
+    print(f"baseline  {baseline['environment']['commit']}  {baseline['environment']['timestamp']}")
+    print(f"candidate {candidate['environment']['commit']}  {candidate['environment']['timestamp']}\n")
+
+    rows, regressions = compare(baseline, candidate, args.threshold)
+    if not rows:
+        print("No benchmarks in common")
+        return 1
+    width = max(len(name) for name, _ in rows)
+    print(f"{'benchmark':<{width}}  {'p50':>8}  {'p95':>8}  {'p99':>8}")
+    for name, changes in rows:
+        print(f"{name:<{width}}  " + "  ".join(f"{changes[key][2]:>+7.1f}%" for key in PERCENTILES))
+
+    if regressions:
+        print(f"\nRegressions above {args.threshold:g}%:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
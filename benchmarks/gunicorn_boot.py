@@ -0,0 +1,18 @@
+"""gunicorn config used by benchmarks/boot.py to time worker boot.
+
+Each worker appends the seconds from its fork until the app was loaded
+(the post_fork and post_worker_init hooks) to the file named by
+BOOT_TIMES_FILE, one line per worker.
+"""
+import os
+import time
+
+
+def post_fork(server, worker):
+    worker.boot_started = time.perf_counter()
+
+
+def post_worker_init(worker):
+    elapsed = time.perf_counter() - worker.boot_started
+    with open(os.environ["BOOT_TIMES_FILE"], "a", encoding="utf-8") as f:
+        f.write(f"{elapsed}\n")
@@ -0,0 +1,201 @@
+"""End-to-end load test for the main endpoints.
+
+Drives GET /calculator, POST /get_recommendations, POST /submit_lead,
+GET /admin/dashboard and GET /admin/analytics either in-process through the
+Flask test client or over HTTP against a local gunicorn started for the run.
+
+Usage:
+    python benchmarks/load.py --target testclient
+    python benchmarks/load.py --target gunicorn --workers 4 --concurrency 16
+    python benchmarks/load.py --database postgresql://user@localhost/solar_bench
+
+The database defaults to a fresh SQLite file in a temporary directory. Point
+--database at a dedicated Postgres database; the run adds rows to it.
+"""
+import argparse
+import base64
+import http.client
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import common
+from common import free_port, print_table, summarize, wait_for_port, write_results
+
+ADMIN_AUTH = "Basic " + base64.b64encode(b"admin:solar2025").decode()
+
+LOCATIONS = [("5.5", "Lagos"), ("6.0", "Abuja"), ("6.5", "Kano"), ("5.0", "Port Harcourt")]
+
+
+def recommendation_payloads():
+    """Calculator submissions cycling through locations, usage, grid hours and energy"""
+    grid_hours = ["0", "2", "6", "10", "14", "20"]
+    energies = ["2.50", "4.33", "7.80", "12.40", "25.00"]
+    for (location, name), user_type, grid, energy in itertools.cycle(
+            itertools.product(LOCATIONS, ["home", "business"], grid_hours, energies)):
+        yield {
+            "location": location,
+            "location_name": name,
+            "user_type": user_type,
+            "grid_hours": grid,
+            "monthly_fuel_cost": "60000",
+            "daily_energy": energy,
+            "maintenance_cost": "10000",
+            "appliances": [
+                {"type": "LED Lights", "units": 5, "hours": 8, "backup": True, "power": 10, "daily_usage": 0.4},
+                {"type": "Standing Fan", "units": 2, "hours": 8, "backup": True, "power": 60, "daily_usage": 0.96},
+            ],
+        }
+
+
+def scenarios():
+    """(name, method, path, body factory, headers) for each endpoint under test"""
+    payloads = recommendation_payloads()
+    payload_lock = threading.Lock()
+    lead_numbers = itertools.count(1)
+
+    def next_payload():
+        with payload_lock:
+            return next(payloads)
+
+    def next_lead():
+        number = next(lead_numbers)
+        return {
+            "full_name": f"Load Test {number}",
+            "email": f"load{number}@example.com",
+            "phone": f"0800{number:07d}",
+            "application_number": f"BENCH{number:07d}",
+        }
+
+    return [
+        ("GET /calculator", "GET", "/calculator", None, {}),
+        ("POST /get_recommendations", "POST", "/get_recommendations", next_payload, {}),
+        ("POST /submit_lead", "POST", "/submit_lead", next_lead, {}),
+        ("GET /admin/dashboard", "GET", "/admin/dashboard", None, {"Authorization": ADMIN_AUTH}),
+        ("GET /admin/analytics", "GET", "/admin/analytics", None, {"Authorization": ADMIN_AUTH}),
+    ]
+
+
+def _check(name, status):
+    if status >= 400:
+        raise RuntimeError(f"{name} returned HTTP {status}")
+
+
+def run_testclient(args):
+    """Sequential requests through the Flask test client (no network, one thread)"""
+    os.environ["DATABASE_URL"] = args.database
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    from app import create_app
+    from utils.migrations import upgrade_database
+
+    app = create_app()
+    with app.app_context():
+        upgrade_database()
+
+    results = {}
+    for name, method, path, body, headers in scenarios():
+        timings = []
+        for i in range(args.warmup + args.requests):
+            # A fresh client per request, like a new visitor without a session cookie
+            client = app.test_client()
+            start = time.perf_counter_ns()
+            response = client.open(path, method=method, json=body() if body else None, headers=headers)
+            elapsed = time.perf_counter_ns() - start
+            _check(name, response.status_code)
+            if i >= args.warmup:
+                timings.append(elapsed)
+        results[name] = summarize(timings)
+    return results
+
+
+def _http_worker(port, method, path, body, headers, count):
+    """Send count requests over one keep-alive connection, returning per-request timings"""
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    timings = []
+    try:
+        for _ in range(count):
+            payload = json.dumps(body()).encode() if body else None
+            request_headers = dict(headers)
+            if payload is not None:
+                request_headers["Content-Type"] = "application/json"
+            start = time.perf_counter_ns()
+            connection.request(method, path, body=payload, headers=request_headers)
+            response = connection.getresponse()
+            response.read()
+            timings.append(time.perf_counter_ns() - start)
+            _check(f"{method} {path}", response.status)
+    finally:
+        connection.close()
+    return timings
+
+
+def _drive(port, scenario, requests, concurrency):
+    """Spread requests over concurrency connections; returns (timings, wall seconds)"""
+    _, method, path, body, headers = scenario
+    counts = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        parts = list(pool.map(lambda count: _http_worker(port, method, path, body, headers, count),
+                              [count for count in counts if count]))
+    return [timing for part in parts for timing in part], time.perf_counter() - start
+
+
+def run_gunicorn(args):
+    """Concurrent HTTP requests against a gunicorn serving the app"""
+    port = free_port()
+    env = dict(os.environ, DATABASE_URL=args.database, LOG_LEVEL=os.environ.get("LOG_LEVEL", "WARNING"))
+    log_path = os.path.join(tempfile.gettempdir(), f"bench-gunicorn-{port}.log")
+    with open(log_path, "w") as log:
+        # The schema step a deploy runs before starting gunicorn
+        subprocess.run([sys.executable, "-m", "flask", "--app", "app", "upgrade-db"],
+                       cwd=common.ROOT, env=env, stdout=log, stderr=subprocess.STDOUT, check=True)
+        process = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{port}",
+             "--workers", str(args.workers), "--threads", str(args.threads), "main:app"],
+            cwd=common.ROOT, env=env, stdout=log, stderr=subprocess.STDOUT
+        )
+    try:
+        wait_for_port(port, process)
+        results = {}
+        for scenario in scenarios():
+            _drive(port, scenario, args.warmup, args.concurrency)
+            timings, wall_seconds = _drive(port, scenario, args.requests, args.concurrency)
+            results[scenario[0]] = summarize(timings, wall_seconds)
+        return results
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+        print(f"gunicorn log: {log_path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=["testclient", "gunicorn"], default="testclient")
+    parser.add_argument("--database", help="SQLAlchemy URL (default: a temporary SQLite file)")
+    parser.add_argument("--requests", type=int, default=500, help="measured requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=50, help="unmeasured requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8, help="client connections (gunicorn only)")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn worker processes")
+    parser.add_argument("--threads", type=int, default=1, help="threads per gunicorn worker")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/load-<commit>-<time>.json)")
+    args = parser.parse_args()
+
+    if args.database is None:
+        args.database = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='solar-bench-'), 'bench.db')}"
+
+    results = run_testclient(args) if args.target == "testclient" else run_gunicorn(args)
+
+    print_table(results)
+    config = dict(vars(args), database=args.database.split("://", 1)[0])  # keep credentials out of results
+    path = write_results(f"load-{args.target}", config, results, args.output)
+    print(f"\nResults written to {path}")
+
+
+if __name__ == "__main__":
+    main()
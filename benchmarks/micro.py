@@ -0,0 +1,112 @@
+"""Micro-benchmarks for the calculator, the recommendations renderer and the model.
+
+Usage:
+    python benchmarks/micro.py [--samples 1000] [--output results.json]
+
+Each sample times a batch of calls sized (like timeit) so that one sample
+takes at least --min-sample-us; percentiles are per call.
+"""
+import argparse
+import time
+from datetime import datetime
+
+import common  # noqa: F401  (puts the repo root on sys.path)
+from common import print_table, summarize, write_results
+
+from models import LoanApplication
+from utils.appliance_load import appliance_load, current_appliance_catalog
+from utils.application_numbers import new_application_number
+from utils.presentation import format_system_cost
+from utils.system_calculator import (
+    calculate_system_cost, compute_system_cost, get_battery_size, get_html_recommendations, get_system_size
+)
+
+USER_TYPE = {"grid_hours": 10, "usage_type": "household"}
+
+APPLIANCES = [
+    {"type": "LED Lights", "units": 5, "hours_per_day": 8, "backup_included": True,
+     "power_watts": 10, "daily_usage_kwh": 0.4},
+    {"type": "Small Refrigerator", "units": 1, "hours_per_day": 24, "backup_included": True,
+     "power_watts": 150, "daily_usage_kwh": 3.6},
+]
+
+
+def _loan_application():
+    application = LoanApplication(
+        id=1, application_number="SOL-2025-12345", location="Lagos", usage_type="home",
+        grid_hours=10.0, monthly_fuel_cost=45000.0, daily_energy=7.5, maintenance_cost=5000.0,
+        full_name="Ada Obi", email="ada@example.com", phone="08012345678",
+        created_at=datetime(2025, 1, 6, 9, 30), updated_at=datetime(2025, 1, 6, 9, 45)
+    )
+    application.set_appliances(APPLIANCES)
+    return application
+
+
+def _appliance_list(count):
+    """A calculator appliance list cycling through the catalog"""
+    names = current_appliance_catalog().names[:-1]
+    return [{"type": names[i % len(names)], "units": 1 + i % 3, "hours": 2 + i % 20, "backup": True}
+            for i in range(count)]
+
+
+def benchmarks():
+    """Name -> zero-argument callable"""
+    recommendations = format_system_cost(compute_system_cost(7.5, "Lagos", 1, USER_TYPE))
+    application = _loan_application()
+    appliances = _appliance_list(50)
+    return {
+        "get_system_size": lambda: get_system_size(7.5, "Lagos"),
+        "get_battery_size": lambda: get_battery_size(7.5, 1, "household"),
+        "calculate_system_cost": lambda: calculate_system_cost(7.5, "Lagos", 1, USER_TYPE),
+        "get_html_recommendations": lambda: get_html_recommendations(recommendations),
+        "LoanApplication.to_dict": application.to_dict,
+        "appliance_load (50 appliances)": lambda: appliance_load(appliances),
+        "new_application_number": new_application_number,
+    }
+
+
+def _calls_per_sample(func, min_sample_ns):
+    number = 1
+    while True:
+        start = time.perf_counter_ns()
+        for _ in range(number):
+            func()
+        if time.perf_counter_ns() - start >= min_sample_ns:
+            return number
+        number *= 2
+
+
+def run(func, samples, min_sample_ns):
+    number = _calls_per_sample(func, min_sample_ns)
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter_ns()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter_ns() - start) / number)
+    stats = summarize(timings)
+    stats["calls_per_sample"] = number
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=1000)
+    parser.add_argument("--min-sample-us", type=float, default=50.0)
+    parser.add_argument("--only", action="append", help="run only the named benchmark (repeatable)")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/micro-<commit>-<time>.json)")
+    args = parser.parse_args()
+
+    results = {}
+    for name, func in benchmarks().items():
+        if args.only and name not in args.only:
+            continue
+        results[name] = run(func, args.samples, args.min_sample_us * 1000)
+
+    print_table(results, unit="us")
+    path = write_results("micro", vars(args), results, args.output)
+    print(f"\nResults written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects.postgresql import JSONB
 from datetime import datetime
 import json
 
@@ -9,18 +10,18 @@ class LoanApplication(db.Model):
     """Model for loan applications"""
     id = db.Column(db.Integer, primary_key=True)
     application_number = db.Column(db.String(50), unique=True, nullable=False)
-    location = db.Column(db.String(100))
-    usage_type = db.Column(db.String(50))
-    grid_hours = db.Column(db.String(10))
-    monthly_fuel_cost = db.Column(db.String(20))
-    daily_energy = db.Column(db.String(20))
-    maintenance_cost = db.Column(db.String(20))
-    appliances = db.Column(db.Text)  # Stored as JSON string
+    location = db.Column(db.String(100), index=True)
+    usage_type = db.Column(db.String(50), index=True)
+    grid_hours = db.Column(db.Float)
+    monthly_fuel_cost = db.Column(db.Float)
+    daily_energy = db.Column(db.Float)
+    maintenance_cost = db.Column(db.Float)
+    appliances = db.Column(db.JSON().with_variant(JSONB(), 'postgresql'))  # JSONB on Postgres, JSON text on SQLite
     full_name = db.Column(db.String(100))
     email = db.Column(db.String(100))
     phone = db.Column(db.String(20))
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
 
     def __init__(self, application_number, **kwargs):
         self.application_number = application_number
@@ -28,14 +29,15 @@ class LoanApplication(db.Model):
             setattr(self, key, value)
     
     def get_appliances(self):
-        """Convert JSON string to Python list"""
-        if self.appliances:
-            return json.loads(self.appliances)
-        return []
+        """Return the appliances as a Python list"""
+        if isinstance(self.appliances, str):
+            # Rows written before the JSON column migration
+            return json.loads(self.appliances) if self.appliances else []
+        return self.appliances or []
 
     def set_appliances(self, appliances_list):
-        """Convert Python list to JSON string"""
-        self.appliances = json.dumps(appliances_list)
+        """Store a Python list of appliances"""
+        self.appliances = appliances_list
 
     def to_dict(self):
         """Convert model to dictionary"""
@@ -54,4 +56,28 @@ class LoanApplication(db.Model):
             'phone': self.phone,
             'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S') if self.created_at else None,
             'updated_at': self.updated_at.strftime('%Y-%m-%d %H:%M:%S') if self.updated_at else None
-        }
\ No newline at end of file
+        }
+
+
+class LeadRollup(db.Model):
+    """Loan application counts per day created, location, usage type and daily energy bucket.
+
+    Maintained by utils.lead_rollups from LoanApplication, so the admin
+    dashboard reads a few rows per day instead of every application.
+    Unknown locations and usage types are stored as ''.
+    """
+    day = db.Column(db.Date, primary_key=True)
+    location = db.Column(db.String(100), primary_key=True)
+    usage_type = db.Column(db.String(50), primary_key=True)
+    energy_bucket = db.Column(db.SmallInteger, primary_key=True)  # index into ENERGY_BUCKETS_KWH, -1 if unknown
+    leads = db.Column(db.Integer, nullable=False)
+    calculated = db.Column(db.Integer, nullable=False)  # saved by the calculator
+    submitted = db.Column(db.Integer, nullable=False)  # calculated, then sent contact details
+    energy_kwh = db.Column(db.Float, nullable=False)  # sum of daily_energy
+
+
+class RollupWatermark(db.Model):
+    """How far a rollup has processed its source rows"""
+    name = db.Column(db.String(50), primary_key=True)
+    updated_at = db.Column(db.DateTime)  # latest source updated_at included
+    refreshed_at = db.Column(db.DateTime, nullable=False)
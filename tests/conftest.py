@@ -0,0 +1,43 @@
+import base64
+
+import pytest
+
+from app import create_app
+from models import db
+from utils import lead_rollups
+from utils.migrations import upgrade_database
+from utils.system_calculator import api_response_cache, recommendation_cache
+
+@pytest.fixture
+def app(tmp_path):
+    """The app on an empty SQLite database with the current schema"""
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'solar.db'}",
+    })
+    with app.app_context():
+        upgrade_database()
+    yield app
+    # Let a dashboard's background rollup refresh finish before the database goes
+    if lead_rollups._refresh_thread is not None:
+        lead_rollups._refresh_thread.join()
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def admin_auth():
+    """Request headers logging in to the admin pages"""
+    return {'Authorization': 'Basic ' + base64.b64encode(b'admin:solar2025').decode()}
+
+
+@pytest.fixture(autouse=True)
+def empty_caches():
+    recommendation_cache.clear()
+    api_response_cache.clear()
+    yield
@@ -0,0 +1,82 @@
+import html
+import re
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from models import db, LoanApplication
+from utils.database_pg import db_manager
+from utils.lead_rollups import refresh_lead_rollups
+
+
+def _add_applications(app, count, same_time=False):
+    start = datetime(2026, 1, 1)
+    with app.app_context():
+        for i in range(count):
+            db.session.add(LoanApplication(
+                f'APP-{i:02d}', location='Lagos', usage_type='home' if i % 3 else 'business',
+                daily_energy=float(i), created_at=start + timedelta(hours=0 if same_time else i)))
+        db.session.commit()
+
+
+def _listed(response):
+    return re.findall(r'<td>(APP-\d+)</td>', response.get_data(as_text=True))
+
+
+def _link(response, label):
+    """The URL of the Previous or Next link, or None where it is disabled"""
+    match = re.search(rf'<a class="page-link" href="([^"]+)">{label}</a>', response.get_data(as_text=True))
+    return html.unescape(match.group(1)) if match else None
+
+
+def _position(response):
+    return re.search(r'Page \d+ of \d+', response.get_data(as_text=True)).group(0)
+
+
+def test_dashboard_needs_the_admin_login(client):
+    assert client.get('/admin/dashboard').status_code == 401
+
+
+@pytest.mark.parametrize('same_time', [False, True])
+def test_dashboard_pages_newest_first_by_keyset(app, client, admin_auth, same_time):
+    _add_applications(app, 23, same_time)
+    with app.app_context():
+        refresh_lead_rollups()
+
+    first = client.get('/admin/dashboard', headers=admin_auth)
+    assert _listed(first) == [f'APP-{i:02d}' for i in range(22, 12, -1)]
+    assert (_link(first, 'Previous'), _position(first)) == (None, 'Page 1 of 3')
+    second = client.get(_link(first, 'Next'), headers=admin_auth)
+    assert _listed(second) == [f'APP-{i:02d}' for i in range(12, 2, -1)]
+    last = client.get(_link(second, 'Next'), headers=admin_auth)
+    assert _listed(last) == ['APP-02', 'APP-01', 'APP-00']
+    assert (_link(last, 'Next'), _position(last)) == (None, 'Page 3 of 3')
+
+    back = client.get(_link(last, 'Previous'), headers=admin_auth)
+    assert (_listed(back), _position(back)) == (_listed(second), 'Page 2 of 3')
+    back = client.get(_link(back, 'Previous'), headers=admin_auth)
+    assert (_listed(back), _link(back, 'Previous')) == (_listed(first), None)
+
+
+def test_dashboard_ignores_a_malformed_cursor(app, client, admin_auth):
+    _add_applications(app, 3)
+    assert _listed(client.get('/admin/dashboard?after=yesterday', headers=admin_auth)) == ['APP-02', 'APP-01', 'APP-00']
+
+
+def test_dashboard_does_not_count_applications(app, client, admin_auth):
+    _add_applications(app, 3)
+    statements = []
+    with app.app_context():
+        refresh_lead_rollups()  # fresh, so the page starts no background refresh
+        event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+    client.get('/admin/dashboard', headers=admin_auth)
+    assert not [statement for statement in statements if 'count(' in statement.lower()
+                and 'loan_applications' in statement.lower()]
+
+
+def test_dashboard_stats_are_aggregated_in_sql(app):
+    _add_applications(app, 12)
+    with app.app_context():
+        refresh_lead_rollups()
+        assert db_manager.get_dashboard_stats() == {'total': 12, 'home': 8, 'business': 4, 'avg_energy': 5.5}
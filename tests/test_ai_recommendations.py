@@ -0,0 +1,95 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from utils import ai_recommendations
+from utils.ai_recommendations import ai_response_cache, get_system_recommendations
+
+USER_DATA = {'location': '5.5', 'location_name': 'Lagos', 'user_type': 'household', 'usage_type': 'household',
+             'grid_hours': '8', 'daily_energy': '6', 'generator_size': '5', 'generator_fuel': '100',
+             'backup_days': '1', 'budget_range': 'medium'}
+
+RECOMMENDATIONS = {
+    'solar_system': {'total_capacity': '3 kW', 'num_panels': '8', 'panel_type': '400 W monocrystalline'},
+    'battery_system': {'total_capacity': '10 kWh', 'battery_type': 'lithium-ion', 'configuration': '2 in parallel'},
+    'financial': {'estimated_cost': '₦4,000,000', 'monthly_savings': '₦90,000', 'payback_period': '3.7 years'},
+    'installation': {'mounting': 'roof mounted', 'estimated_area': '16 square meters', 'additional_notes': 'None'},
+}
+
+
+class StubModel(BaseHTTPRequestHandler):
+    """Answers /v1/messages like the Messages API, with the server's text, delay and status"""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        self.server.requests += 1
+        time.sleep(self.server.delay)
+        body = json.dumps({
+            'id': 'msg_stub', 'type': 'message', 'role': 'assistant', 'model': ai_recommendations.MODEL,
+            'content': [{'type': 'text', 'text': self.server.text}], 'stop_reason': 'end_turn',
+            'stop_sequence': None, 'usage': {'input_tokens': 1, 'output_tokens': 1},
+        }).encode()
+        self.send_response(self.server.status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def model(monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubModel)
+    server.requests, server.delay, server.status, server.text = 0, 0, 200, json.dumps(RECOMMENDATIONS)
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    monkeypatch.setenv('ANTHROPIC_BASE_URL', f'http://127.0.0.1:{server.server_port}')
+    monkeypatch.setenv('ANTHROPIC_API_KEY', 'test-key')
+    monkeypatch.setattr(ai_recommendations, '_client', None)
+    ai_response_cache.clear()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_model_answers_are_cached(model):
+    result = get_system_recommendations(USER_DATA)
+    assert result['success'] and result['source'] == 'ai'
+    assert '8' in result['recommendations'] and '₦90,000' in result['recommendations']
+
+    assert get_system_recommendations(dict(USER_DATA)) == result
+    assert model.requests == 1
+
+
+def test_slow_model_falls_back_and_its_late_answer_is_cached(model):
+    model.delay = 0.5
+    result = get_system_recommendations(USER_DATA, timeout=0.05)
+    assert result['success'] and result['source'] == 'local'
+
+    deadline = time.monotonic() + 5
+    while ai_response_cache.get(ai_recommendations._cache_key(USER_DATA)) is None:
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+    assert get_system_recommendations(USER_DATA)['source'] == 'ai'
+
+
+@pytest.mark.parametrize('failure', ['server error', 'unusable answer', 'missing key', 'missing field'])
+def test_every_failure_falls_back_to_the_local_calculator(model, monkeypatch, failure):
+    user_data = dict(USER_DATA)
+    if failure == 'server error':
+        model.status = 500
+    elif failure == 'unusable answer':
+        model.text = 'I would suggest a 3 kW system.'
+    elif failure == 'missing key':
+        monkeypatch.delenv('ANTHROPIC_API_KEY')
+    else:
+        del user_data['budget_range']
+
+    result = get_system_recommendations(user_data)
+    assert result['success'] and result['source'] == 'local'
+    assert 'spec-item' in result['recommendations']
+    assert ai_response_cache.stats()['size'] == 0
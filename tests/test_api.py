@@ -0,0 +1,42 @@
+import gzip
+
+SITE = {'location': 'Lagos', 'grid_hours': 6, 'usage_type': 'household', 'daily_energy': 7.5}
+
+
+def test_etag_revalidation_returns_304(client):
+    first = client.get('/api/v1/recommendations', query_string=SITE)
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+
+    repeat = client.get('/api/v1/recommendations', query_string=SITE, headers={'If-None-Match': etag})
+    assert repeat.status_code == 304
+    assert repeat.data == b''
+    assert repeat.headers['ETag'] == etag
+
+    changed = client.get('/api/v1/recommendations', query_string=dict(SITE, daily_energy=8),
+                         headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+
+
+def test_each_encoding_has_its_own_etag(client):
+    plain = client.get('/api/v1/recommendations', query_string=SITE)
+    compressed = client.get('/api/v1/recommendations', query_string=SITE, headers={'Accept-Encoding': 'gzip'})
+
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert compressed.headers['ETag'] != plain.headers['ETag']
+    assert compressed.headers['Vary'] == 'Accept-Encoding'
+    assert gzip.decompress(compressed.data) == plain.data
+    revalidated = client.get('/api/v1/recommendations', query_string=SITE,
+                             headers={'Accept-Encoding': 'gzip', 'If-None-Match': compressed.headers['ETag']})
+    assert revalidated.status_code == 304
+
+
+def test_grid_hours_zero_is_accepted(client):
+    response = client.post('/api/v1/recommendations', json=dict(SITE, grid_hours=0))
+    assert response.status_code == 200
+    assert response.get_json()['recommendations']
+
+    missing = client.post('/api/v1/recommendations', json={'location': 'Lagos', 'daily_energy': 5})
+    assert missing.status_code == 400
+    assert 'grid_hours' in missing.get_json()['error']
@@ -0,0 +1,65 @@
+import csv
+
+import pytest
+
+from utils import database
+from utils.database import LoanApplicationLogger
+
+CALCULATOR_DATA = {'location_name': 'Lagos', 'user_type': 'household', 'grid_hours': '8', 'daily_energy': '6.5',
+                   'appliances': [{'type': 'Ceiling Fan', 'units': 2, 'hours': 8}]}
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    return str(tmp_path / 'loan_applications.csv')
+
+
+def _records(csv_path):
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+
+@pytest.mark.parametrize('append_only', [False, True])
+def test_saves_merge_calculator_data_and_contact_details(csv_path, append_only):
+    log = LoanApplicationLogger(csv_path, append_only=append_only)
+    log.save_calculator_data('SOL-1', CALCULATOR_DATA)
+    log.save_application('Ada', 'ada@example.com', '0801', 'SOL-1')
+    log.save_application('Bola', 'bola@example.com', '0802', 'SOL-2')
+
+    applications = {row['Application Number']: row for row in log.get_all_applications()}
+    assert list(applications) == ['SOL-1', 'SOL-2']
+    assert (applications['SOL-1']['Location'], applications['SOL-1']['Full Name']) == ('Lagos', 'Ada')
+    assert '"hours_per_day": 8' in applications['SOL-1']['Appliances & Equipment']
+    assert applications['SOL-2']['Appliances & Equipment'] == '[]'
+
+
+def test_append_only_log_compacts_superseded_records(csv_path, monkeypatch):
+    monkeypatch.setattr(database, 'COMPACT_MIN_DEAD_RECORDS', 3)
+    log = LoanApplicationLogger(csv_path, append_only=True)
+    log.save_calculator_data('SOL-1', CALCULATOR_DATA)
+    log.save_calculator_data('SOL-2', CALCULATOR_DATA)
+    for name in ('Ada', 'Ade', 'Adaeze'):
+        log.save_application(name, '', '', 'SOL-1')
+
+    # The third superseded record triggered a compaction
+    records = _records(csv_path)
+    assert [row['Application Number'] for row in records] == ['SOL-2', 'SOL-1']
+    assert records[1]['Full Name'] == 'Adaeze'
+    assert log.get_all_applications() == records
+
+
+def test_compact_keeps_records_appended_by_other_processes(csv_path):
+    first = LoanApplicationLogger(csv_path, append_only=True)
+    second = LoanApplicationLogger(csv_path, append_only=True)
+    first.save_calculator_data('SOL-1', CALCULATOR_DATA)
+    second.save_application('Ada', '', '', 'SOL-1')
+    second.save_calculator_data('SOL-2', CALCULATOR_DATA)
+
+    # first's index predates second's appends
+    first.compact()
+    records = _records(csv_path)
+    assert [(row['Application Number'], row['Full Name']) for row in records] == [('SOL-1', 'Ada'), ('SOL-2', '')]
+
+    second.save_application('Bola', '', '', 'SOL-2')
+    assert {row['Application Number']: row['Full Name'] for row in first.get_all_applications()} == \
+        {'SOL-1': 'Ada', 'SOL-2': 'Bola'}
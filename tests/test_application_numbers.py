@@ -0,0 +1,69 @@
+import os
+import re
+import threading
+from datetime import datetime, timedelta, timezone
+
+from utils import application_numbers
+from utils.application_numbers import application_number_time, new_application_number
+
+FORMAT = re.compile(r'^SOL-[0-9A-HJKMNP-TV-Z]{10}-[0-9A-HJKMNP-TV-Z]{10}$')
+
+
+def test_numbers_are_well_formed_and_carry_their_time():
+    before = datetime.now(timezone.utc)
+    number = new_application_number()
+    after = datetime.now(timezone.utc)
+
+    assert FORMAT.match(number)
+    assert before - timedelta(milliseconds=1) <= application_number_time(number) <= after
+
+
+def test_numbers_sort_in_the_order_they_were_made():
+    numbers = [new_application_number() for _ in range(5000)]
+    assert numbers == sorted(numbers)
+    assert len(set(numbers)) == len(numbers)
+
+
+def test_numbers_stay_unique_across_threads():
+    numbers = []
+
+    def make():
+        made = [new_application_number() for _ in range(2000)]
+        numbers.extend(made)
+    threads = [threading.Thread(target=make) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(numbers)) == 8000
+
+
+def test_a_clock_stepping_back_does_not_go_backwards(monkeypatch):
+    first = new_application_number()
+    monkeypatch.setattr(application_numbers.time, 'time_ns', lambda: 0)
+    assert new_application_number() > first
+
+
+def test_exhausted_millisecond_borrows_the_next(monkeypatch):
+    now_ns = (application_numbers._last_ms + 1000) * 1_000_000  # a millisecond no number was made in
+    monkeypatch.setattr(application_numbers.time, 'time_ns', lambda: now_ns)
+    monkeypatch.setattr(application_numbers.secrets, 'randbits', lambda bits: (1 << bits) - 1)
+    first = new_application_number()
+    second = new_application_number()
+
+    assert second > first
+    assert application_number_time(second) - application_number_time(first) == timedelta(milliseconds=1)
+
+
+def test_forked_worker_starts_its_own_sequence(monkeypatch):
+    new_application_number()
+    monkeypatch.setattr(application_numbers, '_last_ms', 1 << 49)  # far in the future
+    pid = os.getpid()
+    monkeypatch.setattr(application_numbers.os, 'getpid', lambda: pid + 1)
+    number = new_application_number()
+    assert application_number_time(number).year == datetime.now(timezone.utc).year
+
+
+def test_other_formats_have_no_time():
+    for number in ('APP-20240101-0001', 'SOL-01JC8XQZ4M', 'SOL-01JC8XQZ4U-7K2D9FQW3B', None, 42):
+        assert application_number_time(number) is None
@@ -0,0 +1,51 @@
+import itertools
+import math
+
+import numpy as np
+
+from utils.batch_calculator import calculate_system_cost_batch
+from utils.system_calculator import compute_system_cost
+
+LOCATIONS = ['Lagos', 'Abuja', 'Kano', 'Port Harcourt', 'Nowhere']
+DAILY_ENERGY = [0.4, 3, 7.5, 18.2, 60, 250]
+GRID_HOURS = [0, 4, 7.9, 8, 12, 12.5, 16, 16.5, 24]
+USAGE_TYPES = ['household', 'business', 'dual', 'other']
+BATTERY_TYPES = ['lithium-ion', 'gel', 'lead-acid']
+
+COLUMNS = (
+    'system_size_kw', 'panel_count', 'battery_size_kwh', 'battery_count', 'inverter_size', 'charge_controller_size',
+    'solar_panels_cost', 'batteries_cost', 'inverter_cost', 'charge_controller_cost', 'bos_cost',
+    'installation_cost', 'total_cost', 'monthly_savings', 'payback_years',
+)
+BACKUP_COLUMNS = {
+    'batteries_cost': 'backup_only_batteries_cost',
+    'inverter_cost': 'backup_only_inverter_cost',
+    'bos_cost': 'backup_only_bos_cost',
+    'installation_cost': 'backup_only_installation_cost',
+    'total_cost': 'backup_only_total_cost',
+    'monthly_savings': 'backup_only_monthly_savings',
+    'payback_years': 'backup_only_payback_years',
+}
+
+
+def test_every_row_matches_the_scalar_calculator():
+    scenarios = list(itertools.product(DAILY_ENERGY, LOCATIONS, GRID_HOURS, USAGE_TYPES, BATTERY_TYPES))
+    energy, location, grid_hours, usage_type, battery_type = (np.array(column) for column in zip(*scenarios))
+    batch = calculate_system_cost_batch(energy, location, grid_hours, usage_type, battery_type=battery_type)
+
+    for i, (e, loc, grid, usage, battery) in enumerate(scenarios):
+        scalar = compute_system_cost(e, loc, 1, {'grid_hours': grid, 'usage_type': usage}, battery)
+        assert batch['system_type'][i] == scalar.system_type, scenarios[i]
+        for column in COLUMNS:
+            assert batch[column][i] == getattr(scalar, column), (scenarios[i], column)
+        if scalar.backup_only is None:
+            assert all(math.isnan(batch[column][i]) for column in BACKUP_COLUMNS.values())
+        else:
+            for field, column in BACKUP_COLUMNS.items():
+                assert batch[column][i] == getattr(scalar.backup_only, field), (scenarios[i], column)
+
+
+def test_scalar_inputs_broadcast():
+    batch = calculate_system_cost_batch([2, 5, 9], 'Lagos', 6, 'household')
+    assert batch['total_cost'].shape == (3,)
+    assert list(batch['system_type']) == ['full_solar'] * 3
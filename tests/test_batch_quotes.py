@@ -0,0 +1,95 @@
+import json
+
+import pytest
+
+import app as app_module
+from app import create_app
+from models import db, LoanApplication
+from utils.rate_limit import RateLimiter
+
+SITE = {'location': 'Lagos', 'grid_hours': 6, 'usage_type': 'household', 'daily_energy': 7.5}
+
+
+@pytest.fixture(autouse=True)
+def no_batch_rate_limit(monkeypatch):
+    monkeypatch.setattr(app_module, 'batch_rate_limiter', RateLimiter(0))
+
+
+def _batch_lines(response):
+    # Closing the response releases its batch slot, as the server does once it is sent
+    with response:
+        return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_batch_quotes_match_single_quotes(client):
+    sites = [dict(SITE, id='a'), dict(SITE, grid_hours=0, id='b'),
+             {'location': 'Kano', 'grid_hours': 20, 'appliances': [{'type': 'Ceiling Fan', 'units': 2, 'hours': 8}]},
+             {'location': 'Kano'}]
+    lines = _batch_lines(client.post('/api/v1/quotes/batch', json=sites))
+
+    for index, site in enumerate(sites[:3]):
+        single = client.post('/api/v1/recommendations', json=site).get_json()
+        assert lines[index]['recommendations'] == single['recommendations']
+    assert (lines[0]['id'], lines[1]['id']) == ('a', 'b')
+    assert 'Missing required fields' in lines[3]['error']
+    assert lines[-1]['summary']['quoted'] == 3
+    assert lines[-1]['summary']['failed'] == 1
+
+
+def test_batch_save_needs_the_admin_login_and_mints_numbers(app, client, admin_auth):
+    with app.app_context():
+        db.session.add(LoanApplication('EXISTING', location='Abuja'))
+        db.session.commit()
+    sites = [dict(SITE, application_number='EXISTING', location_name='Lagos')]
+
+    assert client.post('/api/v1/quotes/batch?save=1', json=sites).status_code == 401
+    lines = _batch_lines(client.post('/api/v1/quotes/batch?save=1', json=sites, headers=admin_auth))
+
+    assert lines[0]['application_number'].startswith('SOL-')
+    assert lines[-1]['summary']['saved'] == 1
+    with app.app_context():
+        locations = dict(db.session.query(LoanApplication.application_number, LoanApplication.location))
+    assert locations == {'EXISTING': 'Abuja', lines[0]['application_number']: 'Lagos'}
+
+
+def test_batch_quotes_are_rate_limited(client, monkeypatch):
+    monkeypatch.setattr(app_module, 'batch_rate_limiter', RateLimiter(1, burst=1))
+    with client.post('/api/v1/quotes/batch', json=[SITE]) as response:
+        assert response.status_code == 200
+    limited = client.post('/api/v1/quotes/batch', json=[SITE])
+    assert limited.status_code == 429
+    assert int(limited.headers['Retry-After']) > 0
+
+
+def _limited_clients(app, monkeypatch, requests):
+    """Status codes of batch requests, each (client address, extra headers), under a rate of one"""
+    monkeypatch.setattr(app_module, 'batch_rate_limiter', RateLimiter(1, burst=1))
+    client = app.test_client()
+    codes = []
+    for address, headers in requests:
+        with client.post('/api/v1/quotes/batch', json=[SITE], headers=headers,
+                         environ_base={'REMOTE_ADDR': address}) as response:
+            codes.append(response.status_code)
+    return codes
+
+
+def test_forwarded_addresses_are_ignored_without_proxies(app, monkeypatch):
+    codes = _limited_clients(app, monkeypatch, [('10.0.0.1', {'X-Forwarded-For': '198.51.100.1'}),
+                                                ('10.0.0.1', {'X-Forwarded-For': '198.51.100.2'})])
+    assert codes == [200, 429]
+
+
+def test_clients_behind_a_trusted_proxy_are_limited_apart(tmp_path, monkeypatch):
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'proxied.db'}",
+                      'PROXY_HOPS': 1})
+    # The client's own X-Forwarded-For entry comes first; only the proxy's is trusted
+    codes = _limited_clients(app, monkeypatch, [('10.0.0.1', {'X-Forwarded-For': '198.51.100.1'}),
+                                                ('10.0.0.1', {'X-Forwarded-For': '203.0.113.9, 198.51.100.2'}),
+                                                ('10.0.0.1', {'X-Forwarded-For': '203.0.113.7, 198.51.100.1'})])
+    assert codes == [200, 200, 429]
+
+
+def test_logged_in_clients_are_limited_by_login(app, monkeypatch, admin_auth):
+    codes = _limited_clients(app, monkeypatch, [('10.0.0.1', admin_auth), ('10.0.0.2', admin_auth),
+                                                ('10.0.0.2', {})])
+    assert codes == [200, 429, 200]
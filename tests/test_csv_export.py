@@ -0,0 +1,61 @@
+import csv
+import gzip
+import io
+from datetime import datetime
+
+from models import db, LoanApplication
+from utils.database_pg import db_manager
+
+
+def _add_applications(app):
+    with app.app_context():
+        db.session.add_all([
+            LoanApplication('APP-1', location='Lagos', grid_hours=8.0, daily_energy=6.5, appliances=[{'type': 'Fan'}],
+                            full_name='Ada', created_at=datetime(2026, 3, 1, 9, 30)),
+            LoanApplication('APP-2', location='Kano', grid_hours=12.0, created_at=datetime(2026, 3, 2, 18, 0)),
+            LoanApplication('APP-3', location='Lagos', created_at=datetime(2026, 3, 3, 7, 15)),
+        ])
+        db.session.commit()
+
+
+def _rows(data):
+    return list(csv.DictReader(io.StringIO(data.decode())))
+
+
+def test_export_is_streamed_with_every_column(app, client, admin_auth):
+    _add_applications(app)
+    response = client.get('/admin/download-applications', headers=admin_auth)
+
+    assert response.is_streamed
+    assert response.mimetype == 'text/csv'
+    rows = _rows(response.data)
+    assert [row['Application Number'] for row in rows] == ['APP-1', 'APP-2', 'APP-3']
+    assert rows[0]['Grid Hours'] == '8'
+    assert rows[0]['Daily Energy'] == '6.5'
+    assert rows[0]['Appliances & Equipment'] == '[{"type": "Fan"}]'
+    assert rows[0]['Created At'] == '2026-03-01 09:30:00'
+    assert rows[2]['Appliances & Equipment'] == '[]'
+
+
+def test_export_filters_and_gzip(app, client, admin_auth):
+    _add_applications(app)
+    response = client.get('/admin/download-applications?start=2026-03-01&end=2026-03-02&location=Lagos&gzip=1',
+                          headers=admin_auth)
+
+    assert response.mimetype == 'application/gzip'
+    assert response.headers['Content-Disposition'].endswith('.csv.gz')
+    assert [row['Application Number'] for row in _rows(gzip.decompress(response.data))] == ['APP-1']
+
+
+def test_export_of_nothing_is_not_found(app, client, admin_auth):
+    _add_applications(app)
+    assert client.get('/admin/download-applications?start=2027-01-01', headers=admin_auth).status_code == 404
+    assert client.get('/admin/download-applications?start=March', headers=admin_auth).status_code == 400
+
+
+def test_export_chunks_hold_one_batch_each(app):
+    _add_applications(app)
+    with app.app_context():
+        chunks = list(db_manager.iter_csv_export(batch_size=2))
+        assert [chunk.count('\n') for chunk in chunks] == [3, 1]
+        assert ''.join(chunks) == db_manager.export_to_csv()
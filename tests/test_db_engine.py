@@ -0,0 +1,89 @@
+import pytest
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from utils import db_engine
+from utils.db_engine import engine_options, is_transient_disconnect, with_retry
+
+
+class DriverError(Exception):
+    """A psycopg2-style error carrying the server's SQLSTATE"""
+
+    def __init__(self, pgcode):
+        super().__init__(f'SQLSTATE {pgcode}')
+        self.pgcode = pgcode
+
+
+def _error(pgcode, kind=OperationalError, invalidated=False):
+    return kind('SELECT 1', {}, DriverError(pgcode), connection_invalidated=invalidated)
+
+
+def test_engine_options_size_the_pool_per_database(monkeypatch):
+    monkeypatch.setattr(db_engine, 'STATEMENT_TIMEOUT_MS', 5000)
+    options = engine_options('postgresql://solar@db/solar')
+    assert options == {
+        'pool_pre_ping': db_engine.POOL_PRE_PING, 'pool_size': db_engine.POOL_SIZE,
+        'max_overflow': db_engine.MAX_OVERFLOW, 'pool_timeout': db_engine.POOL_TIMEOUT,
+        'pool_recycle': db_engine.POOL_RECYCLE,
+        'connect_args': {'connect_timeout': db_engine.CONNECT_TIMEOUT, 'options': '-c statement_timeout=5000'},
+    }
+    assert 'connect_args' not in engine_options('sqlite:////tmp/solar.db')
+    assert engine_options('sqlite://') == engine_options(None) == {'pool_pre_ping': db_engine.POOL_PRE_PING}
+
+
+@pytest.mark.parametrize('error, transient', [
+    (_error('08006'), True),
+    (_error('57P01'), True),
+    (_error(None), True),
+    (_error('40001'), False),
+    (_error('23505', IntegrityError), False),
+    (_error(None, IntegrityError), False),
+    (OperationalError('SELECT 1', {}, Exception('database is locked')), False),
+    (OperationalError('SELECT 1', {}, Exception('closed'), connection_invalidated=True), True),
+    (ValueError('not a database error'), False),
+])
+def test_transient_disconnects(error, transient):
+    assert is_transient_disconnect(error) is transient
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    delays = []
+    monkeypatch.setattr(db_engine.time, 'sleep', delays.append)
+    return delays
+
+
+def test_transient_disconnects_are_retried_with_backoff(app, no_sleep):
+    calls = []
+
+    @with_retry
+    def save():
+        calls.append(1)
+        if len(calls) < db_engine.RETRY_ATTEMPTS:
+            raise _error('57P01')
+        return 'saved'
+
+    retries = db_engine._retries
+    with app.app_context():
+        assert save() == 'saved'
+    assert len(calls) == db_engine.RETRY_ATTEMPTS
+    assert db_engine._retries == retries + db_engine.RETRY_ATTEMPTS - 1
+    assert all(0 <= delay <= min(db_engine.RETRY_MAX_DELAY, db_engine.RETRY_BASE_DELAY * 2 ** attempt)
+               for attempt, delay in enumerate(no_sleep))
+
+
+def test_other_errors_and_the_last_attempt_are_raised(app, no_sleep):
+    calls = []
+
+    @with_retry
+    def save(error):
+        calls.append(1)
+        raise error
+
+    with app.app_context():
+        with pytest.raises(IntegrityError):
+            save(_error('23505', IntegrityError))
+        assert len(calls) == 1
+
+        with pytest.raises(OperationalError):
+            save(_error('08006'))
+    assert len(calls) == 1 + db_engine.RETRY_ATTEMPTS
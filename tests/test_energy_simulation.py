@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from utils.energy_simulation import (
+    DAYS_PER_YEAR, FUEL_PRICE_PER_LITRE, GENERATOR_LITRES_PER_KWH, HOURS_PER_YEAR, _clamped_cumsum,
+    grid_availability, load_profile, simulate_energy_system, solar_profile
+)
+
+
+@pytest.mark.parametrize('hours', [HOURS_PER_YEAR, 24 * 7, 50])
+def test_clamped_cumsum_matches_a_loop(hours):
+    rng = np.random.default_rng(1)
+    shift = rng.normal(0, 2, (3, hours))
+    lower, upper, start = np.array([0.0, 1.0, 2.0]), np.array([5.0, 10.0, 2.5]), np.array([5.0, 3.0, 2.0])
+
+    expected = np.empty_like(shift)
+    soc = start.copy()
+    for hour in range(hours):
+        soc = np.clip(soc + shift[:, hour], lower, upper)
+        expected[:, hour] = soc
+    assert np.allclose(_clamped_cumsum(shift, lower[:, None], upper[:, None], start), expected)
+
+
+def test_profiles_match_their_daily_figures():
+    solar = solar_profile(5.5).reshape(DAYS_PER_YEAR, 24)
+    assert solar.sum(axis=1).mean() == pytest.approx(5.5)
+    assert not solar[:, [0, 1, 2, 22, 23]].any()
+
+    assert (grid_availability(8).reshape(DAYS_PER_YEAR, 24).sum(axis=1) == 8).all()
+    assert grid_availability(30).all() and not grid_availability(-1).any()
+
+    load = load_profile(daily_energy_kwh=6).reshape(DAYS_PER_YEAR, 24)
+    assert load.sum(axis=1).mean() == pytest.approx(6, rel=0.02)
+    hourly = np.zeros(24)
+    hourly[19:22] = 0.5
+    day = load_profile(hourly, variability=0).reshape(DAYS_PER_YEAR, 24)
+    assert (day == hourly).all()
+
+
+def _simulate(pv_kw, battery_kwh, grid_hours=6, generator=True):
+    return simulate_energy_system(
+        pv_kw=pv_kw, battery_kwh=battery_kwh, inverter_kw=3, load_kw=load_profile(daily_energy_kwh=8),
+        solar_kwh_per_kw=solar_profile(5), grid_available=grid_availability(grid_hours), generator=generator)
+
+
+def test_scenarios_broadcast_like_single_runs():
+    pv_kw, battery_kwh = np.array([[1.0], [3.0]]), np.array([0.0, 5.0, 10.0])
+    batch = _simulate(pv_kw, battery_kwh)
+    for i, pv in enumerate(pv_kw[:, 0]):
+        for j, battery in enumerate(battery_kwh):
+            single = _simulate(pv, battery)
+            for name, value in single.items():
+                assert batch[name][i, j] == pytest.approx(value), name
+
+
+def test_more_pv_and_battery_never_leave_more_load_unmet():
+    results = _simulate(np.array([[0.0], [2.0], [4.0]]), np.array([0.0, 5.0, 10.0]))
+    unmet = results['unmet_kwh']
+    assert (np.diff(unmet, axis=0) <= 1e-6).all() and (np.diff(unmet, axis=1) <= 1e-6).all()
+    assert np.allclose(results['generator_fuel_cost'],
+                       results['generator_kwh'] * GENERATOR_LITRES_PER_KWH * FUEL_PRICE_PER_LITRE)
+
+
+def test_extreme_systems():
+    always_on = _simulate(0, 0, grid_hours=24)
+    assert always_on['unmet_kwh'] == 0
+    assert always_on['grid_import_kwh'] == pytest.approx(always_on['load_kwh'])
+
+    nothing = _simulate(0, 0, grid_hours=0, generator=False)
+    assert nothing['unserved_kwh'] == pytest.approx(nothing['load_kwh'])
+    assert nothing['loss_of_load_probability'] == 1
+    assert nothing['generator_kwh'] == 0
@@ -0,0 +1,89 @@
+import csv
+import io
+
+import pytest
+
+from utils.database import FIELDNAMES
+from utils.database_pg import db_manager
+from utils.lead_import import import_leads
+
+
+def _csv(*records):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(FIELDNAMES)
+    for record in records:
+        writer.writerow(record)
+    return out.getvalue()
+
+
+def _record(number, location='Lagos', daily_energy='6', name='Ada', updated_at='2026-01-02 09:00:00', **overrides):
+    record = dict(zip(FIELDNAMES, [
+        number, location, 'home', '8', '50000', daily_energy, '', '[{"type": "fridge"}]',
+        name, 'ada@example.com', '0800', '2026-01-01 09:00:00', updated_at]))
+    record.update(overrides)
+    return [record[name] for name in FIELDNAMES]
+
+
+def _application(app, number):
+    with app.app_context():
+        return db_manager.get_application_by_number(number)
+
+
+def test_rows_are_loaded_and_bad_ones_rejected(app):
+    data = _csv(
+        _record('APP-1'),
+        _record('APP-2', location='', daily_energy='lots'),
+        _record('APP-1', name='Ada Later'),  # same batch: the last one read wins
+        _record(''),
+        _record('APP-3', **{'Appliances & Equipment': 'fridge'}),
+        _record('APP-4', **{'Phone': '0' * 21}),
+        ['APP-5', 'Lagos'],
+    )
+    with app.app_context():
+        result = import_leads(io.StringIO(data), batch_size=10)
+
+    assert {key: result[key] for key in ('rows_read', 'rows_loaded', 'rows_superseded', 'rows_rejected')} == \
+        {'rows_read': 7, 'rows_loaded': 2, 'rows_superseded': 1, 'rows_rejected': 4}
+    assert result['rejected_examples'] == [
+        'line 5: missing application number', 'line 6: appliances is not valid JSON',
+        'line 7: phone longer than 20 characters', 'line 8: expected 13 fields, found 2']
+
+    first = _application(app, 'APP-1')
+    assert (first['full_name'], first['daily_energy'], first['maintenance_cost']) == ('Ada Later', 6.0, None)
+    assert first['appliances'] == [{'type': 'fridge'}]
+    assert first['created_at'] == '2026-01-01 09:00:00'
+    second = _application(app, 'APP-2')
+    assert (second['location'], second['daily_energy']) == (None, None)
+
+
+def test_reimport_never_overwrites_newer_rows(app):
+    with app.app_context():
+        import_leads(io.StringIO(_csv(_record('APP-1'), _record('APP-2'))))
+        result = import_leads(io.StringIO(_csv(
+            _record('APP-1', name='Older', updated_at='2026-01-01 12:00:00'),
+            _record('APP-2', name='Newer', updated_at='2026-01-03 12:00:00'))), batch_size=1)
+
+    assert result['rows_loaded'] == 2
+    assert _application(app, 'APP-1')['full_name'] == 'Ada'
+    assert _application(app, 'APP-2')['full_name'] == 'Newer'
+
+
+def test_missing_columns_are_refused(app):
+    header = ','.join(name for name in FIELDNAMES if name != 'Email')
+    with app.app_context(), pytest.raises(ValueError, match='missing columns: Email'):
+        import_leads(io.StringIO(header + '\n'))
+
+
+def test_cli_imports_and_rebuilds_the_rollups(app, tmp_path):
+    path = tmp_path / 'leads.csv'
+    path.write_text(_csv(_record('APP-1'), _record('APP-2'), _record('')), encoding='utf-8')
+
+    result = app.test_cli_runner().invoke(args=['import-leads', str(path), '--batch-size', '1'])
+
+    assert result.exit_code == 0, result.output
+    assert '2 loaded, 0 superseded by a later row, 1 rejected' in result.output
+    assert 'rejected line 4: missing application number' in result.output
+    assert 'Rebuilt lead rollups for 1 days' in result.output
+    with app.app_context():
+        assert db_manager.get_dashboard_stats()['total'] == 2
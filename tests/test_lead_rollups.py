@@ -0,0 +1,104 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from models import db, LeadRollup, LoanApplication, RollupWatermark
+from utils import lead_rollups
+from utils.database_pg import db_manager
+from utils.lead_rollups import WATERMARK, lead_trends, refresh_lead_rollups
+
+
+def _save(application_number, location, energy, contact=False):
+    db_manager.save_calculator_data(application_number, {'location_name': location, 'user_type': 'home',
+                                                         'daily_energy': energy})
+    if contact:
+        db_manager.save_application('Ada', 'ada@example.com', '0800', application_number)
+
+
+def _counts():
+    return {
+        (row.location, row.energy_bucket): (row.leads, row.calculated, row.submitted)
+        for row in db.session.query(LeadRollup)
+    }
+
+
+def test_first_refresh_is_full_and_later_ones_incremental(app):
+    with app.app_context():
+        _save('APP-1', 'Lagos', 3, contact=True)
+        assert refresh_lead_rollups()['full']
+        watermark = db.session.get(RollupWatermark, WATERMARK).updated_at
+
+        _save('APP-2', 'Lagos', 3)
+        _save('APP-3', 'Kano', 30)
+        result = refresh_lead_rollups()
+
+        assert not result['full']
+        assert db.session.get(RollupWatermark, WATERMARK).updated_at > watermark
+        assert _counts() == {('Lagos', 1): (2, 2, 1), ('Kano', 4): (1, 1, 0)}
+
+
+def test_changed_application_is_recounted_not_added_again(app):
+    with app.app_context():
+        _save('APP-1', 'Lagos', 3)
+        refresh_lead_rollups()
+        _save('APP-1', 'Abuja', 12, contact=True)
+        refresh_lead_rollups()
+
+        assert _counts() == {('Abuja', 3): (1, 1, 1)}
+
+
+def test_rows_written_within_the_overlap_are_picked_up(app):
+    with app.app_context():
+        _save('APP-1', 'Lagos', 3)
+        refresh_lead_rollups()
+        # Committed after the refresh, with an updated_at it had already read past
+        watermark = db.session.get(RollupWatermark, WATERMARK).updated_at
+        _save('APP-2', 'Kano', 3)
+        db.session.execute(update(LoanApplication).where(LoanApplication.application_number == 'APP-2')
+                           .values(updated_at=watermark - lead_rollups.WATERMARK_OVERLAP / 2))
+        db.session.commit()
+        refresh_lead_rollups()
+
+        assert _counts() == {('Lagos', 1): (1, 1, 0), ('Kano', 1): (1, 1, 0)}
+
+
+def test_full_refresh_picks_up_rows_behind_the_watermark(app):
+    with app.app_context():
+        _save('APP-1', 'Lagos', 3)
+        refresh_lead_rollups()
+        # An imported row keeps its own, older timestamps
+        _save('APP-2', 'Kano', 3)
+        month_ago = datetime.utcnow() - timedelta(days=30)
+        db.session.execute(update(LoanApplication).where(LoanApplication.application_number == 'APP-2')
+                           .values(created_at=month_ago, updated_at=month_ago))
+        db.session.commit()
+
+        refresh_lead_rollups()
+        assert ('Kano', 1) not in _counts()
+        refresh_lead_rollups(full=True)
+        assert _counts()[('Kano', 1)] == (1, 1, 0)
+
+
+def test_trends_are_read_from_the_rollups(app):
+    with app.app_context():
+        _save('APP-1', 'Lagos', 3, contact=True)
+        _save('APP-2', 'Lagos', 7)
+        refresh_lead_rollups()
+        trends = lead_trends(days=7)
+
+        assert (trends['leads'], trends['calculated'], trends['submitted'], trends['conversion']) == (2, 2, 1, 50.0)
+        assert len(trends['daily']) == 7
+        assert trends['daily'][-1]['leads'] == 2
+        assert trends['locations'][0]['name'] == 'Lagos'
+
+
+def test_dashboard_refreshes_in_the_background(app, client, admin_auth):
+    with app.app_context():
+        _save('APP-1', 'Lagos', 3)
+
+    response = client.get('/admin/dashboard', headers=admin_auth)
+    assert response.status_code == 200
+    lead_rollups._refresh_thread.join(5)
+
+    with app.app_context():
+        assert _counts() == {('Lagos', 1): (1, 1, 0)}
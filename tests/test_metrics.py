@@ -0,0 +1,121 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from utils import metrics
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """An empty set of histograms and collectors, with one of each kind registered"""
+    monkeypatch.setattr(metrics, '_histograms', {})
+    monkeypatch.setattr(metrics, '_collectors', {})
+    histogram = metrics.Histogram('test_seconds', 'Test durations', ('route',), (0.1, 1.0))
+    values = {'requests': 0, 'pending': 0}
+    metrics.register_collector('test_requests_total', 'counter', 'Test requests', ('kind',),
+                               lambda: {('a"b',): values['requests']})
+    metrics.register_collector('test_pending', 'gauge', 'Test queue depth', (), lambda: {(): values['pending']})
+    return histogram, values
+
+
+@pytest.fixture
+def multiproc_dir(tmp_path, monkeypatch, registry):
+    monkeypatch.setattr(metrics, 'MULTIPROC_DIR', str(tmp_path))
+    monkeypatch.setattr(metrics, '_flushed_pid', None)
+    monkeypatch.setattr(metrics, '_exited', False)
+    return tmp_path
+
+
+def _dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+def _write_worker(directory, pid, requests, pending, observations):
+    rows = [['test_requests_total', ['a"b'], [requests]], ['test_pending', [], [pending]],
+            ['test_seconds', ['/'], observations]]
+    (directory / f'metrics-{pid}.json').write_text(json.dumps(rows))
+
+
+def test_exposition_format(registry):
+    histogram, values = registry
+    histogram.observe(('/',), 0.05)
+    histogram.observe(('/',), 0.5)
+    histogram.observe(('/',), 5)
+    values.update(requests=3, pending=2)
+
+    assert metrics.render() == '\n'.join([
+        '# HELP test_seconds Test durations',
+        '# TYPE test_seconds histogram',
+        'test_seconds_bucket{route="/",le="0.1"} 1',
+        'test_seconds_bucket{route="/",le="1.0"} 2',
+        'test_seconds_bucket{route="/",le="+Inf"} 3',
+        'test_seconds_sum{route="/"} 5.55',
+        'test_seconds_count{route="/"} 3',
+        '# HELP test_requests_total Test requests',
+        '# TYPE test_requests_total counter',
+        'test_requests_total{kind="a\\"b"} 3',
+        '# HELP test_pending Test queue depth',
+        '# TYPE test_pending gauge',
+        'test_pending 2',
+    ]) + '\n'
+
+
+def test_metrics_endpoint_requires_auth(client, admin_auth):
+    assert client.get('/metrics').status_code == 401
+    response = client.get('/metrics', headers=admin_auth)
+    assert response.status_code == 200
+    assert response.content_type == metrics.CONTENT_TYPE
+    assert '# TYPE solar_request_duration_seconds histogram' in response.get_data(as_text=True)
+
+
+def test_workers_are_summed(multiproc_dir, registry):
+    _, values = registry
+    values.update(requests=1, pending=1)
+    _write_worker(multiproc_dir, os.getppid(), 10, 4, [1, 0, 0, 0.05])
+
+    totals = metrics.collect()
+    assert totals[('test_requests_total', ('a"b',))] == [11]
+    assert totals[('test_pending', ())] == [5]
+    assert totals[('test_seconds', ('/',))] == [1, 0, 0, 0.05]
+
+
+def test_exited_workers_keep_their_counts_but_not_their_gauges(multiproc_dir, registry):
+    _, values = registry
+    values.update(requests=1, pending=1)
+    for pid in (_dead_pid(), _dead_pid()):
+        _write_worker(multiproc_dir, pid, 10, 4, [1, 0, 0, 0.05])
+
+    for _ in range(2):
+        totals = metrics.collect()
+        assert totals[('test_requests_total', ('a"b',))] == [21]
+        assert totals[('test_pending', ())] == [1]
+        assert totals[('test_seconds', ('/',))] == [2, 0, 0, 0.1]
+    assert set(os.listdir(multiproc_dir)) == {'metrics-archive.json', f'metrics-{os.getpid()}.json', 'metrics.lock'}
+
+
+def test_reused_pid_does_not_lose_counts(multiproc_dir, registry):
+    _, values = registry
+    values.update(requests=1, pending=1)
+    # Left by an earlier process that had this pid and was killed
+    _write_worker(multiproc_dir, os.getpid(), 10, 4, [1, 0, 0, 0.05])
+
+    totals = metrics.collect()
+    assert totals[('test_requests_total', ('a"b',))] == [11]
+    assert totals[('test_pending', ())] == [1]
+
+
+def test_exit_archives_the_final_totals(multiproc_dir, registry):
+    _, values = registry
+    values.update(requests=7, pending=3)
+    metrics._exit()
+    values.update(requests=8)
+    metrics.flush()
+
+    assert not os.path.exists(multiproc_dir / f'metrics-{os.getpid()}.json')
+    archive = json.loads((multiproc_dir / 'metrics-archive.json').read_text())
+    assert archive == [['test_requests_total', ['a"b'], [7]]]
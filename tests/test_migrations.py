@@ -0,0 +1,90 @@
+import pytest
+from sqlalchemy import inspect, text
+
+from app import create_app
+from models import db, LeadRollup, LoanApplication
+from utils.migrations import upgrade_database
+
+# loan_application as created before the numeric and JSON column types
+LEGACY_SCHEMA = """
+CREATE TABLE loan_application (
+    id INTEGER NOT NULL PRIMARY KEY,
+    application_number VARCHAR(50) NOT NULL UNIQUE,
+    location VARCHAR(100),
+    usage_type VARCHAR(50),
+    grid_hours VARCHAR(10),
+    monthly_fuel_cost VARCHAR(20),
+    daily_energy VARCHAR(20),
+    maintenance_cost VARCHAR(20),
+    appliances TEXT,
+    full_name VARCHAR(100),
+    email VARCHAR(100),
+    phone VARCHAR(20),
+    created_at DATETIME,
+    updated_at DATETIME
+)
+"""
+
+LEGACY_ROWS = [
+    ("APP-1", "12", "45000", " 7.5 ", "", '[{"type": "Ceiling Fan", "units": 2}]'),
+    ("APP-2", "abc", "1.2.3", "", None, ""),
+    ("APP-3", None, "-5", ".5", "100", None),
+]
+
+
+@pytest.fixture
+def legacy_app(tmp_path):
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'legacy.db'}"})
+    with app.app_context():
+        with db.engine.begin() as connection:
+            connection.execute(text(LEGACY_SCHEMA))
+            for number, grid, fuel, energy, maintenance, appliances in LEGACY_ROWS:
+                connection.execute(text(
+                    "INSERT INTO loan_application (application_number, grid_hours, monthly_fuel_cost, daily_energy, "
+                    "maintenance_cost, appliances, created_at, updated_at) "
+                    "VALUES (:number, :grid, :fuel, :energy, :maintenance, :appliances, "
+                    "'2025-01-02 03:04:05', '2025-01-02 03:04:05')"
+                ), dict(number=number, grid=grid, fuel=fuel, energy=energy, maintenance=maintenance,
+                        appliances=appliances))
+        yield app
+        db.engine.dispose()
+
+
+def _rows():
+    return {
+        application.application_number: application
+        for application in db.session.query(LoanApplication).order_by(LoanApplication.id)
+    }
+
+
+def test_legacy_columns_become_numbers_and_json(legacy_app):
+    with legacy_app.app_context():
+        upgrade_database()
+        rows = _rows()
+
+        assert (rows['APP-1'].grid_hours, rows['APP-1'].monthly_fuel_cost, rows['APP-1'].daily_energy) == (12, 45000, 7.5)
+        assert rows['APP-1'].maintenance_cost is None
+        assert rows['APP-1'].get_appliances() == [{'type': 'Ceiling Fan', 'units': 2}]
+        # Values that are not plain numbers become NULL rather than failing the migration
+        assert (rows['APP-2'].grid_hours, rows['APP-2'].monthly_fuel_cost, rows['APP-2'].daily_energy) == (None,) * 3
+        assert rows['APP-2'].get_appliances() == []
+        assert (rows['APP-3'].monthly_fuel_cost, rows['APP-3'].daily_energy) == (None, 0.5)
+        assert rows['APP-3'].get_appliances() == []
+
+
+def test_creates_missing_tables_and_indexes(legacy_app):
+    with legacy_app.app_context():
+        upgrade_database()
+        inspector = inspect(db.engine)
+        assert inspector.has_table(LeadRollup.__tablename__)
+        indexed = {tuple(index['column_names']) for index in inspector.get_indexes(LoanApplication.__tablename__)}
+        assert {('created_at',), ('updated_at',), ('location',), ('usage_type',)} <= indexed
+
+
+def test_can_run_again(legacy_app):
+    with legacy_app.app_context():
+        upgrade_database()
+        before = {number: application.to_dict() for number, application in _rows().items()}
+        db.session.remove()
+        upgrade_database()
+        assert {number: application.to_dict() for number, application in _rows().items()} == before
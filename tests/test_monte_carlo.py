@@ -0,0 +1,61 @@
+import pytest
+
+from utils.energy_simulation import FUEL_PRICE_PER_LITRE
+from utils.monte_carlo import simulate_payback
+from utils.system_calculator import compute_system_cost, simulate_system_payback
+
+USER_DATA = {'location': 'Lagos', 'location_name': 'Lagos', 'user_type': 'household', 'usage_type': 'household',
+             'grid_hours': '8', 'monthly_fuel_cost': '50000', 'daily_energy': '6'}
+
+# Every uncertain input pinned at the value the calculator assumes
+NOMINAL = {
+    'fuel_price': {'distribution': 'fixed', 'value': FUEL_PRICE_PER_LITRE},
+    'sun_hours_factor': {'distribution': 'fixed', 'value': 1.0},
+    'grid_hours_offset': {'distribution': 'fixed', 'value': 0.0},
+    'degradation': {'distribution': 'fixed', 'value': 0.0},
+}
+
+
+@pytest.mark.parametrize('daily_energy, grid_hours', [('6', '8'), ('2.5', '0'), ('40', '20')])
+def test_nominal_inputs_reproduce_the_deterministic_payback(daily_energy, grid_hours):
+    user_data = dict(USER_DATA, daily_energy=daily_energy, grid_hours=grid_hours)
+    result = compute_system_cost(float(daily_energy), 'Lagos', 1, user_data)
+
+    payback = simulate_system_payback(result, user_data, samples=100, distributions=NOMINAL)
+    for percentile in ('p10', 'p50', 'p90'):
+        assert payback['payback_years'][percentile] == pytest.approx(result.payback_years)
+        assert payback['monthly_savings'][percentile] == pytest.approx(result.monthly_savings)
+    assert payback['no_payback_probability'] == 0
+
+
+def test_same_seed_gives_the_same_percentiles():
+    args = (5_000_000, 6, 3.5, 5.5, 8)
+    assert simulate_payback(*args, samples=2000, seed=7) == simulate_payback(*args, samples=2000, seed=7)
+    assert simulate_payback(*args, samples=2000, seed=7) != simulate_payback(*args, samples=2000, seed=8)
+
+    payback = simulate_payback(*args, samples=2000)
+    assert payback['samples'] == 2000
+    p = payback['payback_years']
+    assert p['p10'] <= p['p50'] <= p['p90']
+
+
+def test_savings_degraded_away_before_payback_never_pay_back():
+    payback = simulate_payback(1e9, 6, 3.5, 5.5, 8, samples=100, distributions=dict(
+        NOMINAL, degradation={'distribution': 'fixed', 'value': 0.05}))
+    assert payback['no_payback_probability'] == 1
+    assert payback['payback_years'] == {'p10': None, 'p50': None, 'p90': None}
+
+
+def test_unknown_inputs_and_distributions_are_rejected():
+    with pytest.raises(ValueError, match='Unknown uncertain inputs: inflation'):
+        simulate_payback(5_000_000, 6, 3.5, 5.5, 8, distributions={'inflation': {'distribution': 'fixed', 'value': 1}})
+    with pytest.raises(ValueError, match='Unknown distribution: poisson'):
+        simulate_payback(5_000_000, 6, 3.5, 5.5, 8, distributions={'fuel_price': {'distribution': 'poisson'}})
+
+
+def test_recommendations_endpoint_reports_payback_percentiles(client):
+    response = client.post('/get_recommendations?format=json&uncertainty=1&samples=500', json=USER_DATA)
+    assert response.status_code == 200
+    uncertainty = response.get_json()['payback_uncertainty']
+    assert uncertainty['samples'] == 500
+    assert set(uncertainty['payback_years']) == {'p10', 'p50', 'p90'}
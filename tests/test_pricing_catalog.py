@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+from utils import pricing_catalog
+from utils.pricing_catalog import current_catalog
+from utils.system_calculator import compute_system_cost, recommendation_cache
+
+ORIGINAL_PATH = pricing_catalog.CATALOG_PATH
+
+
+@pytest.fixture
+def catalog_file(tmp_path, monkeypatch):
+    """A copy of the catalog that current_catalog() checks on its next call"""
+    with open(ORIGINAL_PATH, encoding='utf-8') as f:
+        data = json.load(f)
+    path = tmp_path / 'pricing_catalog.json'
+    path.write_text(json.dumps(data))
+    monkeypatch.setattr(pricing_catalog, 'CATALOG_PATH', str(path))
+    monkeypatch.setattr(pricing_catalog, '_next_check', 0)
+    yield path, data
+    pricing_catalog.reload_catalog(ORIGINAL_PATH)
+
+
+def _lagos_panel_cost():
+    return compute_system_cost(5, 'Lagos', 1, {'grid_hours': 6, 'usage_type': 'household'}).solar_panels_cost
+
+
+def test_changed_file_is_picked_up(catalog_file):
+    path, data = catalog_file
+    before = current_catalog()
+    panel_cost = _lagos_panel_cost()
+    recommendation_cache.set('key', 'stale')
+
+    data['version'] = 'test-reload'
+    data['locations']['Lagos']['cost_per_watt'] *= 2
+    path.write_text(json.dumps(data))
+    pricing_catalog._next_check = 0
+
+    catalog = current_catalog()
+    assert catalog.version == 'test-reload'
+    assert catalog.generation > before.generation
+    assert _lagos_panel_cost() == 2 * panel_cost
+    # Caches versioned by the catalog generation drop entries priced from the old one
+    assert recommendation_cache.get('key') is None
+
+
+def test_invalid_file_keeps_the_previous_catalog(catalog_file):
+    path, _ = catalog_file
+    before = current_catalog()
+    path.write_text(json.dumps({'version': 'broken'}))
+    pricing_catalog._next_check = 0
+
+    assert current_catalog() is before
+
+
+def test_file_is_not_checked_again_within_the_interval(catalog_file):
+    path, data = catalog_file
+    current_catalog()
+    data['version'] = 'too-soon'
+    path.write_text(json.dumps(data))
+
+    assert current_catalog().version != 'too-soon'
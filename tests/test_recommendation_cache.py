@@ -0,0 +1,57 @@
+import time
+
+from utils.cache import LRUCache
+from utils.system_calculator import get_cached_system_recommendations, recommendation_cache, recommendation_cache_key
+
+SUBMISSION = {'location': '5.5', 'location_name': 'Lagos', 'grid_hours': '8', 'usage_type': 'household',
+              'daily_energy': '6.25'}
+
+
+def test_lru_cache_evicts_least_recently_used_and_expires(monkeypatch):
+    cache = LRUCache(maxsize=2, ttl=10)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    assert cache.evictions == 1
+
+    now = time.monotonic()
+    monkeypatch.setattr('utils.cache.time.monotonic', lambda: now + 11)
+    assert cache.get('a') is None
+    assert cache.stats()['size'] == 1
+
+
+def test_lru_cache_empties_when_its_version_changes():
+    version = [1]
+    cache = LRUCache(version=lambda: version[0])
+    cache.set('a', 1)
+    version[0] = 2
+    assert cache.get('a') is None
+
+
+def test_cache_key_normalizes_only_what_the_output_ignores():
+    key = recommendation_cache_key(SUBMISSION)
+    assert key == recommendation_cache_key(dict(SUBMISSION, grid_hours=8.0, daily_energy=6.25))
+    assert recommendation_cache_key(dict(SUBMISSION, usage_type='school')) == \
+        recommendation_cache_key(dict(SUBMISSION, usage_type='church'))
+    assert key != recommendation_cache_key(dict(SUBMISSION, usage_type='business'))
+    assert key != recommendation_cache_key(dict(SUBMISSION, daily_energy='6.26'))
+    assert recommendation_cache_key(dict(SUBMISSION, daily_energy='lots')) is None
+
+
+def test_repeat_submissions_are_served_from_the_cache():
+    first = get_cached_system_recommendations(SUBMISSION)
+    assert first['success']
+    assert recommendation_cache.stats()['size'] == 1
+
+    hits = recommendation_cache.hits
+    assert get_cached_system_recommendations(dict(SUBMISSION)) == first
+    assert recommendation_cache.hits == hits + 1
+
+
+def test_unparseable_submissions_are_not_cached():
+    result = get_cached_system_recommendations(dict(SUBMISSION, daily_energy='lots'))
+    assert not result['success']
+    assert recommendation_cache.stats()['size'] == 0
@@ -0,0 +1,38 @@
+import os
+
+import pytest
+from jinja2 import FileSystemLoader
+
+from utils.presentation import format_system_cost
+from utils.system_calculator import RECOMMENDATIONS_TEMPLATE, TEMPLATES_DIR, compute_system_cost, get_html_recommendations
+
+# Rendered by the f-string get_html_recommendations the template replaced
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+
+
+def _recommendations(grid_hours):
+    return format_system_cost(compute_system_cost(7.5, 'Lagos', 1, {'usage_type': 'household', 'grid_hours': grid_hours}))
+
+
+@pytest.mark.parametrize('system_type, grid_hours', [('hybrid', 10), ('full_solar', 4)])
+def test_rendered_html_is_unchanged(system_type, grid_hours):
+    recommendations = _recommendations(grid_hours)
+    assert recommendations['system_type']['type'] == system_type
+    with open(os.path.join(DATA_DIR, f'recommendations_{system_type}.html'), encoding='utf-8', newline='') as f:
+        assert get_html_recommendations(recommendations) == f.read()
+
+
+def test_app_templates_are_reloaded_when_edited(app, tmp_path):
+    os.makedirs(tmp_path / 'partials')
+    template = tmp_path / RECOMMENDATIONS_TEMPLATE
+    with open(os.path.join(TEMPLATES_DIR, RECOMMENDATIONS_TEMPLATE), encoding='utf-8') as f:
+        template.write_text(f.read(), encoding='utf-8')
+    app.jinja_env.loader = FileSystemLoader(str(tmp_path))
+    app.jinja_env.auto_reload = True
+
+    with app.app_context():
+        before = get_html_recommendations(_recommendations(10))
+        template.write_text('edited', encoding='utf-8')
+        os.utime(template, (0, os.path.getmtime(template) + 10))
+        assert before != 'edited'
+        assert get_html_recommendations(_recommendations(10)) == 'edited'
@@ -0,0 +1,36 @@
+from utils import system_optimizer
+from utils.pricing_catalog import DEFAULT_LOCATION, current_catalog
+from utils.system_calculator import (get_system_recommendations_data, recommendation_cache_key,
+                                     submission_location)
+from utils.system_optimizer import optimize_user_system
+
+API = {'location': 'Kano', 'grid_hours': '8', 'usage_type': 'household', 'daily_energy': '6'}
+# The calculator form posts the location's sun hours, with its name alongside
+FORM = dict(API, location='6.5', location_name='Kano')
+
+
+def test_the_location_is_taken_from_the_name_the_form_posts():
+    assert submission_location(API) == submission_location(FORM) == 'Kano'
+    assert submission_location(dict(API, location='Atlantis')) == DEFAULT_LOCATION
+    assert submission_location(dict(FORM, location_name='Atlantis')) == DEFAULT_LOCATION
+    assert recommendation_cache_key(FORM) == recommendation_cache_key(API)
+
+
+def test_form_submissions_are_sized_and_simulated_for_the_chosen_location():
+    form = get_system_recommendations_data(FORM, uncertainty_samples=100)
+    assert form['success']
+    assert form == get_system_recommendations_data(API, uncertainty_samples=100)
+
+    default = get_system_recommendations_data(dict(API, location='Atlantis'))
+    catalog = current_catalog()
+    assert catalog.location_rows[catalog.location_id('Kano')] != catalog.location_rows[catalog.location_id(None)]
+    assert form['recommendations'] != default['recommendations']
+    assert form['simulation'] != default['simulation']
+
+
+def test_form_submissions_are_optimized_for_the_chosen_location(monkeypatch):
+    monkeypatch.setattr(system_optimizer, 'OPTIMIZER_WORKERS', 1)
+    form = optimize_user_system(FORM)
+    assert form['success']
+    assert form == optimize_user_system(API)
+    assert form != optimize_user_system(dict(API, location='Atlantis'))
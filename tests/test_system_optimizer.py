@@ -0,0 +1,86 @@
+import threading
+
+import numpy as np
+import pytest
+
+import app as app_module
+from utils import system_optimizer
+from utils.energy_simulation import grid_availability, load_profile, simulate_energy_system, solar_profile
+from utils.pricing_catalog import current_catalog
+from utils.rate_limit import RateLimiter
+from utils.system_optimizer import _candidate_grid, optimize_system
+
+SITE = {'location': 'Lagos', 'grid_hours': 8, 'daily_energy': 6}
+
+
+def _exhaustive_front(daily_energy_kwh, location, grid_hours):
+    """(cost, LOLP) of the cost/reliability front, simulating every candidate"""
+    catalog = current_catalog()
+    sun_hours = catalog.location_rows[catalog.location_id(location)][0]
+    load = load_profile(daily_energy_kwh=daily_energy_kwh)
+    candidates, _ = _candidate_grid(daily_energy_kwh, sun_hours, load.max(), location, catalog)
+    chemistry = [catalog.battery(name) for name in catalog.battery_types]
+    lolp = simulate_energy_system(
+        pv_kw=candidates['pv_kw'], battery_kwh=candidates['battery_kwh'],
+        inverter_kw=catalog.inverter_ratings_kw[candidates['inverter']],
+        battery_efficiency=np.array([chemistry[i]['efficiency'] for i in candidates['chemistry']]),
+        depth_of_discharge=np.array([chemistry[i]['depth_of_discharge'] for i in candidates['chemistry']]),
+        load_kw=load, solar_kwh_per_kw=solar_profile(sun_hours), grid_available=grid_availability(grid_hours),
+    )['loss_of_load_probability']
+
+    front, lowest = [], np.inf
+    for i in np.lexsort((lolp, candidates['total_cost'])):
+        if lolp[i] < lowest:
+            lowest = lolp[i]
+            front.append((candidates['total_cost'][i], lolp[i]))
+    return front
+
+
+@pytest.mark.parametrize('daily_energy_kwh, grid_hours', [(2, 0), (6, 8), (6, 20)])
+def test_search_finds_the_exhaustive_front(daily_energy_kwh, grid_hours):
+    result = optimize_system(daily_energy_kwh, 'Lagos', grid_hours, workers=1)
+    front = [(point['total_cost'], point['loss_of_load_probability']) for point in result['front']]
+
+    assert front == pytest.approx(_exhaustive_front(daily_energy_kwh, 'Lagos', grid_hours))
+    assert result['simulated'] <= result['candidates']
+
+
+def test_recommendation_is_the_cheapest_point_meeting_the_target():
+    result = optimize_system(6, 'Lagos', 8, lolp_target=0.05, workers=1)
+    meeting = [point for point in result['front'] if point['loss_of_load_probability'] <= 0.05]
+    assert result['recommended'] == meeting[0]
+    assert result['recommended']['total_cost'] < result['front'][-1]['total_cost']
+
+    assert optimize_system(6, 'Lagos', 8, lolp_target=0.05, max_cost=1)['recommended'] is None
+
+
+@pytest.fixture
+def pool():
+    yield
+    if system_optimizer._pool is not None:
+        system_optimizer._pool.shutdown()
+        system_optimizer._pool = None
+
+
+def test_process_pool_search_matches_the_in_process_one(pool):
+    assert optimize_system(6, 'Lagos', 8, workers=2) == optimize_system(6, 'Lagos', 8, workers=1)
+
+
+def test_optimizer_endpoint_shares_the_batch_limits(client, monkeypatch):
+    monkeypatch.setattr(app_module, 'batch_rate_limiter', RateLimiter(0))
+    response = client.post('/optimize_system', json=SITE)
+    assert response.status_code == 200
+    assert response.get_json()['optimization']['recommended']
+
+    slots = threading.BoundedSemaphore(1)
+    monkeypatch.setattr(app_module, 'batch_slots', slots)
+    slots.acquire()
+    assert client.post('/optimize_system', json=SITE).status_code == 429
+    slots.release()
+    assert client.post('/optimize_system', json=SITE).status_code == 200
+
+    monkeypatch.setattr(app_module, 'batch_rate_limiter', RateLimiter(1, burst=1))
+    assert client.post('/optimize_system', json=SITE).status_code == 200
+    limited = client.post('/optimize_system', json=SITE)
+    assert limited.status_code == 429
+    assert int(limited.headers['Retry-After']) > 0
@@ -0,0 +1,55 @@
+from sqlalchemy import event
+
+from models import db, LoanApplication
+from utils.database_pg import db_manager
+
+CALCULATOR_DATA = {'location_name': 'Lagos', 'user_type': 'home', 'grid_hours': '8', 'daily_energy': '6.5',
+                   'monthly_fuel_cost': 'n/a', 'appliances': [{'type': 'Ceiling Fan', 'units': 2, 'hours': 8}]}
+
+
+def _statements(app, save):
+    """The SQL statements run by save()"""
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            assert save()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+    return statements
+
+
+def test_each_save_is_one_upsert(app):
+    for save in (lambda: db_manager.save_calculator_data('APP-1', CALCULATOR_DATA),
+                 lambda: db_manager.save_application('Ada', 'ada@example.com', '0800', 'APP-1'),
+                 lambda: db_manager.save_application('Bola', 'bola@example.com', '0801', 'APP-2')):
+        statements = _statements(app, save)
+        assert len(statements) == 1
+        assert 'ON CONFLICT' in statements[0]
+
+
+def test_saves_update_only_their_own_columns(app):
+    with app.app_context():
+        db_manager.save_calculator_data('APP-1', CALCULATOR_DATA)
+        created_at = db.session.query(LoanApplication.created_at).scalar()
+        db_manager.save_application('Ada', 'ada@example.com', '0800', 'APP-1')
+        db_manager.save_calculator_data('APP-1', dict(CALCULATOR_DATA, location_name='Kano', appliances=[]))
+
+        application = db_manager.get_application_by_number('APP-1')
+        assert (application['location'], application['full_name'], application['email']) == ('Kano', 'Ada', 'ada@example.com')
+        assert (application['grid_hours'], application['daily_energy'], application['monthly_fuel_cost']) == (8.0, 6.5, None)
+        assert application['appliances'] == []
+        assert db.session.query(LoanApplication.created_at).scalar() == created_at
+        assert db.session.query(LoanApplication).count() == 1
+
+
+def test_contact_details_alone_create_the_application(app):
+    with app.app_context():
+        db_manager.save_application('Bola', 'bola@example.com', '0801', 'APP-2')
+        db_manager.save_calculator_data('APP-2', CALCULATOR_DATA)
+
+        application = db_manager.get_application_by_number('APP-2')
+        assert (application['full_name'], application['location']) == ('Bola', 'Lagos')
+        assert application['appliances'][0] == {'type': 'Ceiling Fan', 'units': 2, 'hours_per_day': 8,
+                                                'backup_included': False, 'power_watts': 0, 'daily_usage_kwh': 0}
@@ -0,0 +1,160 @@
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db, LoanApplication
+from utils.database_pg import db_manager
+from utils.write_behind import DEAD_LETTER_FILE, SYNCED, WriteBehindWriter, _encode
+
+
+@pytest.fixture
+def spool_dir(tmp_path):
+    path = tmp_path / 'spool'
+    path.mkdir()
+    return path
+
+
+@pytest.fixture
+def make_writer(app, spool_dir):
+    writers = []
+
+    def make(**kwargs):
+        writer = WriteBehindWriter(enabled=True, spool_dir=str(spool_dir), **kwargs)
+        writer.init_app(app)
+        writers.append(writer)
+        return writer
+    yield make
+    for writer in writers:
+        writer.stop()
+
+
+def _wait_until_written(writer, timeout=5):
+    deadline = time.monotonic() + timeout
+    while writer.pending and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert writer.pending == 0
+
+
+def _locations(app):
+    with app.app_context():
+        return {row.application_number: row.location for row in db.session.query(LoanApplication)}
+
+
+def _calculator_values(application_number, location, now=None):
+    return db_manager.calculator_values(application_number, {'location_name': location, 'daily_energy': 3}, now)
+
+
+def test_orphaned_spool_is_replayed(app, spool_dir, make_writer):
+    queued_at = datetime.utcnow() - timedelta(hours=1)
+    orphan = spool_dir / 'spool-1-deadbeef.jsonl'
+    orphan.write_text(
+        _encode('calculator', _calculator_values('APP-1', 'Lagos', queued_at))
+        + _encode('contact', db_manager.contact_values('APP-1', 'Ada', 'ada@example.com', '0800', queued_at))
+        + _encode('calculator', _calculator_values('APP-2', 'Kano', queued_at))
+        + '["calculator", {"application_nu'  # cut short by the crash
+    )
+
+    writer = make_writer()
+    writer._ensure_started()
+    _wait_until_written(writer)
+
+    assert not orphan.exists()
+    assert writer.counts['recovered'] == 3
+    with app.app_context():
+        first = db_manager.get_application_by_number('APP-1')
+    assert (first['location'], first['full_name']) == ('Lagos', 'Ada')
+    assert _locations(app)['APP-2'] == 'Kano'
+    # Stamped when written, not when queued, so the rollups' watermark sees it
+    assert datetime.strptime(first['updated_at'], '%Y-%m-%d %H:%M:%S') > queued_at + timedelta(minutes=30)
+
+
+def test_replay_skips_saves_superseded_by_a_synchronous_save(app, spool_dir, make_writer):
+    with app.app_context():
+        db_manager.save_calculator_data('APP-1', {'location_name': 'newer'})
+    (spool_dir / 'spool-1-deadbeef.jsonl').write_text(
+        _encode('calculator', _calculator_values('APP-1', 'older'))
+        + json.dumps([SYNCED, 'calculator', 'APP-1']) + '\n'
+    )
+
+    writer = make_writer()
+    writer._ensure_started()
+    _wait_until_written(writer)
+
+    assert _locations(app) == {'APP-1': 'newer'}
+
+
+def test_queued_save_does_not_overwrite_a_later_overflow_save(app, make_writer):
+    writer = make_writer(queue_size=1)
+    release = threading.Event()
+    write_batch = writer._write_batch
+    writer._write_batch = lambda batch: release.wait(5) and write_batch(batch)
+
+    writer.save_calculator_data('APP-0', {'location_name': 'first'})
+    deadline = time.monotonic() + 5
+    while writer._queue.qsize() and time.monotonic() < deadline:
+        time.sleep(0.01)  # the worker has taken APP-0 and waits
+    writer.save_calculator_data('APP-1', {'location_name': 'older'})  # queued
+    with app.app_context():
+        assert writer.save_calculator_data('APP-1', {'location_name': 'newer'})  # queue full: written now
+    release.set()
+    _wait_until_written(writer)
+
+    assert writer.counts['overflow'] == 1
+    assert _locations(app) == {'APP-0': 'first', 'APP-1': 'newer'}
+
+
+def test_overflow_save_waits_for_the_batch_writing_an_older_save(app, make_writer, monkeypatch):
+    writer = make_writer(queue_size=1)
+    release = threading.Event()
+    upsert_rows = db_manager.upsert_rows
+
+    def slow_upsert(columns, rows):
+        if threading.current_thread().name == 'write-behind':
+            release.wait(5)
+        upsert_rows(columns, rows)
+    monkeypatch.setattr(db_manager, 'upsert_rows', slow_upsert)
+
+    writer.save_calculator_data('APP-1', {'location_name': 'older'})
+    deadline = time.monotonic() + 5
+    while not writer._writing and time.monotonic() < deadline:
+        time.sleep(0.01)  # the worker is writing the older save
+    writer.save_calculator_data('APP-2', {'location_name': 'Kano'})  # fills the queue
+
+    def save_synchronously():
+        with app.app_context():
+            writer.save_calculator_data('APP-1', {'location_name': 'newer'})
+    overflow = threading.Thread(target=save_synchronously)
+    overflow.start()
+    overflow.join(0.3)
+    assert overflow.is_alive()
+    release.set()
+    overflow.join(5)
+    _wait_until_written(writer)
+
+    assert _locations(app) == {'APP-1': 'newer', 'APP-2': 'Kano'}
+
+
+def test_rejected_rows_are_dead_lettered_and_the_rest_written(app, spool_dir, make_writer):
+    writer = make_writer()
+    writer.save_calculator_data('APP-1', {'location_name': 'Lagos'})
+    writer._submit('contact', db_manager.contact_values(None, 'No Number', 'x@example.com', '0800'))
+    writer.save_calculator_data('APP-2', {'location_name': 'Abuja'})
+    _wait_until_written(writer)
+
+    assert _locations(app) == {'APP-1': 'Lagos', 'APP-2': 'Abuja'}
+    assert writer.counts['dead_lettered'] == 1
+    assert writer.counts['committed'] == 2
+    kind, row, error = json.loads((spool_dir / DEAD_LETTER_FILE).read_text())
+    assert (kind, row['full_name']) == ('contact', 'No Number')
+    assert 'NOT NULL' in error
+
+
+def test_oversized_fields_are_never_queued(app, make_writer):
+    writer = make_writer()
+    with app.app_context():
+        assert not writer.save_application('x' * 101, 'ada@example.com', '0800', 'APP-1')
+    assert writer.counts['enqueued'] == 0
+    assert _locations(app) == {}
@@ -1,16 +1,64 @@
 import os
-import anthropic
-from anthropic import Anthropic
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 import logging
 import json
 
-def get_system_recommendations(user_data):
-    """Get AI-powered solar system recommendations using Claude."""
-    try:
-        client = Anthropic(api_key=os.environ['ANTHROPIC_API_KEY'])
+from utils.cache import LRUCache
+from utils.system_calculator import get_cached_system_recommendations as get_local_recommendations
+
+MODEL = "claude-3-5-sonnet-20241022"  # the newest Anthropic model is "claude-3-5-sonnet-20241022" which was released October 22, 2024
+
+# Hard latency budget for a model round trip; past it we answer from the local calculator
+AI_TIMEOUT_SECONDS = float(os.environ.get('AI_RECOMMENDATION_TIMEOUT', 10))
+
+# Model answers keyed on the prompt inputs
+ai_response_cache = LRUCache(
+    maxsize=int(os.environ.get('AI_RECOMMENDATION_CACHE_SIZE', 512)),
+    ttl=float(os.environ.get('AI_RECOMMENDATION_CACHE_TTL', 24 * 3600))
+)
+
+# Background threads that make the blocking API calls
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('AI_RECOMMENDATION_WORKERS', 4)),
+    thread_name_prefix='ai-recommender'
+)
+
+_client = None
+_client_lock = threading.Lock()
+
+PROMPT_FIELDS = ('location', 'user_type', 'generator_size', 'generator_fuel',
+                 'daily_energy', 'backup_days', 'budget_range')
+
+def _anthropic():
+    # The SDK takes about half a second to import, so workers load it on the
+    # first model call instead of at boot
+    import anthropic
+    return anthropic
 
-        # Format the user data into a detailed prompt
-        prompt = f"""Based on the following information about a Nigerian property's energy needs, calculate and provide specific recommendations for a solar power system. Return the data in a structured JSON format.
+def get_client():
+    """Return the shared Anthropic client, creating it on first use.
+
+    The client keeps a pooled HTTP connection across calls. Its base URL
+    honours ANTHROPIC_BASE_URL, so tests can point it at a local stub server.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _anthropic().Anthropic(
+                    api_key=os.environ['ANTHROPIC_API_KEY'],
+                    timeout=AI_TIMEOUT_SECONDS,
+                    max_retries=0  # retries would blow the latency budget
+                )
+    return _client
+
+def _cache_key(user_data):
+    return tuple(str(user_data.get(field, '')) for field in PROMPT_FIELDS)
+
+def build_prompt(user_data):
+    """Format the user data into a detailed prompt"""
+    return f"""Based on the following information about a Nigerian property's energy needs, calculate and provide specific recommendations for a solar power system. Return the data in a structured JSON format.
 
 Location: {user_data['location']}
 User Type: {user_data['user_type']}
@@ -51,32 +99,12 @@ Return ONLY a JSON object with these exact keys (include units in the values):
     }}
 }}"""
 
-        # Call Claude API with the latest model
-        message = client.messages.create(
-            model="claude-3-5-sonnet-20241022",  # the newest Anthropic model is "claude-3-5-sonnet-20241022" which was released October 22, 2024
-            max_tokens=1500,
-            temperature=0.2,
-            messages=[
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ]
-        )
-
-        # Extract the response text
-        response_text = message.content[0].text if isinstance(message.content, list) else message.content
-
-        # Try to parse JSON from the response
-        try:
-            recommendations_data = json.loads(response_text)
+def _format_html(recommendations_data):
+    """Format the recommendations in HTML with proper styling"""
+    estimated_cost = recommendations_data['financial']['estimated_cost'].replace('₦', '')
+    monthly_savings = recommendations_data['financial']['monthly_savings'].replace('₦', '')
 
-            # Format currency values
-            estimated_cost = recommendations_data['financial']['estimated_cost'].replace('₦', '')
-            monthly_savings = recommendations_data['financial']['monthly_savings'].replace('₦', '')
-
-            # Format the recommendations in HTML with proper styling
-            html_recommendations = f"""
+    return f"""
                 <div class="results-card mb-4">
                     <div class="row g-4">
                         <div class="col-12 col-md-6">
@@ -170,21 +198,91 @@ Return ONLY a JSON object with these exact keys (include units in the values):
                 </div>
             """
 
-            return {
-                'success': True,
-                'recommendations': html_recommendations
-            }
+def _parse_response(message):
+    """Turn a Claude message into the recommendations result dict"""
+    # Extract the response text
+    response_text = message.content[0].text if isinstance(message.content, list) else message.content
+
+    # Try to parse JSON from the response
+    try:
+        recommendations_data = json.loads(response_text)
+        return {
+            'success': True,
+            'recommendations': _format_html(recommendations_data)
+        }
+    except json.JSONDecodeError as e:
+        logging.error(f"Failed to parse JSON from Claude response: {str(e)}")
+        return {
+            'success': False,
+            'error': 'Failed to parse AI recommendations'
+        }
 
-        except json.JSONDecodeError as e:
-            logging.error(f"Failed to parse JSON from Claude response: {str(e)}")
-            return {
-                'success': False,
-                'error': 'Failed to parse AI recommendations'
+def _message_params(prompt):
+    return {
+        'model': MODEL,
+        'max_tokens': 1500,
+        'temperature': 0.2,
+        'messages': [
+            {
+                "role": "user",
+                "content": prompt
             }
+        ]
+    }
+
+def _request_recommendations(user_data):
+    """Blocking model round trip, run on the executor"""
+    message = get_client().messages.create(**_message_params(build_prompt(user_data)))
+    return _parse_response(message)
+
+def _fallback(user_data, reason):
+    """Answer from the local calculator when the model is slow, unavailable or unusable"""
+    logging.warning(f"Falling back to local recommendations: {reason}")
+    result = get_local_recommendations(user_data)
+    result['source'] = 'local'
+    return result
+
+def _remember(key, result):
+    if result.get('success'):
+        result['source'] = 'ai'
+        ai_response_cache.set(key, dict(result))
+    return result
+
+def _remember_when_done(key):
+    """Future callback caching an answer that arrives after the caller gave up"""
+    def callback(future):
+        if not future.cancelled() and future.exception() is None:
+            _remember(key, future.result())
+    return callback
+
+def get_system_recommendations(user_data, timeout=None):
+    """Get AI-powered solar system recommendations using Claude.
+
+    Answers from the cache when the same inputs were asked before. The model
+    call runs on a background thread and the caller waits for it at most
+    ``timeout`` seconds (AI_RECOMMENDATION_TIMEOUT by default); past that, or
+    when the model cannot be asked or gives no usable answer, the result
+    comes from the local calculator instead, with source='local'. A model
+    answer that arrives late is still cached for the next caller.
+    """
+    budget = AI_TIMEOUT_SECONDS if timeout is None else timeout
+    try:
+        key = _cache_key(user_data)
+        cached = ai_response_cache.get(key)
+        if cached is not None:
+            return dict(cached)
+
+        future = _executor.submit(_request_recommendations, user_data)
+        try:
+            result = future.result(timeout=budget)
+        except FuturesTimeoutError:
+            future.add_done_callback(_remember_when_done(key))
+            return _fallback(user_data, f"model did not answer within {budget}s")
+        if not result.get('success'):
+            return _fallback(user_data, result.get('error'))
+        return _remember(key, result)
 
     except Exception as e:
+        # API and connection errors, a missing ANTHROPIC_API_KEY or SDK, or inputs the prompt needs
         logging.error(f"Error getting AI recommendations: {str(e)}")
-        return {
-            'success': False,
-            'error': str(e)
-        }
\ No newline at end of file
+        return _fallback(user_data, str(e))
@@ -0,0 +1,194 @@
+import json
+import os
+import sys
+from dataclasses import dataclass, field
+from types import MappingProxyType
+
+import numpy as np
+
+from utils.energy_simulation import HOURS_PER_DAY, USAGE_PATTERNS
+from utils.pricing_catalog import catalog_digest
+
+APPLIANCE_CATALOG_PATH = os.environ.get(
+    "APPLIANCE_CATALOG_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "appliance_catalog.json")
+)
+
+# Used for types the catalog does not list, sized from the submitted wattage
+DEFAULT_APPLIANCE = "default"
+
+# Longer appliance lists are rejected; larger unit counts are capped
+MAX_APPLIANCES = 200
+MAX_UNITS = 100
+
+# An inverter can supply about twice its continuous rating for the few
+# seconds it takes a motor or compressor to start
+INVERTER_SURGE_RATIO = 2.0
+
+
+@dataclass(frozen=True, slots=True)
+class ApplianceCatalog:
+    """An immutable, compiled snapshot of the appliance catalog.
+
+    Appliance types are numbered with the default type last, so per-type
+    values are arrays indexed by type id. ``running[type, hours]`` is a row
+    of 24 hourly flags, 1.0 where an appliance of that type used for
+    ``hours`` a day may be running: the first hours of its usage pattern, or
+    every hour for "continuous" appliances (compressors cycling on and off
+    all day), which ``continuous`` flags.
+    """
+    version: str
+    digest: str
+    names: tuple
+    ids: MappingProxyType
+    watts: np.ndarray
+    surge_factors: np.ndarray  # starting draw as a multiple of the running watts
+    running: np.ndarray
+    continuous: np.ndarray
+    max_custom_watts: float
+
+    def type_id(self, name):
+        """Id of an appliance type, or of the default type if it is not listed"""
+        return self.ids.get(name, len(self.names) - 1)
+
+
+@dataclass(frozen=True, slots=True)
+class ApplianceLoad:
+    """Demand of a calculator appliance list, computed from the catalog"""
+    daily_energy_kwh: float
+    peak_kw: float  # most power drawn at once, in the busiest hour
+    surge_kw: float  # peak plus the largest single motor start in that hour
+    # Average demand in each hour of the day (kW), summing to daily_energy_kwh
+    hourly_kw: np.ndarray = field(default=None, compare=False, repr=False)
+
+    def inverter_kw(self):
+        """Smallest continuous inverter rating that carries the peak and starts every motor"""
+        return max(self.peak_kw, self.surge_kw / INVERTER_SURGE_RATIO)
+
+
+def _read_only(array):
+    array.setflags(write=False)
+    return array
+
+
+def _running_hours(pattern):
+    """Hourly running flags (25 x 24) for each whole number of hours of use a day"""
+    running = np.zeros((HOURS_PER_DAY + 1, HOURS_PER_DAY))
+    for hours in range(1, HOURS_PER_DAY + 1):
+        if pattern == "continuous":
+            running[hours] = 1.0
+        else:
+            running[hours, USAGE_PATTERNS[pattern][:hours]] = 1.0
+    return running
+
+
+def compile_appliance_catalog(data):
+    """Validate raw catalog data and compile it into an ApplianceCatalog"""
+    try:
+        appliances = dict(data["appliances"])
+        default = appliances.pop(DEFAULT_APPLIANCE)
+        names = tuple(sys.intern(name) for name in appliances) + (DEFAULT_APPLIANCE,)
+        entries = list(appliances.values()) + [default]
+        watts = [float(entry["watts"]) for entry in entries]
+        surge_factors = [float(entry["surge_factor"]) for entry in entries]
+        if min(watts) < 0 or min(surge_factors) < 1:
+            raise ValueError("Invalid appliance catalog: watts must be >= 0 and surge factors >= 1")
+        return ApplianceCatalog(
+            version=str(data["version"]),
+            digest=catalog_digest(data),
+            names=names,
+            ids=MappingProxyType({name: i for i, name in enumerate(names)}),
+            watts=_read_only(np.array(watts)),
+            surge_factors=_read_only(np.array(surge_factors)),
+            running=_read_only(np.stack([_running_hours(entry["pattern"]) for entry in entries])),
+            continuous=_read_only(np.array([entry["pattern"] == "continuous" for entry in entries])),
+            max_custom_watts=float(data["max_custom_watts"]),
+        )
+    except (KeyError, TypeError, AttributeError) as e:
+        raise ValueError(f"Invalid appliance catalog: missing or malformed {e}") from e
+
+
+def load_appliance_catalog(path=APPLIANCE_CATALOG_PATH):
+    """Read and compile a catalog file"""
+    with open(path, encoding="utf-8") as f:
+        return compile_appliance_catalog(json.load(f))
+
+
+_catalog = load_appliance_catalog()
+
+
+def current_appliance_catalog():
+    return _catalog
+
+
+def appliance_load(appliances, catalog=None, backup_only=True):
+    """Daily energy, coincident peak and starting surge of a calculator appliance list.
+
+    Appliances use the calculator's fields (type, units, hours per day,
+    backup). Listed types are sized from the catalog whatever wattage was
+    submitted; other types use the submitted power, capped at the catalog's
+    max_custom_watts. With ``backup_only`` only appliances marked for backup
+    count, matching the daily energy the calculator sizes for. Entries with
+    unparseable or non-positive numbers are skipped. Returns None when no
+    entry is usable and raises ValueError for more than MAX_APPLIANCES.
+
+    Only the parsing is per appliance; the sums run over catalog arrays.
+    """
+    if not appliances:
+        return None
+    if not isinstance(appliances, list):
+        raise ValueError("appliances must be a list")
+    if len(appliances) > MAX_APPLIANCES:
+        raise ValueError(f"At most {MAX_APPLIANCES} appliances can be sized at once")
+    catalog = catalog or _catalog
+    default_id = len(catalog.names) - 1
+
+    type_id_of = catalog.ids.get
+    type_ids, units, hours, custom_watts = [], [], [], {}
+    for appliance in appliances:
+        try:
+            if backup_only and not appliance.get('backup', True):
+                continue
+            count = float(appliance.get('units', 1))
+            used = float(appliance.get('hours', 0))
+            type_id = type_id_of(appliance.get('type'), default_id)
+            if type_id == default_id:
+                watts = min(float(appliance.get('power', 0)), catalog.max_custom_watts)
+                if not watts > 0:
+                    continue
+        except (AttributeError, TypeError, ValueError):
+            continue  # not a dict, or a value that is not a number
+        if not (count > 0 and used > 0):  # also rejects NaN
+            continue
+        if type_id == default_id:
+            custom_watts[len(type_ids)] = watts
+        type_ids.append(type_id)
+        units.append(count if count < MAX_UNITS else MAX_UNITS)
+        hours.append(used if used < HOURS_PER_DAY else HOURS_PER_DAY)
+    if not type_ids:
+        return None
+
+    type_ids = np.array(type_ids)
+    hours = np.array(hours)
+    watts = catalog.watts[type_ids]
+    if custom_watts:
+        watts[list(custom_watts)] = list(custom_watts.values())
+    load_w = watts * units
+    running = catalog.running[type_ids, np.ceil(hours).astype(int)]
+    hourly_w = load_w @ running
+    # One unit starts at a time, on top of everything else running in that hour
+    starting_w = (running * (watts * (catalog.surge_factors[type_ids] - 1.0))[:, None]).max(axis=0)
+
+    # Share of each hour in use: the whole hours of the pattern, then part of
+    # the next one; continuous appliances spread their hours over the day
+    whole = np.floor(hours).astype(int)
+    used = catalog.running[type_ids, whole]
+    used += (hours - whole)[:, None] * (catalog.running[type_ids, np.minimum(whole + 1, HOURS_PER_DAY)] - used)
+    continuous = catalog.continuous[type_ids]
+    used[continuous] = (hours[continuous] / HOURS_PER_DAY)[:, None]
+    return ApplianceLoad(
+        daily_energy_kwh=float(load_w @ hours) / 1000,
+        peak_kw=float(hourly_w.max()) / 1000,
+        surge_kw=float((hourly_w + starting_w).max()) / 1000,
+        hourly_kw=_read_only(load_w @ used / 1000),
+    )
@@ -0,0 +1,73 @@
+import os
+import secrets
+import threading
+import time
+from datetime import datetime, timezone
+
+PREFIX = "SOL"
+
+# Crockford's base32: no I, L, O or U, and in ASCII order, so numbers of
+# equal length sort as text in the order of the values they encode
+ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_DECODE = {char: value for value, char in enumerate(ALPHABET)}
+_PAIRS = [high + low for high in ALPHABET for low in ALPHABET]  # every two-digit string, by value
+
+TIME_CHARS = 10  # 50 bits: milliseconds since 1970 until the year 37648
+RANDOM_CHARS = 10
+RANDOM_BITS = 5 * RANDOM_CHARS
+
+_lock = threading.Lock()
+_pid = None
+_last_ms = -1
+_last_random = 0
+
+
+def _encode(value, length):
+    """``value`` as ``length`` base32 digits, most significant first (length must be even)"""
+    return "".join([_PAIRS[(value >> shift) & 0x3FF] for shift in range(5 * length - 10, -1, -10)])
+
+
+def new_application_number():
+    """A new, unique application number such as SOL-01JC8XQZ4M-7K2D9FQW3B.
+
+    Like a ULID, it is the creation time in milliseconds followed by random
+    bits, in base32: numbers sort (as text) in the order they were created,
+    so new rows go in side by side in the application_number index rather
+    than on random pages. Worker processes on any number of hosts need no
+    coordination or database round trip: two processes would have to draw
+    the same 50 random bits in the same millisecond to collide. Within a
+    process, numbers made in the same millisecond (or after the clock
+    stepped back) increment the previous random part, so they stay
+    strictly increasing.
+    """
+    global _pid, _last_ms, _last_random
+    with _lock:
+        if _pid != os.getpid():
+            # A forked worker must not continue its parent's sequence
+            _pid = os.getpid()
+            _last_ms = -1
+        now_ms = time.time_ns() // 1_000_000
+        if now_ms > _last_ms:
+            _last_ms = now_ms
+            _last_random = secrets.randbits(RANDOM_BITS)
+        else:
+            _last_random += 1
+            if _last_random >> RANDOM_BITS:
+                # Sequence exhausted within this millisecond: borrow the next one
+                _last_ms += 1
+                _last_random = secrets.randbits(RANDOM_BITS)
+        ms, random = _last_ms, _last_random
+    return f"{PREFIX}-{_encode(ms, TIME_CHARS)}-{_encode(random, RANDOM_CHARS)}"
+
+
+def application_number_time(application_number):
+    """When an application number was made (UTC), or None for other formats, such as older numbers"""
+    parts = application_number.split("-") if isinstance(application_number, str) else ()
+    if len(parts) != 3 or parts[0] != PREFIX or len(parts[1]) != TIME_CHARS or len(parts[2]) != RANDOM_CHARS:
+        return None
+    ms = 0
+    for char in parts[1]:
+        if char not in _DECODE:
+            return None
+        ms = ms * 32 + _DECODE[char]
+    return datetime.fromtimestamp(ms / 1000, tz=timezone.utc)
@@ -0,0 +1,141 @@
+import numpy as np
+
+from utils.pricing_catalog import current_catalog
+
+# Order matters: the codes returned in "system_type_code" index into this tuple
+SYSTEM_TYPES = ("integrated", "portable", "full_solar", "hybrid", "backup")
+
+
+def _location_rows(location, catalog):
+    """Map location names to catalog location ids"""
+    # Resolve each distinct location once, then scatter back to the rows
+    unique_locations, inverse = np.unique(location, return_inverse=True)
+    lookup = np.array([catalog.location_id(name) for name in unique_locations.tolist()], dtype=np.intp)
+    return lookup[inverse.reshape(-1)]
+
+
+def _battery_table(battery_type, catalog):
+    """Look up cost per kWh for each row, raising KeyError like the scalar path"""
+    unique_types, inverse = np.unique(battery_type, return_inverse=True)
+    lookup = np.array([catalog.battery(name)["cost_per_kwh"] for name in unique_types.tolist()], dtype=float)
+    return lookup[inverse.reshape(-1)]
+
+
+def _system_type_codes(grid_hours, usage_type):
+    """Vectorized equivalent of determine_system_type, returned as SYSTEM_TYPES indices"""
+    is_dual = usage_type == "dual"
+    is_business = usage_type == "business"
+    conditions = [
+        is_dual,
+        grid_hours < 8,
+        (grid_hours <= 16) & is_business,
+        (grid_hours <= 16) & (grid_hours > 12),
+        grid_hours <= 16,
+    ]
+    choices = [1, 2, 3, 4, 3]
+    return np.select(conditions, choices, default=4).astype(np.int8)
+
+
+def calculate_system_cost_batch(daily_energy_kwh, location, grid_hours, usage_type,
+                                backup_days=1, battery_type="lithium-ion"):
+    """Size and price many scenarios at once from columnar NumPy inputs.
+
+    Each argument may be an array or a scalar; they are broadcast against each
+    other. Row i of every returned array equals what calculate_system_cost
+    produces for the same inputs. Monetary values are raw floats in naira, and
+    backup-only columns are NaN for rows that are not hybrid systems.
+    """
+    daily_energy_kwh = np.asarray(daily_energy_kwh, dtype=float)
+    grid_hours = np.asarray(grid_hours, dtype=float)
+    backup_days = np.asarray(backup_days, dtype=float)
+    location = np.asarray(location, dtype=str)
+    usage_type = np.asarray(usage_type, dtype=str)
+    battery_type = np.asarray(battery_type, dtype=str)
+
+    (daily_energy_kwh, location, grid_hours, usage_type,
+     backup_days, battery_type) = np.broadcast_arrays(
+        daily_energy_kwh, location, grid_hours, usage_type, backup_days, battery_type)
+    shape = daily_energy_kwh.shape
+    daily_energy_kwh = daily_energy_kwh.reshape(-1)
+    grid_hours = grid_hours.reshape(-1)
+    backup_days = backup_days.reshape(-1)
+    usage_type = usage_type.reshape(-1)
+
+    catalog = current_catalog()
+    rows = _location_rows(location, catalog)
+    sun_hours = catalog.sun_hours[rows]
+    panel_cost_per_watt = catalog.cost_per_watt[rows]
+    installation_factor = catalog.installation_factor[rows]
+    battery_cost_per_kwh = _battery_table(battery_type, catalog)
+    system_type_code = _system_type_codes(grid_hours, usage_type)
+
+    # get_system_size: 20% buffer, rounded up to 0.5 kW, minimum 1 kW
+    system_size_kw = np.maximum(1.0, np.ceil((daily_energy_kwh / sun_hours) * 1.2 * 2) / 2)
+
+    # get_battery_size
+    night_usage_factor = np.where(usage_type == "household", 0.5, 0.3)
+    night_energy_kwh = daily_energy_kwh * night_usage_factor
+    backup_energy_kwh = daily_energy_kwh * (backup_days - 1) + night_energy_kwh
+    battery_size_kwh = np.ceil(backup_energy_kwh * 1.3).astype(np.int64)
+
+    # get_inverter_size / get_charge_controller_size as searchsorted lookups on the
+    # catalog's sorted tier breakpoints
+    inverter_tier = np.searchsorted(catalog.inverter_breakpoints, system_size_kw, side="left")
+    controller_tier = np.searchsorted(catalog.charge_controller_breakpoints, (system_size_kw * 1000) / 48, side="left")
+
+    panel_count = np.ceil((system_size_kw * 1000) / 400).astype(np.int64)
+
+    # Component costs, summed in the same order as the scalar path
+    solar_panels_cost = system_size_kw * 1000 * panel_cost_per_watt
+    batteries_cost = battery_size_kwh * battery_cost_per_kwh
+    inverter_cost = catalog.inverter_costs[inverter_tier]
+    charge_controller_cost = catalog.charge_controller_costs[controller_tier]
+    component_total = solar_panels_cost + batteries_cost + inverter_cost + charge_controller_cost
+    bos_cost = component_total * 0.15
+    installation_cost = component_total * (installation_factor - 1)
+    total_cost = component_total + bos_cost + installation_cost
+
+    monthly_generator_cost = daily_energy_kwh * 30 * 0.5 * 650
+    monthly_savings = monthly_generator_cost
+    with np.errstate(divide="ignore", invalid="ignore"):
+        payback_years = total_cost / (monthly_savings * 12)
+
+    # Backup-only alternative, only defined for hybrid recommendations
+    is_hybrid = system_type_code == SYSTEM_TYPES.index("hybrid")
+    backup_batteries = np.where(is_hybrid, batteries_cost * 0.7, np.nan)
+    backup_inverter = np.where(is_hybrid, inverter_cost, np.nan)
+    backup_total = backup_batteries + backup_inverter
+    backup_bos = backup_total * 0.1
+    backup_installation = backup_total * 0.15
+    backup_final_cost = backup_total + backup_bos + backup_installation
+    backup_monthly_savings = np.where(is_hybrid, monthly_generator_cost * 0.6, np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        backup_payback_years = backup_final_cost / (backup_monthly_savings * 12)
+
+    columns = {
+        "system_type_code": system_type_code,
+        "system_type": np.asarray(SYSTEM_TYPES)[system_type_code],
+        "system_size_kw": system_size_kw,
+        "panel_count": panel_count,
+        "battery_size_kwh": battery_size_kwh,
+        "battery_count": np.ceil(battery_size_kwh / 5).astype(np.int64),
+        "inverter_size": np.asarray(catalog.inverter_sizes)[inverter_tier],
+        "charge_controller_size": np.asarray(catalog.charge_controller_sizes)[controller_tier],
+        "solar_panels_cost": solar_panels_cost,
+        "batteries_cost": batteries_cost,
+        "inverter_cost": inverter_cost,
+        "charge_controller_cost": charge_controller_cost,
+        "bos_cost": bos_cost,
+        "installation_cost": installation_cost,
+        "total_cost": total_cost,
+        "monthly_savings": monthly_savings,
+        "payback_years": payback_years,
+        "backup_only_batteries_cost": backup_batteries,
+        "backup_only_inverter_cost": backup_inverter,
+        "backup_only_bos_cost": backup_bos,
+        "backup_only_installation_cost": backup_installation,
+        "backup_only_total_cost": backup_final_cost,
+        "backup_only_monthly_savings": backup_monthly_savings,
+        "backup_only_payback_years": backup_payback_years,
+    }
+    return {name: values.reshape(shape) for name, values in columns.items()}
@@ -0,0 +1,225 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from utils import metrics, system_optimizer
+from utils.appliance_load import appliance_load
+from utils.application_numbers import new_application_number
+from utils.database_pg import CALCULATOR_COLUMNS, db_manager, oversized_fields
+from utils.rate_limit import RateLimiter
+from utils.system_calculator import (
+    UNPARSEABLE_INPUT_ERROR, get_structured_recommendations, missing_api_fields, recommendation_cache_key
+)
+
+# Request limits: sites per batch, body size, and CPU seconds spent sizing
+# (summed over pool workers); sites left when the time runs out are skipped
+BATCH_MAX_SITES = int(os.environ.get('BATCH_QUOTE_MAX_SITES', 2000))
+BATCH_MAX_BYTES = int(os.environ.get('BATCH_QUOTE_MAX_BYTES', 4 * 1024 * 1024))
+BATCH_CPU_SECONDS = float(os.environ.get('BATCH_QUOTE_CPU_SECONDS', 30))
+
+# Batches and optimizer searches (/optimize_system) a client may start per
+# minute (after a burst of BATCH_BURST), and how many may run at once per
+# process, all sharing the optimizer's pool
+BATCH_RATE_PER_MINUTE = float(os.environ.get('BATCH_QUOTE_RATE_PER_MINUTE', 6))
+BATCH_BURST = int(os.environ.get('BATCH_QUOTE_BURST', 2))
+BATCH_MAX_CONCURRENT = int(os.environ.get('BATCH_QUOTE_MAX_CONCURRENT', 2))
+
+# Sites per task, and the smallest batch fanned out to the optimizer's process pool
+CHUNK_SIZE = int(os.environ.get('BATCH_QUOTE_CHUNK_SIZE', 50))
+PARALLEL_MIN_SITES = int(os.environ.get('BATCH_QUOTE_PARALLEL_MIN_SITES', 200))
+
+batch_rate_limiter = RateLimiter(BATCH_RATE_PER_MINUTE, period=60, burst=BATCH_BURST)
+# Taken by the request and released when its response is closed
+batch_slots = threading.BoundedSemaphore(BATCH_MAX_CONCURRENT)
+
+
+def parse_sites(body, ndjson=False):
+    """Sites from a JSON array, or from NDJSON with one site per line.
+
+    Raises ValueError if the body is not a JSON array. An NDJSON line that
+    does not parse becomes None, reported as an error for that site only.
+    """
+    if not ndjson:
+        sites = json.loads(body)
+        if not isinstance(sites, list):
+            raise ValueError("Expected a JSON array of sites")
+        return sites
+    sites = []
+    for line in body.splitlines():
+        if not line.strip():
+            continue
+        try:
+            sites.append(json.loads(line))
+        except ValueError:
+            sites.append(None)
+    return sites
+
+
+def quote_site(site):
+    """Structured recommendations for one site, or the reason it cannot be sized"""
+    if not isinstance(site, dict):
+        return {'error': 'Expected a JSON object'}
+    missing_fields = missing_api_fields(site)
+    if missing_fields:
+        return {'error': f"Missing required fields: {', '.join(missing_fields)}"}
+    try:
+        load = appliance_load(site.get('appliances'))
+    except ValueError as e:
+        return {'error': str(e)}
+    if recommendation_cache_key(site, load=load) is None:
+        return {'error': UNPARSEABLE_INPUT_ERROR}
+    try:
+        return {'recommendations': get_structured_recommendations(site, load)}
+    except Exception as e:
+        return {'error': str(e)}
+
+
+def _quote_chunk(sites):
+    """Process pool task: quote a chunk of sites, with the CPU seconds it took"""
+    start = time.thread_time()
+    results = [quote_site(site) for site in sites]
+    return results, time.thread_time() - start
+
+
+def _quoted_chunks(sites, workers, cpu_seconds):
+    """Yield (start index, results, CPU seconds) for each chunk of sites, in order.
+
+    Large batches are quoted on the process pool, keeping a couple of chunks
+    per worker in flight. No chunk is started once ``cpu_seconds`` have been
+    spent, so the caller sees fewer results than sites.
+    """
+    chunks = ((i, sites[i:i + CHUNK_SIZE]) for i in range(0, len(sites), CHUNK_SIZE))
+    spent = 0.0
+    if workers <= 1 or len(sites) < PARALLEL_MIN_SITES:
+        for start, chunk in chunks:
+            if spent >= cpu_seconds:
+                return
+            results, seconds = _quote_chunk(chunk)
+            spent += seconds
+            yield start, results, seconds
+        return
+
+    pool = system_optimizer.get_pool()
+    pending = deque()
+    try:
+        while True:
+            while len(pending) < 2 * workers and spent < cpu_seconds:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                pending.append((chunk[0], pool.submit(_quote_chunk, chunk[1])))
+            if not pending:
+                return
+            start, future = pending.popleft()
+            results, seconds = future.result()
+            spent += seconds
+            yield start, results, seconds
+    finally:
+        # The client went away or a task failed: drop chunks not started yet
+        for _, future in pending:
+            future.cancel()
+
+
+def _calculator_data(site):
+    """A quoted site in the calculator's field names, which db_manager.calculator_values reads"""
+    data = dict(
+        site,
+        location_name=str(site.get('location_name') or site['location']),
+        user_type=site.get('user_type') or site.get('usage_type', '')
+    )
+    load = appliance_load(site.get('appliances'))
+    if load:
+        # Sized from its appliances, like the calculator's own saves
+        data['daily_energy'] = load.daily_energy_kwh
+    return data
+
+
+def _save_quotes(sites, lines):
+    """Save the calculator data of the quoted sites in one transaction, noting the outcome on each line.
+
+    Every site is saved as a new application under a newly made number; an
+    ``application_number`` in the site is ignored, so a batch can never
+    overwrite an existing lead.
+    """
+    now = datetime.utcnow()
+    rows = []
+    for site, line in zip(sites, lines):
+        if 'recommendations' not in line:
+            continue
+        values = db_manager.calculator_values(new_application_number(), _calculator_data(site), now)
+        too_long = oversized_fields(values)
+        if too_long:
+            line['save_error'] = f"Too long to save: {', '.join(too_long)}"
+            continue
+        line['application_number'] = values['application_number']
+        rows.append(values)
+    if not rows:
+        return 0
+    try:
+        db_manager.upsert_rows(CALCULATOR_COLUMNS, rows)
+    except Exception as e:
+        logging.error(f"Error saving batch quotes: {str(e)}")
+        for line in lines:
+            if line.pop('application_number', None):
+                line['save_error'] = 'Could not save the site'
+        return 0
+    return len(rows)
+
+
+def _line(index, site, result):
+    """One NDJSON result: the site's index and id (if it has one) with its result"""
+    line = {'index': index}
+    if isinstance(site, dict) and 'id' in site:
+        line['id'] = site['id']
+    line.update(result)
+    return line
+
+
+def stream_quotes(sites, save=False, workers=None, cpu_seconds=None):
+    """Quote a batch of sites, yielding NDJSON text as each chunk is computed.
+
+    Each site gets a line with its index in the batch, its ``id`` if it has
+    one, and either its structured recommendations or an error; sites
+    skipped because the CPU budget ran out get an error too. Nothing is
+    saved unless ``save`` is set, in which case each quoted site is stored
+    as a new calculator submission, under the application number given on
+    its line. A final ``summary`` line counts the outcomes.
+    """
+    workers = system_optimizer.OPTIMIZER_WORKERS if workers is None else workers
+    cpu_seconds = BATCH_CPU_SECONDS if cpu_seconds is None else cpu_seconds
+    summary = {'sites': len(sites), 'quoted': 0, 'failed': 0, 'skipped': 0, 'saved': 0, 'cpu_seconds': 0.0}
+    done = 0
+    try:
+        for start, results, seconds in _quoted_chunks(sites, workers, cpu_seconds):
+            chunk = sites[start:start + len(results)]
+            lines = [_line(index, site, result) for index, (site, result) in enumerate(zip(chunk, results), start)]
+            if save:
+                summary['saved'] += _save_quotes(chunk, lines)
+            quoted = sum('recommendations' in line for line in lines)
+            summary['quoted'] += quoted
+            summary['failed'] += len(lines) - quoted
+            summary['cpu_seconds'] += seconds
+            done = start + len(results)
+            yield ''.join(json.dumps(line, sort_keys=True) + '\n' for line in lines)
+    except Exception as e:
+        logging.error(f"Error in batch quote: {str(e)}")
+        summary['error'] = str(e)
+
+    if done < len(sites):
+        skipped = {'error': 'Batch aborted' if 'error' in summary else 'CPU time limit for the batch reached'}
+        summary['skipped'] = len(sites) - done
+        yield ''.join(
+            json.dumps(_line(index, sites[index], skipped), sort_keys=True) + '\n' for index in range(done, len(sites))
+        )
+    summary['cpu_seconds'] = round(summary['cpu_seconds'], 3)
+    yield json.dumps({'summary': summary}, sort_keys=True) + '\n'
+
+
+metrics.register_collector(
+    'solar_batch_quotes_rate_limited_total', 'counter',
+    'Batch quote and optimizer requests refused because their client exceeded its rate', (),
+    lambda: {(): batch_rate_limiter.rejected})
@@ -0,0 +1,27 @@
+import gzip
+import os
+
+try:
+    import brotli
+except ImportError:  # optional; without it responses are only gzip-compressed
+    brotli = None
+
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', 6))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', 5))
+
+# Preferred first when the client accepts several equally
+ENCODINGS = ('br', 'gzip') if brotli else ('gzip',)
+
+
+def negotiate_encoding(accept_encodings):
+    """Best content coding we support from a request's Accept-Encoding, or 'identity'"""
+    return accept_encodings.best_match(ENCODINGS) or 'identity'
+
+
+def compress(body, encoding):
+    """Encode a response body. The output depends only on the input, as strong entity tags require."""
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    return body
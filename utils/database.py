@@ -1,14 +1,49 @@
 import csv
+import fcntl
+import io
 import os
 import json
+from contextlib import contextmanager
 from datetime import datetime
 
+FIELDNAMES = [
+    'Application Number', 'Location', 'Usage Type', 'Grid Hours',
+    'Monthly Fuel Cost', 'Daily Energy', 'Maintenance Cost',
+    'Appliances & Equipment', 'Full Name', 'Email', 'Phone',
+    'Created At', 'Updated At'
+]
+
+# Compact once superseded records outnumber live ones (and there are at least this many)
+COMPACT_MIN_DEAD_RECORDS = 1000
+
 class LoanApplicationLogger:
-    def __init__(self):
+    def __init__(self, csv_path='data/loan_applications.csv', append_only=None):
+        """CSV-backed application log.
+
+        By default every save rewrites the whole file. In append-only mode
+        (``append_only=True`` or LOAN_LOG_APPEND_ONLY=1) a save appends the
+        application's latest record instead, under an exclusive file lock so
+        several gunicorn workers can share the file. An in-memory index maps
+        each application number to the byte offset of its latest record, and
+        the file is compacted once superseded records pile up.
+        """
         # Create a data directory if it doesn't exist
-        if not os.path.exists('data'):
-            os.makedirs('data')
-        self.csv_path = 'data/loan_applications.csv'
+        data_dir = os.path.dirname(csv_path)
+        if data_dir and not os.path.exists(data_dir):
+            os.makedirs(data_dir)
+        self.csv_path = csv_path
+        if append_only is None:
+            append_only = os.environ.get('LOAN_LOG_APPEND_ONLY', '').lower() in ('1', 'true', 'yes')
+        self.append_only = append_only
+        self.lock_path = csv_path + '.lock'
+
+        # Append-only index state: offsets of latest records, plus how far and
+        # which file (inode) the index has been built for
+        self._index = {}
+        self._dead_records = 0
+        self._indexed_size = 0
+        self._indexed_inode = None
+
         self.init_csv()
 
     def init_csv(self):
@@ -16,35 +51,13 @@ class LoanApplicationLogger:
         if not os.path.exists(self.csv_path):
             with open(self.csv_path, 'w', newline='') as csvfile:
                 writer = csv.writer(csvfile)
-                writer.writerow([
-                    'Application Number',
-                    'Location',
-                    'Usage Type',
-                    'Grid Hours',
-                    'Monthly Fuel Cost',
-                    'Daily Energy',
-                    'Maintenance Cost',
-                    'Appliances & Equipment',  # New column for JSON data
-                    'Full Name',
-                    'Email',
-                    'Phone',
-                    'Created At',
-                    'Updated At'
-                ])
-
-    def save_calculator_data(self, application_number, calculator_data):
-        existing_data = self.get_all_applications()
-        updated_rows = []
-        found = False
-
-        # Convert to list of dictionaries if not already
-        if not isinstance(existing_data, list):
-            existing_data = list(existing_data)
+                writer.writerow(FIELDNAMES)
 
-        # Format appliances data as JSON
-        appliances_data = calculator_data.get('appliances', [])
+    @staticmethod
+    def _format_appliances(calculator_data):
+        """Format appliances data as a JSON string"""
         formatted_appliances = []
-        for appliance in appliances_data:
+        for appliance in calculator_data.get('appliances', []):
             formatted_appliances.append({
                 'type': appliance.get('type', ''),
                 'units': appliance.get('units', 0),
@@ -53,6 +66,19 @@ class LoanApplicationLogger:
                 'power_watts': appliance.get('power', 0),
                 'daily_usage_kwh': appliance.get('daily_usage', 0)
             })
+        return json.dumps(formatted_appliances)
+
+    def save_calculator_data(self, application_number, calculator_data):
+        if self.append_only:
+            return self._append_calculator_data(application_number, calculator_data)
+
+        existing_data = self.get_all_applications()
+        updated_rows = []
+        found = False
+
+        # Convert to list of dictionaries if not already
+        if not isinstance(existing_data, list):
+            existing_data = list(existing_data)
 
         # Create new row if application doesn't exist
         new_row = {
@@ -63,7 +89,7 @@ class LoanApplicationLogger:
             'Monthly Fuel Cost': calculator_data.get('monthly_fuel_cost', ''),
             'Daily Energy': calculator_data.get('daily_energy', ''),
             'Maintenance Cost': calculator_data.get('maintenance_cost', ''),
-            'Appliances & Equipment': json.dumps(formatted_appliances),  # Store as JSON string
+            'Appliances & Equipment': self._format_appliances(calculator_data),  # Store as JSON string
             'Full Name': '',
             'Email': '',
             'Phone': '',
@@ -89,6 +115,9 @@ class LoanApplicationLogger:
             writer.writerows(updated_rows)
 
     def save_application(self, name, email, phone, application_number):
+        if self.append_only:
+            return self._append_application(name, email, phone, application_number)
+
         existing_data = self.get_all_applications()
         updated_rows = []
         found = False
@@ -99,13 +128,7 @@ class LoanApplicationLogger:
 
         # Update file with new personal data
         with open(self.csv_path, 'w', newline='') as csvfile:
-            fieldnames = [
-                'Application Number', 'Location', 'Usage Type', 'Grid Hours',
-                'Monthly Fuel Cost', 'Daily Energy', 'Maintenance Cost',
-                'Appliances & Equipment', 'Full Name', 'Email', 'Phone',
-                'Created At', 'Updated At'
-            ]
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+            writer = csv.DictWriter(csvfile, fieldnames=FIELDNAMES)
             writer.writeheader()
 
             for row in existing_data:
@@ -140,6 +163,9 @@ class LoanApplicationLogger:
             writer.writerows(updated_rows)
 
     def get_all_applications(self):
+        if self.append_only:
+            return self._latest_applications()
+
         applications = []
         try:
             with open(self.csv_path, 'r', newline='') as csvfile:
@@ -150,5 +176,180 @@ class LoanApplicationLogger:
             self.init_csv()
         return applications
 
+    # Append-only storage
+
+    @contextmanager
+    def _locked(self, exclusive=True):
+        """Hold a file lock shared by every process writing this log"""
+        with open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _encode_row(row):
+        buffer = io.StringIO()
+        csv.DictWriter(buffer, fieldnames=FIELDNAMES).writerow(row)
+        return buffer.getvalue().encode('utf-8')
+
+    @staticmethod
+    def _iter_records(csvfile):
+        """Yield (offset, raw bytes) for each CSV record from the current position.
+
+        A record can span several physical lines when a quoted field contains
+        a newline, so lines are joined until the quotes balance.
+        """
+        offset = csvfile.tell()
+        pending = b''
+        for line in iter(csvfile.readline, b''):
+            pending += line
+            if pending.count(b'"') % 2 == 0:
+                yield offset, pending
+                offset += len(pending)
+                pending = b''
+
+    @staticmethod
+    def _parse_record(raw):
+        return next(csv.DictReader(io.StringIO(raw.decode('utf-8'), newline=''), fieldnames=FIELDNAMES))
+
+    def _refresh_index(self):
+        """Index records appended since the last call (by any process).
+
+        Must be called with the lock held. If the file was replaced by a
+        compaction in another process, the index is rebuilt from scratch.
+        """
+        stat = os.stat(self.csv_path)
+        if stat.st_ino != self._indexed_inode or stat.st_size < self._indexed_size:
+            self._index = {}
+            self._dead_records = 0
+            self._indexed_size = 0
+            self._indexed_inode = stat.st_ino
+        if stat.st_size == self._indexed_size:
+            return
+
+        with open(self.csv_path, 'rb') as csvfile:
+            csvfile.seek(self._indexed_size)
+            for offset, raw in self._iter_records(csvfile):
+                if offset == 0:
+                    continue  # header
+                application_number = self._parse_record(raw)['Application Number']
+                if application_number in self._index:
+                    self._dead_records += 1
+                self._index[application_number] = offset
+                self._indexed_size = offset + len(raw)
+
+    def _read_latest(self, application_number):
+        """Return the latest record for an application, or None (lock held)"""
+        offset = self._index.get(application_number)
+        if offset is None:
+            return None
+        with open(self.csv_path, 'rb') as csvfile:
+            csvfile.seek(offset)
+            _, raw = next(self._iter_records(csvfile))
+        return self._parse_record(raw)
+
+    def _append_row(self, row):
+        """Append a record and index it (lock held)"""
+        with open(self.csv_path, 'ab') as csvfile:
+            offset = csvfile.tell()
+            data = self._encode_row(row)
+            csvfile.write(data)
+            csvfile.flush()
+            os.fsync(csvfile.fileno())
+        if row['Application Number'] in self._index:
+            self._dead_records += 1
+        self._index[row['Application Number']] = offset
+        self._indexed_size = offset + len(data)
+        self._maybe_compact()
+
+    def _maybe_compact(self):
+        """Rewrite the file with only the latest records once enough are superseded (lock held)"""
+        if self._dead_records >= max(COMPACT_MIN_DEAD_RECORDS, len(self._index)):
+            self._compact()
+
+    def compact(self):
+        """Rewrite the log keeping only the latest record of each application"""
+        with self._locked():
+            # Another process may have appended or compacted since this one last looked
+            self._refresh_index()
+            self._compact()
+
+    def _compact(self):
+        """Compact with the lock held and the index up to date"""
+        with open(self.csv_path, 'rb') as source:
+            records = []
+            for offset, raw in self._iter_records(source):
+                if offset and self._index.get(self._parse_record(raw)['Application Number']) == offset:
+                    records.append(raw)
+
+        temp_path = self.csv_path + '.compact'
+        with open(temp_path, 'wb') as target:
+            target.write(','.join(FIELDNAMES).encode('utf-8') + b'\r\n')
+            target.writelines(records)
+            target.flush()
+            os.fsync(target.fileno())
+        os.replace(temp_path, self.csv_path)
+
+        # Offsets changed; rebuild the index from the compacted file
+        self._indexed_inode = None
+        self._refresh_index()
+
+    def _append_calculator_data(self, application_number, calculator_data):
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self._locked():
+            self._refresh_index()
+            row = self._read_latest(application_number) or {
+                'Application Number': application_number,
+                'Full Name': '',
+                'Email': '',
+                'Phone': '',
+                'Created At': now
+            }
+            row.update({
+                'Location': calculator_data.get('location_name', 'Unknown'),
+                'Usage Type': calculator_data.get('user_type', ''),
+                'Grid Hours': calculator_data.get('grid_hours', ''),
+                'Monthly Fuel Cost': calculator_data.get('monthly_fuel_cost', ''),
+                'Daily Energy': calculator_data.get('daily_energy', ''),
+                'Maintenance Cost': calculator_data.get('maintenance_cost', ''),
+                'Appliances & Equipment': self._format_appliances(calculator_data),
+                'Updated At': now
+            })
+            self._append_row(row)
+
+    def _append_application(self, name, email, phone, application_number):
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self._locked():
+            self._refresh_index()
+            row = self._read_latest(application_number) or {
+                'Application Number': application_number,
+                'Location': '',
+                'Usage Type': '',
+                'Grid Hours': '',
+                'Monthly Fuel Cost': '',
+                'Daily Energy': '',
+                'Maintenance Cost': '',
+                'Appliances & Equipment': '[]',  # Empty JSON array
+                'Created At': now
+            }
+            row.update({
+                'Full Name': name,
+                'Email': email,
+                'Phone': phone,
+                'Updated At': now
+            })
+            self._append_row(row)
+
+    def _latest_applications(self):
+        """Latest record of every application, in order of first appearance"""
+        latest = {}
+        with self._locked(exclusive=False):
+            with open(self.csv_path, 'r', newline='', encoding='utf-8') as csvfile:
+                for row in csv.DictReader(csvfile):
+                    latest[row['Application Number']] = row
+        return list(latest.values())
+
 # Create a single instance to be used across the application
 db = LoanApplicationLogger()
\ No newline at end of file
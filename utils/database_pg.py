@@ -1,7 +1,59 @@
+import csv
 import json
-from datetime import datetime
+import math
+from datetime import datetime, time, timedelta
+from io import StringIO
 import logging
-from models import db, LoanApplication
+from sqlalchemy import case, func
+from models import db, LeadRollup, LoanApplication
+from utils.db_engine import with_retry
+from utils.lead_rollups import UNKNOWN_ENERGY
+from utils.metrics import timed
+
+CSV_FIELDNAMES = [
+    'Application Number', 'Location', 'Usage Type', 'Grid Hours',
+    'Monthly Fuel Cost', 'Daily Energy', 'Maintenance Cost',
+    'Appliances & Equipment', 'Full Name', 'Email', 'Phone',
+    'Created At', 'Updated At'
+]
+
+# Columns overwritten when an existing application is saved again
+CALCULATOR_COLUMNS = (
+    'location', 'usage_type', 'grid_hours', 'monthly_fuel_cost', 'daily_energy',
+    'maintenance_cost', 'appliances', 'updated_at'
+)
+CONTACT_COLUMNS = ('full_name', 'email', 'phone', 'updated_at')
+
+# Upsert statements keyed by (dialect name, update columns)
+_upsert_statements = {}
+
+# Maximum length of each LoanApplication text column
+STRING_LENGTHS = {
+    column.name: column.type.length
+    for column in LoanApplication.__table__.columns
+    if isinstance(column.type, db.String) and column.type.length
+}
+
+def oversized_fields(values):
+    """Columns of a row of LoanApplication values holding text longer than the column allows"""
+    return [
+        name for name, value in values.items()
+        if isinstance(value, str) and len(value) > STRING_LENGTHS.get(name, len(value))
+    ]
+
+def _to_float(value):
+    """Parse a calculator form value into a float, or None if it is blank or invalid"""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+def _format_number(value):
+    """Render a numeric column for CSV, dropping a trailing .0 on whole numbers"""
+    if value is None:
+        return ''
+    return str(int(value)) if float(value).is_integer() else str(value)
 
 class LoanApplicationManager:
     def __init__(self):
@@ -9,207 +61,297 @@ class LoanApplicationManager:
         self.session = db.session
         logging.info("Initialized LoanApplicationManager with database session")
 
+    @staticmethod
+    def _upsert(update_columns):
+        """Return an INSERT ... ON CONFLICT (application_number) DO UPDATE statement.
+
+        The statement is built once per dialect and column set and executed
+        with the row values as parameters; on conflict only ``update_columns``
+        are overwritten, taken from the row being inserted.
+        """
+        dialect = db.session.get_bind().dialect.name
+        key = (dialect, update_columns)
+        statement = _upsert_statements.get(key)
+        if statement is None:
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert
+            elif dialect == 'sqlite':
+                from sqlalchemy.dialects.sqlite import insert
+            else:
+                raise NotImplementedError(f"Upsert is not supported on {dialect}")
+            statement = insert(LoanApplication)
+            statement = statement.on_conflict_do_update(
+                index_elements=[LoanApplication.application_number],
+                set_={column: statement.excluded[column] for column in update_columns}
+            )
+            _upsert_statements[key] = statement
+        return statement
+
+    @staticmethod
+    def calculator_values(application_number, calculator_data, now=None):
+        """Map a calculator submission onto LoanApplication column values"""
+        # Format appliances data
+        formatted_appliances = []
+        for appliance in calculator_data.get('appliances', []):
+            formatted_appliances.append({
+                'type': appliance.get('type', ''),
+                'units': appliance.get('units', 0),
+                'hours_per_day': appliance.get('hours', 0),
+                'backup_included': appliance.get('backup', False),
+                'power_watts': appliance.get('power', 0),
+                'daily_usage_kwh': appliance.get('daily_usage', 0)
+            })
+        now = now or datetime.utcnow()
+        return {
+            'application_number': application_number,
+            'location': calculator_data.get('location_name', 'Unknown'),
+            'usage_type': calculator_data.get('user_type', ''),
+            'grid_hours': _to_float(calculator_data.get('grid_hours')),
+            'monthly_fuel_cost': _to_float(calculator_data.get('monthly_fuel_cost')),
+            'daily_energy': _to_float(calculator_data.get('daily_energy')),
+            'maintenance_cost': _to_float(calculator_data.get('maintenance_cost')),
+            'appliances': formatted_appliances,
+            'created_at': now,
+            'updated_at': now
+        }
+
+    @staticmethod
+    def contact_values(application_number, name, email, phone, now=None):
+        """Map a lead's contact details onto LoanApplication column values"""
+        now = now or datetime.utcnow()
+        return {
+            'application_number': application_number,
+            'full_name': name,
+            'email': email,
+            'phone': phone,
+            'appliances': [],
+            'created_at': now,
+            'updated_at': now
+        }
+
+    @with_retry
+    def _save(self, update_columns, values):
+        # An upsert can be repeated safely even if the lost commit went through
+        db.session.execute(self._upsert(update_columns), values)
+        db.session.commit()
+
+    def upsert_rows(self, update_columns, rows):
+        """Upsert many rows in one transaction; raises on failure after rolling back"""
+        try:
+            db.session.execute(self._upsert(update_columns), rows)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    @timed('db_save')
     def save_calculator_data(self, application_number, calculator_data):
-        """Save or update calculator data in the database"""
+        """Save or update calculator data in the database with a single upsert"""
         try:
-            # Format appliances data
-            appliances_data = calculator_data.get('appliances', [])
-            formatted_appliances = []
-            for appliance in appliances_data:
-                formatted_appliances.append({
-                    'type': appliance.get('type', ''),
-                    'units': appliance.get('units', 0),
-                    'hours_per_day': appliance.get('hours', 0),
-                    'backup_included': appliance.get('backup', False),
-                    'power_watts': appliance.get('power', 0),
-                    'daily_usage_kwh': appliance.get('daily_usage', 0)
-                })
-            
+            values = self.calculator_values(application_number, calculator_data)
+            too_long = oversized_fields(values)
+            if too_long:
+                logging.error(f"Not saving calculator data for application {application_number}: {', '.join(too_long)} too long")
+                return False
+
             # Log the data for debugging
             logging.debug(f"Calculator data: {calculator_data}")
-            logging.debug(f"Formatted appliances: {formatted_appliances}")
-            
-            try:
-                # Check if application already exists using a fresh session
-                application = db.session.query(LoanApplication).filter_by(application_number=application_number).first()
-                
-                if application:
-                    # Update existing application
-                    application.location = calculator_data.get('location_name', 'Unknown')
-                    application.usage_type = calculator_data.get('user_type', '')
-                    application.grid_hours = str(calculator_data.get('grid_hours', ''))
-                    application.monthly_fuel_cost = str(calculator_data.get('monthly_fuel_cost', ''))
-                    application.daily_energy = str(calculator_data.get('daily_energy', ''))
-                    application.maintenance_cost = str(calculator_data.get('maintenance_cost', ''))
-                    application.set_appliances(formatted_appliances)
-                    application.updated_at = datetime.utcnow()
-                    logging.info(f"Updated existing application {application_number}")
-                else:
-                    # Create new application
-                    application = LoanApplication(
-                        application_number=application_number,
-                        location=calculator_data.get('location_name', 'Unknown'),
-                        usage_type=calculator_data.get('user_type', ''),
-                        grid_hours=str(calculator_data.get('grid_hours', '')),
-                        monthly_fuel_cost=str(calculator_data.get('monthly_fuel_cost', '')),
-                        daily_energy=str(calculator_data.get('daily_energy', '')),
-                        maintenance_cost=str(calculator_data.get('maintenance_cost', '')),
-                        appliances=json.dumps(formatted_appliances)
-                    )
-                    db.session.add(application)
-                    logging.info(f"Created new application {application_number}")
-                
-                db.session.commit()
-                logging.info(f"Successfully saved calculator data for application {application_number}")
-                return True
-                
-            except Exception as inner_e:
-                # If we have a connection error, try to reconnect
-                db.session.rollback()
-                logging.error(f"Database operation error: {str(inner_e)}")
-                # Create a new application with a fresh session attempt
-                application = LoanApplication(
-                    application_number=application_number,
-                    location=calculator_data.get('location_name', 'Unknown'),
-                    usage_type=calculator_data.get('user_type', ''),
-                    grid_hours=str(calculator_data.get('grid_hours', '')),
-                    monthly_fuel_cost=str(calculator_data.get('monthly_fuel_cost', '')),
-                    daily_energy=str(calculator_data.get('daily_energy', '')),
-                    maintenance_cost=str(calculator_data.get('maintenance_cost', '')),
-                    appliances=json.dumps(formatted_appliances)
-                )
-                db.session.add(application)
-                db.session.commit()
-                logging.info(f"Created application after reconnection attempt: {application_number}")
-                return True
-                
+            logging.debug(f"Formatted appliances: {values['appliances']}")
+
+            self._save(CALCULATOR_COLUMNS, values)
+            logging.info(f"Successfully saved calculator data for application {application_number}")
+            return True
+
         except Exception as e:
             db.session.rollback()
             logging.error(f"Error saving calculator data: {str(e)}")
             return False
 
+    @timed('db_save_contact')
     def save_application(self, name, email, phone, application_number):
-        """Save or update personal information for an application"""
+        """Save or update personal information for an application with a single upsert"""
         try:
             logging.debug(f"Attempting to save personal info for application {application_number}")
-            
-            try:
-                # Check if application already exists
-                application = db.session.query(LoanApplication).filter_by(application_number=application_number).first()
-                
-                if application:
-                    # Update existing application with personal info
-                    logging.debug(f"Updating existing application {application_number}")
-                    application.full_name = name
-                    application.email = email
-                    application.phone = phone
-                    application.updated_at = datetime.utcnow()
-                else:
-                    # Create new application with minimal data
-                    logging.debug(f"Creating new application {application_number}")
-                    application = LoanApplication(
-                        application_number=application_number,
-                        full_name=name,
-                        email=email,
-                        phone=phone,
-                        appliances='[]'
-                    )
-                    db.session.add(application)
-                
-                db.session.commit()
-                logging.info(f"Successfully saved personal info for application {application_number}")
-                return True
-                
-            except Exception as inner_e:
-                # If we have a connection error, try to reconnect
-                db.session.rollback()
-                logging.error(f"Database operation error: {str(inner_e)}")
-                
-                # Create a new application with a fresh session attempt
-                application = LoanApplication(
-                    application_number=application_number,
-                    full_name=name,
-                    email=email,
-                    phone=phone,
-                    appliances='[]'
-                )
-                db.session.add(application)
-                db.session.commit()
-                logging.info(f"Created application after reconnection attempt: {application_number}")
-                return True
-                
+            values = self.contact_values(application_number, name, email, phone)
+            too_long = oversized_fields(values)
+            if too_long:
+                logging.error(f"Not saving personal info for application {application_number}: {', '.join(too_long)} too long")
+                return False
+            self._save(CONTACT_COLUMNS, values)
+            logging.info(f"Successfully saved personal info for application {application_number}")
+            return True
+
         except Exception as e:
             db.session.rollback()
             logging.error(f"Error saving personal info: {str(e)}")
             return False
 
+    @with_retry
+    def _all_applications(self):
+        applications = db.session.query(LoanApplication).all()
+        result = []
+        for app in applications:
+            try:
+                result.append(app.to_dict())
+            except Exception as app_e:
+                logging.error(f"Error converting application to dict: {str(app_e)}")
+        return result
+
     def get_all_applications(self):
         """Get all loan applications in dictionary format"""
         try:
-            applications = db.session.query(LoanApplication).all()
-            result = []
-            for app in applications:
-                try:
-                    result.append(app.to_dict())
-                except Exception as app_e:
-                    logging.error(f"Error converting application to dict: {str(app_e)}")
-            return result
+            return self._all_applications()
         except Exception as e:
+            db.session.rollback()
             logging.error(f"Error retrieving applications: {str(e)}")
             return []
 
+    @with_retry
+    def get_applications_page(self, per_page, after=None, before=None):
+        """Get one page of applications, newest first, paging by keyset on (created_at, id).
+
+        ``after`` is the (created_at, id) cursor of the last row of a page and
+        gives the older page following it, ``before`` the cursor of the first
+        row and gives the newer page preceding it; with neither the newest
+        page is returned. Each page reads per_page + 1 rows through the
+        created_at index, with no count and no OFFSET to skip.
+        Applications without a created_at are not listed, as in the rollups.
+        Returns {'applications': [...dicts], 'newer': cursor, 'older':
+        cursor}, the cursors being None at either end.
+        """
+        created_at, id_ = LoanApplication.created_at, LoanApplication.id
+        query = db.session.query(LoanApplication).filter(created_at.isnot(None))
+        if before:
+            cursor_time, cursor_id = before
+            query = query.filter(created_at >= cursor_time, (created_at > cursor_time) | (id_ > cursor_id))
+            query = query.order_by(created_at.asc(), id_.asc())
+        else:
+            if after:
+                cursor_time, cursor_id = after
+                query = query.filter(created_at <= cursor_time, (created_at < cursor_time) | (id_ < cursor_id))
+            query = query.order_by(created_at.desc(), id_.desc())
+        rows = query.limit(per_page + 1).all()
+        more = len(rows) > per_page
+        rows = rows[:per_page]
+        if before:
+            rows.reverse()
+        has_newer, has_older = (more, True) if before else (bool(after), more)
+        return {
+            'applications': [app.to_dict() for app in rows],
+            'newer': (rows[0].created_at, rows[0].id) if rows and has_newer else None,
+            'older': (rows[-1].created_at, rows[-1].id) if rows and has_older else None,
+        }
+
+    @with_retry
+    def get_dashboard_stats(self):
+        """Compute dashboard counters from the lead rollups, as of their last refresh"""
+        total, home, business, energy, known_energy = db.session.query(
+            func.coalesce(func.sum(LeadRollup.leads), 0),
+            func.coalesce(func.sum(case((LeadRollup.usage_type == 'home', LeadRollup.leads), else_=0)), 0),
+            func.coalesce(func.sum(case((LeadRollup.usage_type == 'business', LeadRollup.leads), else_=0)), 0),
+            func.sum(LeadRollup.energy_kwh),
+            func.sum(case((LeadRollup.energy_bucket != UNKNOWN_ENERGY, LeadRollup.leads), else_=0))
+        ).one()
+        return {
+            'total': int(total),
+            'home': int(home),
+            'business': int(business),
+            'avg_energy': round(float(energy) / known_energy, 2) if known_energy else 0
+        }
+
+    @with_retry
+    def _application_by_number(self, application_number):
+        return db.session.query(LoanApplication).filter_by(application_number=application_number).first()
+
     def get_application_by_number(self, application_number):
         """Get a specific application by its number"""
         try:
-            application = db.session.query(LoanApplication).filter_by(application_number=application_number).first()
+            application = self._application_by_number(application_number)
             if application:
                 return application.to_dict()
             logging.debug(f"No application found for number: {application_number}")
             return None
         except Exception as e:
+            db.session.rollback()
             logging.error(f"Error retrieving application {application_number}: {str(e)}")
             return None
 
+    @staticmethod
+    def _export_filters(start_date=None, end_date=None, location=None):
+        """Build filter conditions for exports (end_date is inclusive)"""
+        filters = []
+        if start_date:
+            filters.append(LoanApplication.created_at >= datetime.combine(start_date, time.min))
+        if end_date:
+            filters.append(LoanApplication.created_at < datetime.combine(end_date + timedelta(days=1), time.min))
+        if location:
+            filters.append(LoanApplication.location == location)
+        return filters
+
+    @with_retry
+    def has_applications(self, start_date=None, end_date=None, location=None):
+        """Check whether any application matches the export filters"""
+        filters = self._export_filters(start_date, end_date, location)
+        return db.session.query(
+            db.session.query(LoanApplication.id).filter(*filters).exists()
+        ).scalar()
+
+    def iter_csv_export(self, start_date=None, end_date=None, location=None, batch_size=1000):
+        """Yield the applications export as CSV text chunks.
+
+        Rows are read in batches through a server-side cursor (yield_per) and
+        written out one batch at a time, so memory use does not grow with the
+        size of the table.
+        """
+        columns = (
+            LoanApplication.application_number, LoanApplication.location,
+            LoanApplication.usage_type, LoanApplication.grid_hours,
+            LoanApplication.monthly_fuel_cost, LoanApplication.daily_energy,
+            LoanApplication.maintenance_cost, LoanApplication.appliances,
+            LoanApplication.full_name, LoanApplication.email, LoanApplication.phone,
+            LoanApplication.created_at, LoanApplication.updated_at
+        )
+        query = (
+            db.session.query(*columns)
+            .filter(*self._export_filters(start_date, end_date, location))
+            .order_by(LoanApplication.id)
+            .yield_per(batch_size)
+        )
+
+        output = StringIO()
+        writer = csv.writer(output)
+        writer.writerow(CSV_FIELDNAMES)
+        for count, row in enumerate(query, 1):
+            created_at, updated_at = row[-2], row[-1]
+            writer.writerow([
+                row.application_number,
+                row.location or '',
+                row.usage_type or '',
+                _format_number(row.grid_hours),
+                _format_number(row.monthly_fuel_cost),
+                _format_number(row.daily_energy),
+                _format_number(row.maintenance_cost),
+                json.dumps(row.appliances if row.appliances is not None else []),
+                row.full_name or '',
+                row.email or '',
+                row.phone or '',
+                created_at.strftime('%Y-%m-%d %H:%M:%S') if created_at else '',
+                updated_at.strftime('%Y-%m-%d %H:%M:%S') if updated_at else ''
+            ])
+            if count % batch_size == 0:
+                yield output.getvalue()
+                output.seek(0)
+                output.truncate()
+        yield output.getvalue()
+
     def export_to_csv(self):
         """Generate CSV data from all applications"""
-        import csv
-        from io import StringIO
-        
         try:
-            applications = self.get_all_applications()
-            if not applications:
+            if not self.has_applications():
                 return None
-            
-            # Create CSV in memory
-            output = StringIO()
-            fieldnames = [
-                'Application Number', 'Location', 'Usage Type', 'Grid Hours',
-                'Monthly Fuel Cost', 'Daily Energy', 'Maintenance Cost',
-                'Appliances & Equipment', 'Full Name', 'Email', 'Phone',
-                'Created At', 'Updated At'
-            ]
-            writer = csv.DictWriter(output, fieldnames=fieldnames)
-            writer.writeheader()
-            
-            for app in applications:
-                writer.writerow({
-                    'Application Number': app['application_number'],
-                    'Location': app['location'] or '',
-                    'Usage Type': app['usage_type'] or '',
-                    'Grid Hours': app['grid_hours'] or '',
-                    'Monthly Fuel Cost': app['monthly_fuel_cost'] or '',
-                    'Daily Energy': app['daily_energy'] or '',
-                    'Maintenance Cost': app['maintenance_cost'] or '',
-                    'Appliances & Equipment': json.dumps(app['appliances']),
-                    'Full Name': app['full_name'] or '',
-                    'Email': app['email'] or '',
-                    'Phone': app['phone'] or '',
-                    'Created At': app['created_at'] or '',
-                    'Updated At': app['updated_at'] or ''
-                })
-            
-            return output.getvalue()
+            return ''.join(self.iter_csv_export())
         except Exception as e:
+            db.session.rollback()
             logging.error(f"Error exporting to CSV: {str(e)}")
             return None
 
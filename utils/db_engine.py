@@ -0,0 +1,146 @@
+import logging
+import os
+import random
+import time
+from functools import wraps
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import DBAPIError, OperationalError
+from sqlalchemy.pool import QueuePool
+
+from models import db
+from utils import metrics
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def _env_float(name, default):
+    return float(os.environ.get(name, default))
+
+
+def _env_flag(name, default):
+    return os.environ.get(name, default).lower() in ('1', 'true', 'yes')
+
+
+# Connections per worker process: DB_POOL_SIZE kept open, up to
+# DB_MAX_OVERFLOW more under bursts. Multiply by the number of gunicorn
+# workers to get what the database has to accept.
+POOL_SIZE = _env_int('DB_POOL_SIZE', 5)
+MAX_OVERFLOW = _env_int('DB_MAX_OVERFLOW', 10)
+POOL_TIMEOUT = _env_float('DB_POOL_TIMEOUT', 10)  # seconds to wait for a free connection
+POOL_RECYCLE = _env_int('DB_POOL_RECYCLE', 1800)  # seconds before a connection is replaced
+POOL_PRE_PING = _env_flag('DB_POOL_PRE_PING', '1')
+CONNECT_TIMEOUT = _env_int('DB_CONNECT_TIMEOUT', 5)  # seconds
+STATEMENT_TIMEOUT_MS = _env_int('DB_STATEMENT_TIMEOUT_MS', 0)  # 0 = no limit
+
+RETRY_ATTEMPTS = _env_int('DB_RETRY_ATTEMPTS', 3)
+RETRY_BASE_DELAY = _env_float('DB_RETRY_BASE_DELAY', 0.1)
+RETRY_MAX_DELAY = _env_float('DB_RETRY_MAX_DELAY', 2.0)
+
+# SQLSTATEs meaning the server went away or is not accepting connections
+# yet: class 08 (connection exception) and the 57P0x shutdown codes
+TRANSIENT_SQLSTATES = ('57P01', '57P02', '57P03')
+
+_retries = 0
+_disconnects = 0
+
+
+def engine_options(database_url):
+    """SQLALCHEMY_ENGINE_OPTIONS for a database URL, from the DB_* environment variables"""
+    options = {'pool_pre_ping': POOL_PRE_PING}
+    if not database_url:
+        return options
+    url = make_url(database_url)
+    # In-memory SQLite keeps a single connection, which has no pool to size
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return options
+    options.update(
+        pool_size=POOL_SIZE,
+        max_overflow=MAX_OVERFLOW,
+        pool_timeout=POOL_TIMEOUT,
+        pool_recycle=POOL_RECYCLE,
+    )
+    if url.get_backend_name() == 'postgresql':
+        connect_args = {'connect_timeout': CONNECT_TIMEOUT}
+        if STATEMENT_TIMEOUT_MS:
+            connect_args['options'] = f'-c statement_timeout={STATEMENT_TIMEOUT_MS}'
+        options['connect_args'] = connect_args
+    return options
+
+
+def is_transient_disconnect(error):
+    """Whether a database error means the connection was lost, so the operation may succeed if repeated"""
+    if not isinstance(error, DBAPIError):
+        return False
+    if error.connection_invalidated:
+        return True
+    if not hasattr(error.orig, 'pgcode'):
+        return False  # not a Postgres driver error
+    code = error.orig.pgcode
+    if code is None:
+        # Raised by the client library itself: refused, timed out or closed connections
+        return isinstance(error, OperationalError)
+    return code.startswith('08') or code in TRANSIENT_SQLSTATES
+
+
+def with_retry(operation):
+    """Decorator retrying an idempotent database operation after a transient disconnect.
+
+    The session is rolled back before each new attempt, and attempts are
+    spread out with exponential backoff and full jitter, so workers that
+    lost their connections in the same failover do not reconnect in
+    lockstep. Other errors are raised at once.
+    """
+    @wraps(operation)
+    def wrapper(*args, **kwargs):
+        global _retries
+        for attempt in range(RETRY_ATTEMPTS):
+            try:
+                return operation(*args, **kwargs)
+            except DBAPIError as e:
+                if attempt + 1 >= RETRY_ATTEMPTS or not is_transient_disconnect(e):
+                    raise
+                db.session.rollback()
+                _retries += 1
+                delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+                logging.warning(f"Database connection lost in {operation.__name__}, retrying in {delay:.2f}s")
+                time.sleep(delay)
+    return wrapper
+
+
+def _count_disconnect(context):
+    global _disconnects
+    if context.is_disconnect:
+        _disconnects += 1
+
+
+def _pool_connections(engine):
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return {}
+    return {
+        ('checked_out',): pool.checkedout(),
+        ('idle',): pool.checkedin(),
+        ('overflow',): max(pool.overflow(), 0),
+    }
+
+
+def init_engine_metrics(engine):
+    """Export pool usage and disconnect counts for an engine"""
+    event.listen(engine, 'handle_error', _count_disconnect)
+    metrics.register_collector(
+        'solar_db_pool_connections', 'gauge',
+        'Pooled connections by state (overflow: opened beyond the pool size)', ('state',),
+        lambda: _pool_connections(engine))
+    metrics.register_collector(
+        'solar_db_pool_limit', 'gauge', 'Most connections the pool will open (size plus overflow)', (),
+        lambda: {(): engine.pool.size() + MAX_OVERFLOW} if isinstance(engine.pool, QueuePool) else {})
+    metrics.register_collector(
+        'solar_db_disconnects_total', 'counter', 'Errors that invalidated a database connection', (),
+        lambda: {(): _disconnects})
+    metrics.register_collector(
+        'solar_db_retries_total', 'counter', 'Operations repeated after a transient disconnect', (),
+        lambda: {(): _retries})
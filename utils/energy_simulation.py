@@ -0,0 +1,242 @@
+from functools import lru_cache
+
+import numpy as np
+
+HOURS_PER_DAY = 24
+DAYS_PER_YEAR = 365
+HOURS_PER_YEAR = HOURS_PER_DAY * DAYS_PER_YEAR
+
+# Generator fallback, matching the fuel assumptions used for savings estimates
+GENERATOR_LITRES_PER_KWH = 0.5
+FUEL_PRICE_PER_LITRE = 650
+
+# Hours of the day in the order an appliance is assumed to be switched on: an
+# appliance used for N hours a day runs in the first N hours of its ranking
+USAGE_PATTERNS = {
+    "evening": [19, 20, 21, 18, 22, 7, 6, 23, 17, 13, 12, 14, 8, 9, 16, 15, 10, 11, 5, 0, 4, 1, 3, 2],
+    "night": [20, 21, 22, 23, 0, 1, 2, 3, 4, 19, 5, 18, 6, 17, 7, 16, 8, 15, 9, 14, 10, 13, 11, 12],
+    "morning": [6, 7, 8, 5, 9, 18, 17, 19, 10, 16, 11, 20, 15, 12, 14, 13, 21, 22, 4, 23, 3, 0, 2, 1],
+}
+
+# Typical household demand by hour, used when no appliance list is available
+DEFAULT_LOAD_SHAPE = np.array([
+    0.02, 0.02, 0.02, 0.02, 0.02, 0.03, 0.05, 0.05, 0.04, 0.03, 0.03, 0.03,
+    0.04, 0.04, 0.03, 0.03, 0.04, 0.05, 0.07, 0.09, 0.09, 0.08, 0.06, 0.03
+])
+DEFAULT_LOAD_SHAPE = DEFAULT_LOAD_SHAPE / DEFAULT_LOAD_SHAPE.sum()
+
+
+def _read_only(array):
+    array.setflags(write=False)
+    return array
+
+
+@lru_cache(maxsize=64)
+def solar_profile(sun_hours, seed=0):
+    """Synthetic hourly PV yield for one year, in kWh per kW of panels.
+
+    Each day is a half-sine between sunrise and sunset, with day length and
+    irradiance following the seasons at Nigerian latitudes (brightest around
+    March, dullest in the rainy season) and a seeded random clearness factor
+    per day. The result is scaled so the average day yields ``sun_hours``.
+    """
+    rng = np.random.default_rng(seed)
+    days = np.arange(DAYS_PER_YEAR)
+    hours = np.arange(HOURS_PER_DAY) + 0.5
+
+    day_length = 12 + 0.6 * np.sin(2 * np.pi * (days - 80) / DAYS_PER_YEAR)
+    sunrise = 12 - day_length / 2
+    phase = (hours[None, :] - sunrise[:, None]) / day_length[:, None]
+    shape = np.where((phase > 0) & (phase < 1), np.sin(np.pi * phase), 0.0)
+    shape /= shape.sum(axis=1, keepdims=True)
+
+    seasonal = 1 + 0.12 * np.cos(2 * np.pi * (days - 80) / DAYS_PER_YEAR)
+    clearness = rng.beta(6, 2, DAYS_PER_YEAR)
+    daily_yield = seasonal * clearness
+    daily_yield *= sun_hours / daily_yield.mean()
+
+    return _read_only((daily_yield[:, None] * shape).reshape(-1))
+
+
+@lru_cache(maxsize=64)
+def grid_availability(grid_hours, seed=0):
+    """Hourly grid availability for one year as a boolean array.
+
+    The grid is on for ``grid_hours`` consecutive hours a day, starting at a
+    seeded random hour that changes from day to day.
+    """
+    rng = np.random.default_rng(seed)
+    grid_hours = min(max(round(grid_hours), 0), HOURS_PER_DAY)
+    start = rng.integers(0, HOURS_PER_DAY, DAYS_PER_YEAR)
+    hour_of_day = np.arange(HOURS_PER_DAY)
+    available = (hour_of_day[None, :] - start[:, None]) % HOURS_PER_DAY < grid_hours
+    return _read_only(available.reshape(-1))
+
+
+def load_profile(hourly_kw=None, daily_energy_kwh=None, variability=0.1, seed=0):
+    """Hourly demand in kW for one year.
+
+    The daily shape is ``hourly_kw``, the 24 hourly demands of an
+    ApplianceLoad, or without it a typical household curve scaled to
+    ``daily_energy_kwh``. Each day is scaled by a seeded log-normal factor
+    with mean 1 so that demand varies from day to day.
+    """
+    if hourly_kw is not None:
+        day = np.asarray(hourly_kw, dtype=float)
+    else:
+        day = DEFAULT_LOAD_SHAPE * float(daily_energy_kwh or 0)
+
+    rng = np.random.default_rng(seed)
+    if variability > 0:
+        daily_factor = rng.lognormal(-variability ** 2 / 2, variability, DAYS_PER_YEAR)
+    else:
+        daily_factor = np.ones(DAYS_PER_YEAR)
+    return (daily_factor[:, None] * day[None, :]).reshape(-1)
+
+
+def _compose_prefixes(a, lo, hi):
+    """Compose clamp maps x -> min(max(x + a, lo), hi) into running prefixes, in place.
+
+    Composing two such maps gives another one, so every prefix along the last
+    axis is combined by doubling (a Hillis-Steele scan) in log2(n) passes.
+    """
+    step = 1
+    while step < a.shape[-1]:
+        a_cur, lo_cur, hi_cur = a[..., step:], lo[..., step:], hi[..., step:]
+        next_lo = np.minimum(np.maximum(lo[..., :-step] + a_cur, lo_cur), hi_cur)
+        next_hi = np.minimum(np.maximum(hi[..., :-step] + a_cur, lo_cur), hi_cur)
+        next_a = a[..., :-step] + a_cur
+        a[..., step:], lo[..., step:], hi[..., step:] = next_a, next_lo, next_hi
+        step *= 2
+
+
+def _clamped_cumsum(shift, lower, upper, start, block=HOURS_PER_DAY):
+    """Solve soc[t] = clip(soc[t-1] + shift[t], lower, upper) along the last axis.
+
+    The hours are scanned within each day first, then the 365 whole-day maps
+    are scanned to find every day's starting charge, which is cheaper than one
+    scan over all 8760 hours and needs no Python loop over time.
+    """
+    a = np.array(shift, dtype=float)
+    lo = np.array(np.broadcast_to(lower, a.shape), dtype=float)
+    hi = np.array(np.broadcast_to(upper, a.shape), dtype=float)
+    start = np.asarray(start, dtype=float)
+
+    hours = a.shape[-1]
+    if hours % block:
+        _compose_prefixes(a, lo, hi)
+        return np.minimum(np.maximum(start[..., None] + a, lo), hi)
+
+    blocks = a.shape[:-1] + (hours // block, block)
+    a, lo, hi = a.reshape(blocks), lo.reshape(blocks), hi.reshape(blocks)
+    _compose_prefixes(a, lo, hi)
+
+    # Each day's full map, scanned across days, gives the charge at the end of every day
+    day_a, day_lo, day_hi = a[..., -1].copy(), lo[..., -1].copy(), hi[..., -1].copy()
+    _compose_prefixes(day_a, day_lo, day_hi)
+    day_end = np.minimum(np.maximum(start[..., None] + day_a, day_lo), day_hi)
+    day_start = np.concatenate([start[..., None], day_end[..., :-1]], axis=-1)
+
+    soc = np.minimum(np.maximum(day_start[..., None] + a, lo), hi)
+    return soc.reshape(soc.shape[:-2] + (hours,))
+
+
+def simulate_energy_system(pv_kw, battery_kwh, inverter_kw, load_kw, solar_kwh_per_kw, grid_available,
+                           battery_efficiency=0.95, depth_of_discharge=0.8, c_rate=0.5,
+                           grid_charging=True, generator=True, initial_soc=1.0, return_series=False):
+    """Simulate a PV + battery + inverter system hour by hour over a year.
+
+    ``pv_kw``, ``battery_kwh``, ``inverter_kw``, ``battery_efficiency`` and
+    ``depth_of_discharge`` may be arrays of scenarios; they are broadcast
+    together and every returned value has that shape. ``load_kw``,
+    ``solar_kwh_per_kw`` and ``grid_available`` are hourly series (last axis).
+
+    While the grid is on it carries the load and (with ``grid_charging``)
+    recharges the battery. During outages PV serves the load first, then the
+    battery, both through the inverter; whatever is left is met by the
+    generator, or counted as unserved if ``generator`` is False. Battery
+    charge and discharge are limited to ``c_rate`` times capacity per hour.
+
+    Energy totals are in kWh per year. ``loss_of_load_probability`` is the
+    fraction of hours in which PV, battery and grid could not meet the load.
+    """
+    pv_kw, battery_kwh, inverter_kw, battery_efficiency, depth_of_discharge = (
+        np.asarray(value, dtype=float)
+        for value in (pv_kw, battery_kwh, inverter_kw, battery_efficiency, depth_of_discharge)
+    )
+    shape = np.broadcast_shapes(pv_kw.shape, battery_kwh.shape, inverter_kw.shape,
+                                battery_efficiency.shape, depth_of_discharge.shape)
+    pv_kw, battery_kwh, inverter_kw, battery_efficiency, depth_of_discharge = (
+        np.broadcast_to(value, shape)[..., None]
+        for value in (pv_kw, battery_kwh, inverter_kw, battery_efficiency, depth_of_discharge)
+    )
+    load_kw = np.asarray(load_kw, dtype=float)
+    grid_available = np.asarray(grid_available, dtype=bool)
+
+    # Round-trip losses split evenly between charging and discharging
+    charge_efficiency = np.sqrt(battery_efficiency)
+    discharge_efficiency = charge_efficiency
+    rate_limit = c_rate * battery_kwh
+
+    pv = pv_kw * np.asarray(solar_kwh_per_kw, dtype=float)
+    pv_direct = np.minimum(np.minimum(pv, load_kw), inverter_kw)
+    remaining = load_kw - pv_direct
+    surplus = pv - pv_direct
+
+    requested = np.where(grid_available, 0.0,
+                         np.minimum(np.minimum(remaining, inverter_kw - pv_direct), rate_limit))
+    charge_from_pv = np.minimum(surplus, rate_limit)
+    charge_from_grid = (np.where(grid_available, rate_limit - charge_from_pv, 0.0)
+                        if grid_charging else np.zeros_like(charge_from_pv))
+    shift = (charge_from_pv + charge_from_grid) * charge_efficiency - requested / discharge_efficiency
+
+    soc_min = battery_kwh * (1 - depth_of_discharge)
+    soc_start = soc_min + (battery_kwh - soc_min) * initial_soc
+    soc = _clamped_cumsum(shift, soc_min, battery_kwh, soc_start[..., 0])
+
+    delta = np.diff(soc, axis=-1, prepend=soc_start)
+    discharged = np.maximum(-delta, 0.0) * discharge_efficiency
+    charged = np.maximum(delta, 0.0) / charge_efficiency
+    pv_to_battery = np.minimum(charged, charge_from_pv)
+    grid_to_battery = charged - pv_to_battery
+
+    shortfall = np.where(grid_available, 0.0, np.maximum(remaining - discharged, 0.0))
+    shortfall[shortfall < 1e-9] = 0.0
+    grid_import = np.where(grid_available, remaining, 0.0) + grid_to_battery
+
+    load_total = np.broadcast_to(load_kw.sum(axis=-1), shape)
+    unmet_total = shortfall.sum(axis=-1)
+    generator_total = unmet_total if generator else np.zeros(shape)
+    discharged_total = discharged.sum(axis=-1)
+    # Battery output counts as solar only up to what PV put into it
+    solar_delivered = pv_direct.sum(axis=-1) + np.minimum(
+        discharged_total, pv_to_battery.sum(axis=-1) * battery_efficiency[..., 0])
+    usable_kwh = (battery_kwh - soc_min)[..., 0]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        solar_fraction = np.where(load_total > 0, solar_delivered / load_total, 0.0)
+        battery_cycles = np.where(usable_kwh > 0, discharged_total / usable_kwh, 0.0)
+    loss_of_load_hours = np.count_nonzero(shortfall, axis=-1)
+
+    results = {
+        "load_kwh": load_total,
+        "pv_generation_kwh": np.broadcast_to(pv.sum(axis=-1), shape),
+        "pv_used_kwh": pv_direct.sum(axis=-1) + pv_to_battery.sum(axis=-1),
+        "pv_curtailed_kwh": (surplus - pv_to_battery).sum(axis=-1),
+        "grid_import_kwh": grid_import.sum(axis=-1),
+        "battery_discharge_kwh": discharged_total,
+        "battery_cycles": battery_cycles,
+        "unmet_kwh": unmet_total,
+        "generator_kwh": generator_total,
+        "generator_fuel_cost": generator_total * GENERATOR_LITRES_PER_KWH * FUEL_PRICE_PER_LITRE,
+        "unserved_kwh": np.zeros(shape) if generator else unmet_total,
+        "loss_of_load_hours": loss_of_load_hours,
+        "loss_of_load_probability": loss_of_load_hours / shortfall.shape[-1],
+        "solar_fraction": solar_fraction,
+    }
+    if return_series:
+        results.update({
+            "state_of_charge_kwh": soc,
+            "unmet_load_kw": shortfall,
+            "pv_kw": pv,
+        })
+    return results
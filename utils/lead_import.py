@@ -0,0 +1,246 @@
+import csv
+import io
+import json
+import logging
+import time
+from datetime import datetime
+
+from sqlalchemy import Column, MetaData, Table, Text, bindparam, or_, select
+
+from models import db, LoanApplication
+from utils.database import FIELDNAMES
+from utils.database_pg import _to_float
+
+DEFAULT_BATCH_SIZE = 50000
+
+# CSV header -> LoanApplication column
+CSV_COLUMNS = {
+    'Application Number': 'application_number',
+    'Location': 'location',
+    'Usage Type': 'usage_type',
+    'Grid Hours': 'grid_hours',
+    'Monthly Fuel Cost': 'monthly_fuel_cost',
+    'Daily Energy': 'daily_energy',
+    'Maintenance Cost': 'maintenance_cost',
+    'Appliances & Equipment': 'appliances',
+    'Full Name': 'full_name',
+    'Email': 'email',
+    'Phone': 'phone',
+    'Created At': 'created_at',
+    'Updated At': 'updated_at',
+}
+COLUMNS = tuple(CSV_COLUMNS.values())
+NUMERIC_COLUMNS = ('grid_hours', 'monthly_fuel_cost', 'daily_energy', 'maintenance_cost')
+TEXT_COLUMNS = ('location', 'usage_type', 'full_name', 'email', 'phone')
+# Everything but created_at is overwritten when an application already exists
+UPDATE_COLUMNS = tuple(column for column in COLUMNS if column not in ('application_number', 'created_at'))
+
+
+class RejectedRow(ValueError):
+    pass
+
+
+def _column_lengths():
+    table = LoanApplication.__table__
+    return {name: table.c[name].type.length for name in ('application_number',) + TEXT_COLUMNS}
+
+
+def _timestamp(value):
+    # The CSV log writes '%Y-%m-%d %H:%M:%S'; fromisoformat also takes that form
+    value = value.strip()
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise RejectedRow(f"invalid timestamp {value!r}")
+
+
+def normalize_row(record, lengths, now):
+    """Turn one CSV record (keyed by column name) into LoanApplication values.
+
+    Raises RejectedRow if the record is unusable. Blank text becomes NULL and
+    numbers that do not parse become NULL, as in the schema upgrade.
+    appliances is kept as validated JSON text. Missing timestamps default to
+    the import time.
+    """
+    row = {}
+    for column, length in lengths.items():
+        value = record[column].strip()
+        if len(value) > length:
+            raise RejectedRow(f"{column} longer than {length} characters")
+        row[column] = value or None
+    if row['application_number'] is None:
+        raise RejectedRow("missing application number")
+    for column in NUMERIC_COLUMNS:
+        row[column] = _to_float(record[column])
+
+    appliances = record['appliances'].strip() or '[]'
+    try:
+        parsed = json.loads(appliances)
+    except ValueError:
+        raise RejectedRow("appliances is not valid JSON")
+    if not isinstance(parsed, list):
+        raise RejectedRow("appliances is not a JSON list")
+    row['appliances'] = appliances
+
+    row['created_at'] = _timestamp(record['created_at']) or now
+    row['updated_at'] = _timestamp(record['updated_at']) or row['created_at']
+    return row
+
+
+def read_rows(csv_file, rejects=None):
+    """Yield normalized rows from a CSV file in the LoanApplicationLogger layout.
+
+    Rejected records are counted in ``rejects`` ({'count': n, 'examples':
+    [...]}) and skipped.
+    """
+    reader = csv.reader(csv_file)
+    header = next(reader, [])
+    missing = [name for name in FIELDNAMES if name not in header]
+    if missing:
+        raise ValueError(f"CSV is missing columns: {', '.join(missing)}")
+    # Columns not in the layout are read but ignored
+    columns = [CSV_COLUMNS.get(name, name) for name in header]
+    lengths = _column_lengths()
+    now = datetime.utcnow()
+    for fields in reader:
+        if not fields:
+            continue
+        try:
+            if len(fields) != len(columns):
+                raise RejectedRow(f"expected {len(columns)} fields, found {len(fields)}")
+            yield normalize_row(dict(zip(columns, fields)), lengths, now)
+        except RejectedRow as e:
+            if rejects is not None:
+                rejects['count'] += 1
+                if len(rejects['examples']) < 10:
+                    rejects['examples'].append(f"line {reader.line_num}: {e}")
+
+
+def _batches(rows, batch_size):
+    """Group rows into batches holding one row per application (the last one read wins)"""
+    batch = {}
+    for row in rows:
+        batch[row['application_number']] = row
+        if len(batch) >= batch_size:
+            yield list(batch.values())
+            batch = {}
+    if batch:
+        yield list(batch.values())
+
+
+def _upsert(statement):
+    """ON CONFLICT clause keeping whichever of the stored and imported rows was updated last"""
+    table = LoanApplication.__table__
+    return statement.on_conflict_do_update(
+        index_elements=[table.c.application_number],
+        set_={column: statement.excluded[column] for column in UPDATE_COLUMNS},
+        where=or_(table.c.updated_at.is_(None), statement.excluded.updated_at >= table.c.updated_at)
+    )
+
+
+class _SqliteLoader:
+    """executemany of an INSERT ... ON CONFLICT DO UPDATE per batch"""
+
+    def __init__(self, connection):
+        from sqlalchemy.dialects.sqlite import insert
+        self.connection = connection
+        # SQLite stores JSON as text, so the validated text is bound as is
+        # rather than parsed and serialized again
+        values = {column: bindparam(column) for column in COLUMNS}
+        values['appliances'] = bindparam('appliances', type_=Text())
+        self.statement = _upsert(insert(LoanApplication).values(values))
+
+    def load(self, batch):
+        with self.connection.begin():
+            self.connection.execute(self.statement, batch)
+
+
+def _copy_text(value):
+    """A value as a field of COPY's text format"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, str):
+        return value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+    return str(value)
+
+
+class _PostgresLoader:
+    """COPY each batch into a temporary table, then upsert it in one INSERT ... SELECT"""
+
+    def __init__(self, connection):
+        from sqlalchemy.dialects.postgresql import insert
+        self.connection = connection
+        table = LoanApplication.__table__
+        self.stage = Table(
+            'lead_import_stage', MetaData(),
+            *(Column(column, table.c[column].type) for column in COLUMNS),
+            prefixes=['TEMPORARY'], postgresql_on_commit='DELETE ROWS'
+        )
+        with connection.begin():
+            self.stage.create(connection)
+        statement = insert(LoanApplication).from_select(COLUMNS, select(*self.stage.c))
+        self.statement = _upsert(statement)
+        self.copy_sql = f"COPY {self.stage.name} ({', '.join(COLUMNS)}) FROM STDIN"
+
+    def load(self, batch):
+        # COPY's text format: tab-separated, \N for NULL. Quoting the JSON
+        # column for the CSV format costs more than the rest of the row.
+        buffer = io.StringIO()
+        buffer.writelines('\t'.join([_copy_text(row[column]) for column in COLUMNS]) + '\n' for row in batch)
+        buffer.seek(0)
+        with self.connection.begin():
+            cursor = self.connection.connection.cursor()
+            try:
+                cursor.copy_expert(self.copy_sql, buffer)
+            finally:
+                cursor.close()
+            self.connection.execute(self.statement)
+
+
+def import_leads(csv_file, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """Bulk upsert historical leads from a CSV file, one transaction per batch.
+
+    Streams the file, so memory use depends on batch_size rather than the
+    file size. Rows whose application already exists replace it unless the
+    stored row was updated more recently, so an import can be re-run and
+    never overwrites newer data. ``progress(rows_loaded, elapsed_seconds)``
+    is called after every batch. Returns counts and throughput.
+    """
+    start = time.perf_counter()
+    rejects = {'count': 0, 'examples': []}
+    read = loaded = 0
+    with db.engine.connect() as connection:
+        dialect = connection.dialect.name
+        if dialect == 'postgresql':
+            loader = _PostgresLoader(connection)
+        elif dialect == 'sqlite':
+            loader = _SqliteLoader(connection)
+        else:
+            raise NotImplementedError(f"Bulk import is not supported on {dialect}")
+
+        def counted(rows):
+            nonlocal read
+            for row in rows:
+                read += 1
+                yield row
+
+        for batch in _batches(counted(read_rows(csv_file, rejects)), batch_size):
+            loader.load(batch)
+            loaded += len(batch)
+            if progress:
+                progress(loaded, time.perf_counter() - start)
+
+    elapsed = time.perf_counter() - start
+    logging.info(f"Imported {loaded} leads in {elapsed:.1f}s")
+    return {
+        'rows_read': read + rejects['count'],
+        'rows_loaded': loaded,
+        # Later records for the same application within a batch replace earlier ones
+        'rows_superseded': read - loaded,
+        'rows_rejected': rejects['count'],
+        'rejected_examples': rejects['examples'],
+        'seconds': elapsed,
+        'rows_per_second': (read + rejects['count']) / elapsed if elapsed else 0.0,
+    }
@@ -0,0 +1,257 @@
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import and_, case, delete, func, insert, or_, select
+
+from models import db, LeadRollup, LoanApplication, RollupWatermark
+from utils.metrics import timed
+
+# Upper bounds (kWh/day) of the daily energy buckets; the last bucket is open-ended
+ENERGY_BUCKETS_KWH = (2, 5, 10, 20, 50)
+UNKNOWN_ENERGY = -1
+
+WATERMARK = 'lead_rollup'
+
+# updated_at is stamped when a row is written (write-behind saves included),
+# but a transaction can commit after a refresh has already read past its
+# updated_at, and hosts' clocks differ: rows updated up to this long before
+# the watermark are processed again
+WATERMARK_OVERLAP = timedelta(seconds=float(os.environ.get('ROLLUP_WATERMARK_OVERLAP', 300)))
+
+# Age in seconds at which opening the dashboard starts a background refresh;
+# 0 leaves refreshing to `flask refresh-rollups`, run on a schedule
+ROLLUP_MAX_AGE = float(os.environ.get('ROLLUP_MAX_AGE', 60))
+
+DEFAULT_TREND_DAYS = 30
+MAX_TREND_DAYS = 366
+
+_refresh_lock = threading.Lock()
+_refresh_thread = None
+
+ROLLUP_COLUMNS = ('day', 'location', 'usage_type', 'energy_bucket', 'leads', 'calculated', 'submitted', 'energy_kwh')
+
+
+def energy_bucket_labels():
+    """Display label of each energy bucket, by bucket index"""
+    bounds = (0,) + ENERGY_BUCKETS_KWH
+    labels = [f"{low}-{high}" for low, high in zip(bounds, bounds[1:])]
+    return labels + [f"{ENERGY_BUCKETS_KWH[-1]}+"]
+
+
+def _as_date(value):
+    # SQLite's date() returns text
+    return value if isinstance(value, date) else date.fromisoformat(value)
+
+
+def _day_start(day):
+    return datetime.combine(day, datetime.min.time())
+
+
+def _aggregate(session, *where):
+    """LeadRollup rows for the applications matching ``where``"""
+    table = LoanApplication.__table__
+    energy = table.c.daily_energy
+    calculated = table.c.location.isnot(None)  # the calculator always sets a location
+    contacted = or_(table.c.full_name.isnot(None), table.c.email.isnot(None), table.c.phone.isnot(None))
+    rows = select(
+        func.date(table.c.created_at).label('day'),
+        func.coalesce(table.c.location, '').label('location'),
+        func.coalesce(table.c.usage_type, '').label('usage_type'),
+        case(
+            (energy.is_(None), UNKNOWN_ENERGY),
+            *((energy < bound, bucket) for bucket, bound in enumerate(ENERGY_BUCKETS_KWH)),
+            else_=len(ENERGY_BUCKETS_KWH)
+        ).label('energy_bucket'),
+        case((calculated, 1), else_=0).label('calculated'),
+        case((and_(calculated, contacted), 1), else_=0).label('submitted'),
+        func.coalesce(energy, 0.0).label('energy_kwh'),
+    ).where(table.c.created_at.isnot(None), *where).subquery()
+    # Grouped in an outer query, so GROUP BY names plain columns on every dialect
+    dimensions = (rows.c.day, rows.c.location, rows.c.usage_type, rows.c.energy_bucket)
+    statement = select(
+        *dimensions,
+        func.count(),
+        func.sum(rows.c.calculated),
+        func.sum(rows.c.submitted),
+        func.sum(rows.c.energy_kwh),
+    ).group_by(*dimensions)
+    return [
+        dict(zip(ROLLUP_COLUMNS, (_as_date(day), *values)))
+        for day, *values in session.execute(statement)
+    ]
+
+
+@timed('rollup_refresh')
+def refresh_lead_rollups(full=False):
+    """Bring LeadRollup up to date with the applications saved since the last refresh.
+
+    Only applications whose updated_at is past the watermark (less
+    WATERMARK_OVERLAP) are looked at: every day they were created on is
+    recounted from that day's applications and replaced, so the work grows
+    with the days touched and their leads, not with the table. Recounting
+    whole days keeps the rollups exact when a saved application changes
+    location, usage type or energy. ``full`` (or a first refresh) rebuilds
+    every day, which picks up rows stored with an older updated_at, as bulk
+    imports do. Days are UTC, like the timestamps. Returns counts, or raises
+    after rolling back, e.g. when another process refreshed concurrently.
+    """
+    start = time.perf_counter()
+    table = LoanApplication.__table__
+    try:
+        watermark = db.session.get(RollupWatermark, WATERMARK)
+        if full or watermark is None or watermark.updated_at is None:
+            since = None
+            rows = _aggregate(db.session)
+            high = db.session.scalar(select(func.max(table.c.updated_at)))
+            db.session.execute(delete(LeadRollup))
+            days = {row['day'] for row in rows}
+        else:
+            since = watermark.updated_at - WATERMARK_OVERLAP
+            changed = table.c.updated_at > since
+            days = {
+                _as_date(day) for day in db.session.scalars(
+                    select(func.date(table.c.created_at)).where(changed, table.c.created_at.isnot(None)).distinct())
+            }
+            high = db.session.scalar(select(func.max(table.c.updated_at)).where(changed))
+            rows = []
+            for day in sorted(days):
+                # A range on created_at, so each day is read through its index
+                rows += _aggregate(
+                    db.session, table.c.created_at >= _day_start(day),
+                    table.c.created_at < _day_start(day + timedelta(days=1)))
+            if days:
+                db.session.execute(delete(LeadRollup).where(LeadRollup.day.in_(days)))
+        if rows:
+            db.session.execute(insert(LeadRollup), rows)
+
+        if watermark is None:
+            watermark = RollupWatermark(name=WATERMARK)
+            db.session.add(watermark)
+        if high is not None and (watermark.updated_at is None or high > watermark.updated_at):
+            watermark.updated_at = high
+        watermark.refreshed_at = datetime.utcnow()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    elapsed = time.perf_counter() - start
+    logging.info(f"Refreshed lead rollups for {len(days)} days ({len(rows)} rows) in {elapsed:.3f}s")
+    return {'full': since is None, 'days': len(days), 'rows': len(rows), 'seconds': elapsed}
+
+
+def _refresh_in_app(app):
+    with app.app_context():
+        try:
+            refresh_lead_rollups()
+        except Exception as e:
+            logging.error(f"Error refreshing lead rollups: {str(e)}")
+
+
+def refresh_in_background(app, max_age=ROLLUP_MAX_AGE):
+    """Start refreshing the rollups on a thread if the last refresh is more than ``max_age`` seconds old.
+
+    Never with 0, and never while this process is already refreshing. The
+    request that calls this does not wait: it shows the rollups as they are,
+    so even a first, full refresh never holds up a page. Returns the thread,
+    or None if no refresh was started.
+    """
+    global _refresh_thread
+    if not max_age:
+        return None
+    with _refresh_lock:
+        if _refresh_thread is not None and _refresh_thread.is_alive():
+            return None
+        try:
+            refreshed_at = rollups_refreshed_at()
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error reading the lead rollup watermark: {str(e)}")
+            return None
+        if refreshed_at is not None and datetime.utcnow() - refreshed_at < timedelta(seconds=max_age):
+            return None
+        _refresh_thread = threading.Thread(target=_refresh_in_app, args=(app,), name='rollup-refresh', daemon=True)
+        _refresh_thread.start()
+        return _refresh_thread
+
+
+def rollups_refreshed_at():
+    """When the rollups were last refreshed, or None if they never were"""
+    watermark = db.session.get(RollupWatermark, WATERMARK)
+    return watermark.refreshed_at if watermark else None
+
+
+def _conversion(calculated, submitted):
+    return round(100.0 * submitted / calculated, 1) if calculated else 0.0
+
+
+def _breakdown(column, since):
+    """Leads, conversion and average energy per value of a LeadRollup column"""
+    known_energy = func.sum(case((LeadRollup.energy_bucket != UNKNOWN_ENERGY, LeadRollup.leads), else_=0))
+    leads = func.sum(LeadRollup.leads)
+    statement = select(
+        column, leads, func.sum(LeadRollup.calculated), func.sum(LeadRollup.submitted),
+        func.sum(LeadRollup.energy_kwh), known_energy
+    ).where(LeadRollup.day >= since).group_by(column).order_by(leads.desc())
+    return [
+        {
+            'name': name or 'Unknown',
+            'leads': int(total),
+            'calculated': int(calculated),
+            'submitted': int(submitted),
+            'conversion': _conversion(calculated, submitted),
+            'avg_energy': round(energy / known, 2) if known else None,
+        }
+        for name, total, calculated, submitted, energy, known in db.session.execute(statement)
+    ]
+
+
+def lead_trends(days=DEFAULT_TREND_DAYS, today=None):
+    """Dashboard trends for the last ``days`` days (UTC), read from the rollups alone.
+
+    Returns leads per day (every day in the range, including days without
+    any), per location and per usage type, each with calculator-to-lead
+    conversion, and the calculated leads per daily energy bucket.
+    """
+    today = today or datetime.utcnow().date()
+    since = today - timedelta(days=days - 1)
+
+    per_day = {
+        _as_date(day): (int(leads), int(calculated), int(submitted))
+        for day, leads, calculated, submitted in db.session.execute(
+            select(LeadRollup.day, func.sum(LeadRollup.leads), func.sum(LeadRollup.calculated),
+                   func.sum(LeadRollup.submitted))
+            .where(LeadRollup.day >= since).group_by(LeadRollup.day))
+    }
+    daily = []
+    for offset in range(days):
+        day = since + timedelta(days=offset)
+        leads, calculated, submitted = per_day.get(day, (0, 0, 0))
+        daily.append({'day': day, 'leads': leads, 'calculated': calculated, 'submitted': submitted,
+                      'conversion': _conversion(calculated, submitted)})
+
+    buckets = dict(db.session.execute(
+        select(LeadRollup.energy_bucket, func.sum(LeadRollup.calculated))
+        .where(LeadRollup.day >= since, LeadRollup.energy_bucket != UNKNOWN_ENERGY)
+        .group_by(LeadRollup.energy_bucket)).all())
+    energy = [{'label': label, 'leads': int(buckets.get(bucket, 0))}
+              for bucket, label in enumerate(energy_bucket_labels())]
+
+    calculated = sum(row['calculated'] for row in daily)
+    submitted = sum(row['submitted'] for row in daily)
+    return {
+        'days': days,
+        'since': since,
+        'leads': sum(row['leads'] for row in daily),
+        'calculated': calculated,
+        'submitted': submitted,
+        'conversion': _conversion(calculated, submitted),
+        'daily': daily,
+        'locations': _breakdown(LeadRollup.location, since),
+        'usage_types': _breakdown(LeadRollup.usage_type, since),
+        'energy': energy,
+        'refreshed_at': rollups_refreshed_at(),
+    }
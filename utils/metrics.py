@@ -0,0 +1,396 @@
+import atexit
+import fcntl
+import json
+import logging
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import g, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Set METRICS_ENABLED=0 to leave the timing wrappers out entirely
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1').lower() not in ('0', 'false', 'no')
+
+# With several worker processes (gunicorn), point METRICS_MULTIPROC_DIR at an
+# empty directory shared by all of them and wipe it when the server starts.
+# Every process writes its totals there and /metrics adds them all up. When a
+# worker exits its counters and histograms are folded into an archive file and
+# its gauges dropped (see mark_process_dead).
+MULTIPROC_DIR = os.environ.get('METRICS_MULTIPROC_DIR')
+FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 1))
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROUND_TRIP_BUCKETS = (0, 1, 2, 3, 4, 5, 10, 20, 50)
+
+# One lock for all metrics: an observation holds it for a few hundred
+# nanoseconds, far less than the work being measured
+_lock = threading.Lock()
+_changes = 0
+_histograms = {}
+_collectors = {}
+
+
+class Histogram:
+    """A Prometheus histogram with a fixed label set.
+
+    Each label combination keeps one count per bucket (not cumulative, so an
+    observation touches a single slot) plus a final overflow slot and the sum.
+    """
+
+    def __init__(self, name, documentation, labelnames, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.series = {}
+        _histograms[name] = self
+
+    def observe(self, labels, value):
+        """Record value for a tuple of label values"""
+        global _changes
+        with _lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+            _changes += 1
+
+
+REQUEST_SECONDS = Histogram(
+    'solar_request_duration_seconds', 'Time spent handling a request, by route',
+    ('endpoint', 'method', 'status'))
+STAGE_SECONDS = Histogram(
+    'solar_stage_duration_seconds', 'Time spent in each stage of request handling',
+    ('stage',))
+DB_ROUND_TRIPS = Histogram(
+    'solar_db_round_trips', 'Database statements and commits per request, by route',
+    ('endpoint',), ROUND_TRIP_BUCKETS)
+
+CACHE_COUNTERS = (
+    ('hits', 'solar_cache_hits_total', 'Cache lookups that found a fresh entry'),
+    ('misses', 'solar_cache_misses_total', 'Cache lookups that found nothing usable'),
+    ('evictions', 'solar_cache_evictions_total', 'Entries dropped to make room'),
+)
+
+
+def timed(stage):
+    """Decorator recording the wrapped function's run time as a stage"""
+    def decorator(func):
+        if not METRICS_ENABLED:
+            return func
+        labels = (stage,)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                STAGE_SECONDS.observe(labels, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def register_collector(name, kind, documentation, labelnames, collect_values):
+    """Export values read at collection time, such as counters kept by another module.
+
+    ``kind`` is "counter" or "gauge" and ``collect_values`` returns
+    {label values tuple: number}. Across worker processes the values are
+    summed, so gauges should be totals (queue depth), not ratios; an exited
+    process's counters stay in the totals and its gauges leave them.
+    """
+    collector = _collectors.get(name)
+    if collector is None:
+        collector = _collectors[name] = (kind, documentation, tuple(labelnames), [])
+    collector[3].append(collect_values)
+
+
+def register_cache(name, cache):
+    """Export an LRUCache's hit, miss and eviction counters under a cache label"""
+    for key, metric, documentation in CACHE_COUNTERS:
+        register_collector(metric, 'counter', documentation, ('cache',),
+                           lambda key=key: {(name,): cache.stats()[key]})
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, timing jsonify responses as the json_encode stage.
+
+    Only response() is timed: dumps() also serializes the session cookie.
+    """
+
+    @timed('json_encode')
+    def response(self, *args, **kwargs):
+        return super().response(*args, **kwargs)
+
+
+def _count_round_trip(*args):
+    if has_request_context():
+        g.metrics_db_round_trips = g.get('metrics_db_round_trips', 0) + 1
+
+
+def _start_request():
+    g.metrics_start = time.perf_counter()
+    g.metrics_db_round_trips = 0
+
+
+def _finish_request(response):
+    start = g.get('metrics_start')
+    if start is not None:
+        endpoint = request.endpoint or 'unmatched'
+        REQUEST_SECONDS.observe(
+            (endpoint, request.method, str(response.status_code)), time.perf_counter() - start)
+        DB_ROUND_TRIPS.observe((endpoint,), g.get('metrics_db_round_trips', 0))
+        if MULTIPROC_DIR:
+            _start_flusher()
+    return response
+
+
+def init_app(app):
+    """Time every request and count its database round trips.
+
+    Request time runs until the response object is ready, so a streamed
+    body (the CSV download) is not included.
+    """
+    if not METRICS_ENABLED:
+        return
+    app.json = TimedJSONProvider(app)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    # Every statement and commit is one round trip to the database server.
+    # The listeners are global, so a second app must not add them again.
+    if not event.contains(Engine, 'commit', _count_round_trip):
+        event.listen(Engine, 'before_cursor_execute', _count_round_trip)
+        event.listen(Engine, 'commit', _count_round_trip)
+
+
+def snapshot():
+    """This process's metrics as {(name, label values): values}"""
+    with _lock:
+        data = {(name, labels): list(series)
+                for name, histogram in _histograms.items()
+                for labels, series in histogram.series.items()}
+    for name, (_, _, _, sources) in _collectors.items():
+        for collect_values in sources:
+            for labels, value in collect_values().items():
+                data[(name, labels)] = [value]
+    return data
+
+
+def _process_path(pid):
+    return os.path.join(MULTIPROC_DIR, f'metrics-{pid}.json')
+
+
+def _archive_path():
+    return os.path.join(MULTIPROC_DIR, 'metrics-archive.json')
+
+
+def _read_rows(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _write_rows(path, rows):
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as f:
+        json.dump(rows, f)
+    os.replace(temporary, path)
+
+
+@contextmanager
+def _archive_lock():
+    """Hold a file lock shared by every process folding files into the archive"""
+    with open(os.path.join(MULTIPROC_DIR, 'metrics.lock'), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _merge(totals, rows):
+    for name, labels, values in rows:
+        key = (name, tuple(labels))
+        current = totals.get(key)
+        totals[key] = values if current is None else [a + b for a, b in zip(current, values)]
+
+
+def _archive(pid):
+    path = _process_path(pid)
+    try:
+        rows = _read_rows(path)
+    except FileNotFoundError:
+        return
+    except (OSError, ValueError) as e:
+        logging.error(f"Error reading metrics file {path}: {str(e)}")
+        rows = []
+    archive = {}
+    if os.path.exists(_archive_path()):
+        _merge(archive, _read_rows(_archive_path()))
+    _merge(archive, [row for row in rows if _collectors.get(row[0], ('counter',))[0] != 'gauge'])
+    _write_rows(_archive_path(), [[name, list(labels), values] for (name, labels), values in archive.items()])
+    os.remove(path)
+
+
+def mark_process_dead(pid):
+    """Fold an exited process's counters and histograms into the archive.
+
+    Its gauges (queue depth, open connections) are dropped, since they
+    describe a process that no longer exists. Safe to call more than once,
+    e.g. from gunicorn's child_exit hook as well as the worker's own atexit.
+    """
+    with _archive_lock():
+        _archive(pid)
+
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+# Serializes flushes with the final one at exit, after which the file is archived
+_flush_lock = threading.Lock()
+_flushed_pid = None
+_exited = False
+
+
+def flush():
+    """Write this process's totals to the multi-process directory"""
+    global _flushed_pid
+    with _flush_lock:
+        if _exited:
+            return
+        if _flushed_pid != os.getpid():
+            # A file already under this pid was left by an earlier process
+            # that reused it; archive it rather than overwrite its counts
+            mark_process_dead(os.getpid())
+            _flushed_pid = os.getpid()
+        rows = [[name, list(labels), values] for (name, labels), values in snapshot().items()]
+        _write_rows(_process_path(os.getpid()), rows)
+
+
+def _exit():
+    """Write the final totals and archive them as this process exits"""
+    global _exited
+    try:
+        flush()
+        with _flush_lock:
+            _exited = True
+            mark_process_dead(os.getpid())
+    except OSError as e:
+        logging.error(f"Error archiving metrics: {str(e)}")
+
+
+_flusher_pid = None
+
+
+def _flush_loop():
+    flushed = None
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        if _changes != flushed:
+            flushed = _changes
+            try:
+                flush()
+            except OSError as e:
+                logging.error(f"Error writing metrics: {str(e)}")
+
+
+def _start_flusher():
+    """Start the background writer once per process (workers fork after import)"""
+    global _flusher_pid
+    if _flusher_pid == os.getpid():
+        return
+    _flusher_pid = os.getpid()
+    threading.Thread(target=_flush_loop, name='metrics-flush', daemon=True).start()
+    atexit.register(_exit)
+
+
+def collect():
+    """Totals across all worker processes, or for this process alone"""
+    if not MULTIPROC_DIR:
+        return snapshot()
+    flush()
+    totals = {}
+    # Under the archive lock no file moves into the archive while they are
+    # read, so a worker's counts are neither missed nor added twice
+    with _archive_lock():
+        for filename in os.listdir(MULTIPROC_DIR):
+            pid = filename[len('metrics-'):-len('.json')]
+            if not (filename.startswith('metrics-') and filename.endswith('.json') and pid.isdigit()):
+                continue
+            try:
+                if not _is_alive(int(pid)):
+                    # Killed, or exited before its atexit ran
+                    _archive(int(pid))
+                    continue
+                _merge(totals, _read_rows(os.path.join(MULTIPROC_DIR, filename)))
+            except (OSError, ValueError) as e:
+                logging.error(f"Error reading metrics file {filename}: {str(e)}")
+        try:
+            _merge(totals, _read_rows(_archive_path()))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logging.error(f"Error reading metrics archive: {str(e)}")
+    return totals
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(value) if math.isfinite(value) else ('+Inf' if value > 0 else '-Inf')
+    return str(value)
+
+
+def render(totals=None):
+    """Metrics in the Prometheus text exposition format"""
+    if totals is None:
+        totals = collect()
+    by_name = {}
+    for (name, labels), values in sorted(totals.items()):
+        by_name.setdefault(name, []).append((labels, values))
+
+    lines = []
+    for name, histogram in _histograms.items():
+        lines.append(f'# HELP {name} {histogram.documentation}')
+        lines.append(f'# TYPE {name} histogram')
+        bounds = [_number(bound) for bound in histogram.buckets] + ['+Inf']
+        for labels, values in by_name.get(name, []):
+            cumulative = 0
+            for bound, count in zip(bounds, values[:-1]):
+                cumulative += count
+                le = _labels(histogram.labelnames, labels, f'le="{bound}"')
+                lines.append(f'{name}_bucket{le} {cumulative}')
+            lines.append(f'{name}_sum{_labels(histogram.labelnames, labels)} {_number(values[-1])}')
+            lines.append(f'{name}_count{_labels(histogram.labelnames, labels)} {cumulative}')
+    for name, (kind, documentation, labelnames, _) in _collectors.items():
+        lines.append(f'# HELP {name} {documentation}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, values in by_name.get(name, []):
+            lines.append(f'{name}{_labels(labelnames, labels)} {_number(values[0])}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,81 @@
+import logging
+from sqlalchemy import inspect, text
+from models import db, LoanApplication
+
+NUMERIC_COLUMNS = ('grid_hours', 'monthly_fuel_cost', 'daily_energy', 'maintenance_cost')
+
+def _numeric_or_null_sql(column, dialect):
+    """SQL expression converting a legacy text column to a float, NULL when not numeric"""
+    if dialect == 'postgresql':
+        return (f"CASE WHEN trim({column}) ~ '^([0-9]+\\.?[0-9]*|\\.[0-9]+)$' "
+                f"THEN trim({column})::double precision END")
+    return (f"CASE WHEN typeof({column}) IN ('integer', 'real') THEN {column} "
+            f"WHEN trim({column}) NOT GLOB '*[^0-9.]*' AND trim({column}) GLOB '*[0-9]*' "
+            f"AND trim({column}) NOT GLOB '*.*.*' THEN CAST(trim({column}) AS REAL) END")
+
+def _needs_column_upgrade(connection):
+    table = LoanApplication.__tablename__
+    inspector = inspect(connection)
+    if not inspector.has_table(table):
+        return False
+    columns = {column['name']: column['type'] for column in inspector.get_columns(table)}
+    return any(
+        getattr(columns[name], 'python_type', None) is str
+        for name in NUMERIC_COLUMNS if name in columns
+    )
+
+def _upgrade_postgresql(connection):
+    table = LoanApplication.__tablename__
+    alterations = [
+        f"ALTER COLUMN {column} TYPE double precision USING {_numeric_or_null_sql(column, 'postgresql')}"
+        for column in NUMERIC_COLUMNS
+    ]
+    alterations.append(
+        "ALTER COLUMN appliances TYPE jsonb USING "
+        "(CASE WHEN appliances IS NULL OR trim(appliances) = '' THEN '[]' ELSE appliances END)::jsonb"
+    )
+    connection.execute(text(f"ALTER TABLE {table} " + ", ".join(alterations)))
+
+def _upgrade_sqlite(connection):
+    # SQLite cannot change column types in place, so rebuild the table
+    table = LoanApplication.__tablename__
+    legacy = f"{table}_legacy"
+    for index in LoanApplication.__table__.indexes:
+        index.drop(connection, checkfirst=True)  # names are reused by the new table
+    connection.execute(text(f"ALTER TABLE {table} RENAME TO {legacy}"))
+    LoanApplication.__table__.create(connection)
+    columns = [column.name for column in LoanApplication.__table__.columns]
+    selects = [
+        _numeric_or_null_sql(name, 'sqlite') if name in NUMERIC_COLUMNS
+        else "COALESCE(NULLIF(trim(appliances), ''), '[]')" if name == 'appliances'
+        else name
+        for name in columns
+    ]
+    connection.execute(text(
+        f"INSERT INTO {table} ({', '.join(columns)}) SELECT {', '.join(selects)} FROM {legacy}"
+    ))
+    connection.execute(text(f"DROP TABLE {legacy}"))
+
+def upgrade_database():
+    """Bring an existing database up to the current schema.
+
+    Converts the legacy text columns (grid hours, fuel, energy and maintenance
+    costs) to floats, turning unparseable values into NULL, converts
+    appliances to JSONB on Postgres, and creates any missing tables and
+    indexes. Safe to run more than once.
+    """
+    with db.engine.begin() as connection:
+        if _needs_column_upgrade(connection):
+            dialect = connection.dialect.name
+            if dialect == 'postgresql':
+                _upgrade_postgresql(connection)
+            elif dialect == 'sqlite':
+                _upgrade_sqlite(connection)
+            else:
+                raise RuntimeError(f"No column migration for the {dialect} dialect")
+            logging.info("Converted loan application columns to numeric/JSON types")
+
+        for table in db.metadata.sorted_tables:
+            table.create(connection, checkfirst=True)
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
@@ -0,0 +1,109 @@
+import os
+
+import numpy as np
+
+from utils.energy_simulation import FUEL_PRICE_PER_LITRE, GENERATOR_LITRES_PER_KWH
+
+DEFAULT_SAMPLES = 10000
+MAX_SAMPLES = int(os.environ.get('MONTE_CARLO_MAX_SAMPLES', 100000))
+DEFAULT_SEED = int(os.environ.get('MONTE_CARLO_SEED', 0))
+
+# Sizing buffer applied by get_system_size: panels produce 1.2x the daily
+# energy at nominal sun hours, the extra covering system losses
+SYSTEM_LOSS_FACTOR = 1.2
+
+# What each sampled input means:
+#   fuel_price          naira per litre
+#   generator_litres    litres of fuel per kWh the generator would have made
+#   sun_hours_factor    multiplier on the location's average sun hours
+#   grid_hours_offset   hours/day added to the stated grid availability
+#   degradation         fractional loss of panel output per year
+DEFAULT_DISTRIBUTIONS = {
+    "fuel_price": {"distribution": "triangular", "low": 550, "mode": FUEL_PRICE_PER_LITRE, "high": 900},
+    "generator_litres": {"distribution": "fixed", "value": GENERATOR_LITRES_PER_KWH},
+    "sun_hours_factor": {"distribution": "normal", "mean": 1.0, "std": 0.1},
+    "grid_hours_offset": {"distribution": "normal", "mean": 0.0, "std": 2.0},
+    "degradation": {"distribution": "uniform", "low": 0.003, "high": 0.008},
+}
+
+PERCENTILES = (10, 50, 90)
+
+
+def _sample(rng, spec, size):
+    """Draw size samples from a distribution spec such as {"distribution": "normal", ...}"""
+    kind = spec.get("distribution")
+    if kind == "fixed":
+        return np.full(size, float(spec["value"]))
+    if kind == "normal":
+        return rng.normal(spec["mean"], spec["std"], size)
+    if kind == "lognormal":
+        # median and sigma of the underlying normal, so "median" reads in the input's units
+        return spec["median"] * rng.lognormal(0.0, spec["sigma"], size)
+    if kind == "uniform":
+        return rng.uniform(spec["low"], spec["high"], size)
+    if kind == "triangular":
+        return rng.triangular(spec["low"], spec["mode"], spec["high"], size)
+    raise ValueError(f"Unknown distribution: {kind}")
+
+
+def _percentiles(values):
+    # "nearest" always returns an actual sample, so infinite paybacks never
+    # interpolate into NaN
+    points = np.percentile(values, PERCENTILES, method="nearest")
+    return {f"p{p}": (value.item() if np.isfinite(value) else None) for p, value in zip(PERCENTILES, points)}
+
+
+def simulate_payback(total_cost, daily_energy_kwh, system_size_kw, sun_hours, grid_hours,
+                     samples=DEFAULT_SAMPLES, distributions=None, seed=None, rng=None):
+    """Monte Carlo payback period and savings under uncertain inputs.
+
+    Savings are the generator fuel no longer bought: the energy the panels
+    deliver each day (capped at ``daily_energy_kwh``), scaled by how much
+    more or less outage time the sampled grid hours leave than the stated
+    ones, times the fuel burn and price. Panel output declines by the sampled
+    degradation each year, and payback is the point where cumulative savings
+    cover ``total_cost``. At the nominal inputs this reproduces the
+    calculator's deterministic payback.
+
+    ``distributions`` overrides entries of DEFAULT_DISTRIBUTIONS. All samples
+    are drawn in one batch from ``rng``, or from a generator seeded with
+    ``seed`` so that identical requests give identical percentiles.
+    """
+    samples = int(min(max(samples, 1), MAX_SAMPLES))
+    unknown = set(distributions or {}) - set(DEFAULT_DISTRIBUTIONS)
+    if unknown:
+        raise ValueError(f"Unknown uncertain inputs: {', '.join(sorted(unknown))}")
+    specs = dict(DEFAULT_DISTRIBUTIONS)
+    specs.update(distributions or {})
+    if rng is None:
+        rng = np.random.default_rng(DEFAULT_SEED if seed is None else seed)
+    drawn = {name: _sample(rng, spec, samples) for name, spec in specs.items()}
+
+    sun = sun_hours * np.maximum(drawn["sun_hours_factor"], 0.0)
+    delivered_kwh = np.minimum(daily_energy_kwh, system_size_kw * sun / SYSTEM_LOSS_FACTOR)
+
+    stated_outage = 24 - min(max(grid_hours, 0.0), 24.0)
+    sampled_outage = 24 - np.clip(grid_hours + drawn["grid_hours_offset"], 0.0, 24.0)
+    outage_ratio = sampled_outage / stated_outage if stated_outage > 0 else np.ones(samples)
+
+    fuel_cost_per_kwh = np.maximum(drawn["generator_litres"], 0.0) * np.maximum(drawn["fuel_price"], 0.0)
+    monthly_savings = delivered_kwh * outage_ratio * 30 * fuel_cost_per_kwh
+    annual_savings = monthly_savings * 12
+
+    # Cumulative savings after n years with output falling by d a year are
+    # S * (1 - (1 - d)^n) / d; solve for n, which has no solution when
+    # degradation erodes savings faster than they repay the cost
+    degradation = np.clip(drawn["degradation"], 0.0, 0.99)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        undegraded = total_cost / annual_savings
+        remaining = 1 - undegraded * degradation
+        degraded = np.log(remaining) / np.log1p(-degradation)
+        payback_years = np.where(degradation > 0, np.where(remaining > 0, degraded, np.inf), undegraded)
+    payback_years = np.where(annual_savings > 0, payback_years, np.inf)
+
+    return {
+        "samples": samples,
+        "payback_years": _percentiles(payback_years),
+        "monthly_savings": _percentiles(monthly_savings),
+        "no_payback_probability": float(np.mean(~np.isfinite(payback_years))),
+    }
@@ -0,0 +1,75 @@
+from dataclasses import asdict
+
+
+def format_naira(amount):
+    """Format a naira amount the way the calculator displays it"""
+    return f"₦{amount:,.2f}"
+
+
+def format_years(years):
+    """Format a payback period in years"""
+    return f"{years:.1f} years"
+
+
+def format_backup_only_cost(backup_only):
+    """Format a BackupOnlyCost into the legacy backup_only_costs dict"""
+    if backup_only is None:
+        return None
+    return {
+        "components": {
+            "batteries": format_naira(backup_only.batteries_cost),
+            "inverter": format_naira(backup_only.inverter_cost),
+        },
+        "bos": format_naira(backup_only.bos_cost),
+        "installation": format_naira(backup_only.installation_cost),
+        "total": format_naira(backup_only.total_cost),
+        "monthly_savings": format_naira(backup_only.monthly_savings),
+        "payback_period": format_years(backup_only.payback_years)
+    }
+
+
+def format_system_cost(result):
+    """Render a SystemCost into the display dict returned by calculate_system_cost"""
+    return {
+        "system_type": {
+            "type": result.system_type,
+            "rationale": result.system_type_rationale,
+            "configuration": result.system_type_configuration
+        },
+        "solar_system": {
+            "total_capacity": f"{result.system_size_kw} kW",
+            "num_panels": f"{result.panel_count}",
+            "panel_type": result.panel_type,
+            "charge_controller": result.charge_controller_size,
+            "inverter_size": result.inverter_size
+        },
+        "battery_system": {
+            "total_capacity": f"{result.battery_size_kwh} kWh",
+            "battery_type": result.battery_type,
+            "configuration": f"{result.battery_count} batteries in parallel"
+        },
+        "financial": {
+            "cost_breakdown": {
+                "solar_panels": format_naira(result.solar_panels_cost),
+                "batteries": format_naira(result.batteries_cost),
+                "inverter": format_naira(result.inverter_cost),
+                "charge_controller": format_naira(result.charge_controller_cost),
+                "bos": format_naira(result.bos_cost),
+                "installation": format_naira(result.installation_cost),
+                "total": format_naira(result.total_cost)
+            },
+            "backup_only_costs": format_backup_only_cost(result.backup_only),  # None for non-hybrid systems
+            "monthly_savings": format_naira(result.monthly_savings),
+            "payback_period": format_years(result.payback_years)
+        },
+        "installation": {
+            "mounting": result.mounting,
+            "estimated_area": f"{result.estimated_area_m2} square meters",
+            "additional_notes": result.additional_notes
+        }
+    }
+
+
+def system_cost_to_json(result):
+    """Convert a SystemCost into a JSON-serialisable dict of raw numbers"""
+    return asdict(result)
@@ -0,0 +1,218 @@
+import hashlib
+import itertools
+import json
+import logging
+import os
+import sys
+import time
+from bisect import bisect_left
+from dataclasses import dataclass
+from types import MappingProxyType
+
+import numpy as np
+
+CATALOG_PATH = os.environ.get(
+    "PRICING_CATALOG_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "pricing_catalog.json")
+)
+
+# How often (seconds) each process checks the catalog file for changes
+CATALOG_CHECK_INTERVAL = float(os.environ.get("PRICING_CATALOG_CHECK_INTERVAL", 5))
+
+DEFAULT_LOCATION = "default"
+
+_generations = itertools.count(1)
+
+
+@dataclass(frozen=True, slots=True)
+class PricingCatalog:
+    """An immutable, compiled snapshot of the pricing catalog.
+
+    Locations are interned and numbered, with the default location last, so
+    per-location values are plain arrays indexed by location id. Inverter and
+    charge controller tiers are sorted by rating; a value falls in the first
+    tier whose rating is >= it, and anything above the largest rating falls in
+    the largest tier. ``generation`` increases with every catalog loaded by
+    this process, so caches can tell snapshots apart even when the file's
+    version label was not bumped. ``digest`` fingerprints the catalog's
+    content, so it is the same in every process that loaded the same data.
+
+    NumPy arrays serve the vectorized calculators; the tuples hold the same
+    values as Python numbers for the per-request scalar path, where indexing
+    NumPy arrays would cost more than the lookup itself.
+    """
+    version: str
+    generation: int
+    digest: str
+    location_names: tuple
+    location_ids: MappingProxyType
+    location_rows: tuple  # (sun_hours, cost_per_watt, installation_factor) per location id
+    sun_hours: np.ndarray
+    cost_per_watt: np.ndarray
+    installation_factor: np.ndarray
+    batteries: MappingProxyType
+    battery_types: tuple
+    inverter_sizes: tuple
+    inverter_breakpoints: tuple
+    inverter_prices: tuple
+    inverter_ratings_kw: np.ndarray
+    inverter_costs: np.ndarray
+    charge_controller_sizes: tuple
+    charge_controller_breakpoints: tuple
+    charge_controller_prices: tuple
+    charge_controller_ratings_amps: np.ndarray
+    charge_controller_costs: np.ndarray
+
+    def location_id(self, name):
+        """Id of a location, or of the default location if it is not listed"""
+        return self.location_ids.get(name, len(self.location_names) - 1)
+
+    def location_sun_hours(self):
+        """Listed locations (without the default) mapped to their average sun hours"""
+        return {name: row[0] for name, row in zip(self.location_names[:-1], self.location_rows)}
+
+    def battery(self, battery_type):
+        """Properties of a battery chemistry; raises KeyError for unknown types"""
+        return self.batteries[battery_type]
+
+    def inverter_tier(self, system_size_kw):
+        return bisect_left(self.inverter_breakpoints, system_size_kw)
+
+    def charge_controller_tier(self, system_amps):
+        return bisect_left(self.charge_controller_breakpoints, system_amps)
+
+    def inverter_rating_kw(self, inverter_size):
+        return self.inverter_ratings_kw[self.inverter_sizes.index(inverter_size)].item()
+
+
+def _read_only(array):
+    array.setflags(write=False)
+    return array
+
+
+def _tiers(entries, rating_key, kind):
+    """Sort tier entries by rating into (sizes, ratings, costs)"""
+    if not entries:
+        raise ValueError(f"Pricing catalog has no {kind}")
+    entries = sorted(entries, key=lambda entry: float(entry[rating_key]))
+    sizes = tuple(sys.intern(str(entry["size"])) for entry in entries)
+    if len(set(sizes)) != len(sizes):
+        raise ValueError(f"Pricing catalog has duplicate {kind} sizes")
+    ratings = tuple(float(entry[rating_key]) for entry in entries)
+    costs = tuple(entry["cost"] for entry in entries)
+    return sizes, ratings, costs
+
+
+def _array(values):
+    return _read_only(np.array(values, dtype=float))
+
+
+def catalog_digest(data):
+    """Short hash of raw catalog data, independent of key order and formatting"""
+    return hashlib.blake2b(json.dumps(data, sort_keys=True).encode(), digest_size=8).hexdigest()
+
+
+def compile_catalog(data):
+    """Validate raw catalog data and compile it into a PricingCatalog"""
+    try:
+        locations = dict(data["locations"])
+        default = locations.pop(DEFAULT_LOCATION)
+        names = tuple(sys.intern(name) for name in locations) + (DEFAULT_LOCATION,)
+        rows = tuple(
+            (float(row["sun_hours"]), row["cost_per_watt"], row["installation_factor"])
+            for row in list(locations.values()) + [default]
+        )
+
+        batteries = {
+            sys.intern(name): MappingProxyType(dict(properties))
+            for name, properties in data["batteries"].items()
+        }
+        for name, properties in batteries.items():
+            for key in ("cost_per_kwh", "efficiency", "depth_of_discharge"):
+                if key not in properties:
+                    raise ValueError(f"Battery {name} is missing {key}")
+
+        inverter_sizes, inverter_ratings, inverter_costs = _tiers(data["inverters"], "rating_kw", "inverters")
+        controller_sizes, controller_ratings, controller_costs = _tiers(
+            data["charge_controllers"], "rating_amps", "charge controllers")
+
+        return PricingCatalog(
+            version=str(data["version"]),
+            generation=next(_generations),
+            digest=catalog_digest(data),
+            location_names=names,
+            location_ids=MappingProxyType({name: i for i, name in enumerate(names)}),
+            location_rows=rows,
+            sun_hours=_array([row[0] for row in rows]),
+            cost_per_watt=_array([row[1] for row in rows]),
+            installation_factor=_array([row[2] for row in rows]),
+            batteries=MappingProxyType(batteries),
+            battery_types=tuple(batteries),
+            inverter_sizes=inverter_sizes,
+            # Every tier but the largest is its own upper bound
+            inverter_breakpoints=inverter_ratings[:-1],
+            inverter_prices=inverter_costs,
+            inverter_ratings_kw=_array(inverter_ratings),
+            inverter_costs=_array(inverter_costs),
+            charge_controller_sizes=controller_sizes,
+            charge_controller_breakpoints=controller_ratings[:-1],
+            charge_controller_prices=controller_costs,
+            charge_controller_ratings_amps=_array(controller_ratings),
+            charge_controller_costs=_array(controller_costs),
+        )
+    except (KeyError, TypeError, AttributeError) as e:
+        raise ValueError(f"Invalid pricing catalog: missing or malformed {e}") from e
+
+
+def _file_signature(path):
+    stat = os.stat(path)
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+def load_catalog(path=CATALOG_PATH):
+    """Read and compile a catalog file, returning (catalog, file signature)"""
+    signature = _file_signature(path)
+    with open(path, encoding="utf-8") as f:
+        return compile_catalog(json.load(f)), signature
+
+
+_catalog, _signature = load_catalog()
+_next_check = time.monotonic() + CATALOG_CHECK_INTERVAL
+
+
+def reload_catalog(path=None):
+    """Load the catalog file now and make it current; returns the new catalog.
+
+    The new snapshot is compiled in full before a single assignment swaps it
+    in, so readers see either the old catalog or the new one and never need
+    a lock. Writers should replace the file atomically (write a temporary
+    file, then os.replace) so a half-written file is never read.
+    """
+    global _catalog, _signature
+    catalog, signature = load_catalog(path or CATALOG_PATH)
+    _catalog, _signature = catalog, signature
+    logging.info(f"Loaded pricing catalog version {catalog.version}")
+    return catalog
+
+
+def current_catalog():
+    """Return the current catalog, picking up file changes at most every CATALOG_CHECK_INTERVAL.
+
+    Every worker process checks the file on its own, so all of them switch
+    to a new catalog within one interval of it being written. A catalog that
+    fails to load is logged and skipped, and the previous one stays current.
+    """
+    global _next_check, _signature
+    now = time.monotonic()
+    if now >= _next_check:
+        _next_check = now + CATALOG_CHECK_INTERVAL
+        try:
+            if _file_signature(CATALOG_PATH) != _signature:
+                reload_catalog()
+        except (OSError, ValueError) as e:
+            logging.error(f"Error reloading pricing catalog: {str(e)}")
+            try:
+                _signature = _file_signature(CATALOG_PATH)  # don't retry until it changes again
+            except OSError:
+                pass
+    return _catalog
@@ -0,0 +1,43 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class RateLimiter:
+    """Thread-safe in-process token buckets, one per key (such as a client address).
+
+    Each key may make ``burst`` requests at once and then ``rate`` requests
+    per ``period`` seconds. Limits apply per process, so with several
+    gunicorn workers a client can make up to that many times as many. Only
+    the ``maxsize`` most recently seen keys are tracked; a key dropped from
+    the table starts again with a full bucket.
+    """
+
+    def __init__(self, rate, period=60, burst=None, maxsize=10000):
+        self.rate = rate
+        self.period = period
+        self.burst = burst or rate
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()  # key -> (tokens, monotonic time they were counted)
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def acquire(self, key):
+        """Take a token for key: 0 if allowed, else the seconds until one is available"""
+        if self.rate <= 0:
+            return 0
+        now = time.monotonic()
+        per_second = self.rate / self.period
+        with self._lock:
+            tokens, counted_at = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - counted_at) * per_second)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                self.rejected += 1
+                wait = (1 - tokens) / per_second
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return wait
@@ -1,57 +1,74 @@
+import hashlib
 import json
 import math
 import os
-
-# Component cost tables by location
-PANEL_COSTS = {
-    "Lagos": {"cost_per_watt": 350, "installation_factor": 1.1},
-    "Abuja": {"cost_per_watt": 370, "installation_factor": 1.0},
-    "Kano": {"cost_per_watt": 390, "installation_factor": 1.2},
-    "Port Harcourt": {"cost_per_watt": 360, "installation_factor": 1.15},
-    "Ibadan": {"cost_per_watt": 355, "installation_factor": 1.05},
-    "Enugu": {"cost_per_watt": 380, "installation_factor": 1.1},
-    # Default for any unlisted location
-    "default": {"cost_per_watt": 365, "installation_factor": 1.1}
-}
-
-BATTERY_COSTS = {
-    "lithium-ion": {"cost_per_kwh": 180000, "cycles": 3000, "efficiency": 0.95},
-    "gel": {"cost_per_kwh": 120000, "cycles": 1500, "efficiency": 0.85},
-    "lead-acid": {"cost_per_kwh": 80000, "cycles": 800, "efficiency": 0.75}
-}
-
-INVERTER_COSTS = {
-    "1-3kW": 150000,
-    "3-5kW": 250000,
-    "5-10kW": 400000,
-    "10-15kW": 600000,
-    "15-20kW": 800000
-}
-
-CHARGE_CONTROLLER_COSTS = {
-    "30A": 35000,
-    "50A": 55000,
-    "60A": 70000,
-    "80A": 90000,
-    "100A": 120000
-}
-
-# Location-specific sun hours (average per day)
-SUN_HOURS = {
-    "Lagos": 5.5,
-    "Abuja": 6.0,
-    "Kano": 6.5,
-    "Port Harcourt": 5.0,
-    "Ibadan": 5.8,
-    "Enugu": 5.6,
-    # Default for any unlisted location
-    "default": 5.5
-}
-
-def get_system_size(daily_energy_kwh, location):
+from dataclasses import dataclass
+from typing import Optional
+
+from flask import current_app, has_app_context
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+from utils.appliance_load import appliance_load, current_appliance_catalog
+from utils.cache import LRUCache
+from utils.energy_simulation import grid_availability, load_profile, simulate_energy_system, solar_profile
+from utils.metrics import timed
+from utils.monte_carlo import simulate_payback
+from utils.pricing_catalog import DEFAULT_LOCATION, current_catalog
+from utils.presentation import format_system_cost, system_cost_to_json
+
+RECOMMENDATIONS_TEMPLATE = "partials/recommendations.html"
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates")
+_standalone_jinja_env = None
+
+@dataclass(slots=True)
+class BackupOnlyCost:
+    """Raw costs (naira) of the backup-only alternative offered for hybrid systems"""
+    batteries_cost: float
+    inverter_cost: float
+    bos_cost: float
+    installation_cost: float
+    total_cost: float
+    monthly_savings: float
+    payback_years: float
+
+@dataclass(slots=True)
+class SystemCost:
+    """Sizing and cost of a recommended system as raw numbers (naira, kW, kWh)"""
+    system_type: str
+    system_type_rationale: str
+    system_type_configuration: str
+    system_size_kw: float
+    panel_count: int
+    panel_type: str
+    charge_controller_size: str
+    inverter_size: str
+    battery_size_kwh: int
+    battery_type: str
+    battery_count: int
+    solar_panels_cost: float
+    batteries_cost: float
+    inverter_cost: float
+    charge_controller_cost: float
+    bos_cost: float
+    installation_cost: float
+    total_cost: float
+    monthly_savings: float
+    payback_years: float
+    backup_only: Optional[BackupOnlyCost]
+    mounting: str
+    estimated_area_m2: int
+    additional_notes: str
+    catalog_version: str
+    # Appliance demand the inverter was sized for; None without an appliance list
+    peak_load_kw: Optional[float] = None
+    surge_load_kw: Optional[float] = None
+
+
+def get_system_size(daily_energy_kwh, location, catalog=None):
     """Calculate required solar system size based on energy needs and location"""
+    catalog = catalog or current_catalog()
     # Get sun hours for location or use default
-    sun_hours = SUN_HOURS.get(location, SUN_HOURS["default"])
+    sun_hours = catalog.location_rows[catalog.location_id(location)][0]
 
     # Add 20% buffer for system losses and future expansion
     required_kw = (daily_energy_kwh / sun_hours) * 1.2
@@ -80,33 +97,24 @@ def get_battery_size(daily_energy_kwh, backup_days, user_type):
     # Round up to nearest 1 kWh
     return math.ceil(required_capacity)
 
-def get_inverter_size(system_size_kw):
-    """Determine appropriate inverter size range based on solar system size"""
-    if system_size_kw <= 3:
-        return "1-3kW"
-    elif system_size_kw <= 5:
-        return "3-5kW"
-    elif system_size_kw <= 10:
-        return "5-10kW"
-    elif system_size_kw <= 15:
-        return "10-15kW"
-    else:
-        return "15-20kW"
+def inverter_load_kw(system_size_kw, load=None):
+    """Continuous rating the inverter needs: the array size, or more if the appliances' peak or motor starts need it"""
+    return system_size_kw if load is None else max(system_size_kw, load.inverter_kw())
+
+def get_inverter_size(system_size_kw, catalog=None, load=None):
+    """Determine appropriate inverter size range based on solar system size and the appliance load"""
+    catalog = catalog or current_catalog()
+    return catalog.inverter_sizes[catalog.inverter_tier(inverter_load_kw(system_size_kw, load))]
 
-def get_charge_controller_size(system_size_kw):
+def inverter_rating_kw(inverter_size, catalog=None):
+    """Continuous rating in kW of an inverter size from the catalog"""
+    return (catalog or current_catalog()).inverter_rating_kw(inverter_size)
+
+def get_charge_controller_size(system_size_kw, catalog=None):
     """Determine appropriate charge controller size based on system size"""
+    catalog = catalog or current_catalog()
     system_amps = (system_size_kw * 1000) / 48  # Assuming 48V system
-
-    if system_amps <= 30:
-        return "30A"
-    elif system_amps <= 50:
-        return "50A"
-    elif system_amps <= 60:
-        return "60A"
-    elif system_amps <= 80:
-        return "80A"
-    else:
-        return "100A"
+    return catalog.charge_controller_sizes[catalog.charge_controller_tier(system_amps)]
 
 def calculate_panel_count(system_size_kw, panel_watts=400):
     """Calculate number of panels needed based on system size and panel wattage"""
@@ -188,31 +196,37 @@ def determine_system_type(grid_hours, usage_type):
 
     return system_type_info
 
-def calculate_system_cost(daily_energy_kwh, location, backup_days, user_type, battery_type="lithium-ion"):
-    """Calculate complete solar system cost based on parameters"""
+@timed('sizing')
+def compute_system_cost(daily_energy_kwh, location, backup_days, user_type, battery_type="lithium-ion", load=None):
+    """Calculate complete solar system sizing and cost as raw numbers.
+
+    ``load`` (an ApplianceLoad) raises the inverter size when the appliances'
+    peak demand or motor starting surge needs more than the panel array.
+    """
     # Get system type recommendation using the grid_hours from user input
     grid_hours = float(user_type.get('grid_hours', 0))  # Use actual grid hours input
     usage_type = user_type['usage_type'] if 'usage_type' in user_type else user_type # Handle potential missing key
     system_type_info = determine_system_type(grid_hours, usage_type)
 
+    # One catalog snapshot for the whole calculation, even if a new one is loaded meanwhile
+    catalog = current_catalog()
+
     # Calculate system components
-    system_size_kw = get_system_size(daily_energy_kwh, location)
+    system_size_kw = get_system_size(daily_energy_kwh, location, catalog)
     battery_size_kwh = get_battery_size(daily_energy_kwh, backup_days, usage_type)
-    inverter_size = get_inverter_size(system_size_kw)
-    charge_controller_size = get_charge_controller_size(system_size_kw)
+    inverter_tier = catalog.inverter_tier(inverter_load_kw(system_size_kw, load))
+    charge_controller_tier = catalog.charge_controller_tier((system_size_kw * 1000) / 48)  # Assuming 48V system
     panel_count = calculate_panel_count(system_size_kw)
 
     # Get cost factors for location
-    location_costs = PANEL_COSTS.get(location, PANEL_COSTS["default"])
-    panel_cost_per_watt = location_costs["cost_per_watt"]
-    installation_factor = location_costs["installation_factor"]
+    _, panel_cost_per_watt, installation_factor = catalog.location_rows[catalog.location_id(location)]
 
     # Calculate component costs
     component_costs = {
         "solar_panels": system_size_kw * 1000 * panel_cost_per_watt,
-        "batteries": battery_size_kwh * BATTERY_COSTS[battery_type]["cost_per_kwh"],
-        "inverter": INVERTER_COSTS[inverter_size],
-        "charge_controller": CHARGE_CONTROLLER_COSTS[charge_controller_size],
+        "batteries": battery_size_kwh * catalog.battery(battery_type)["cost_per_kwh"],
+        "inverter": catalog.inverter_prices[inverter_tier],
+        "charge_controller": catalog.charge_controller_prices[charge_controller_tier],
     }
 
     # Calculate BOS (Balance of System) and installation costs
@@ -229,7 +243,7 @@ def calculate_system_cost(daily_energy_kwh, location, backup_days, user_type, ba
     payback_years = total_cost / (monthly_savings * 12)
 
     # For hybrid systems, calculate backup-only costs and savings
-    backup_only_costs = None
+    backup_only = None
     if system_type_info['type'] == 'hybrid':
         backup_only_component_costs = {
             "batteries": component_costs["batteries"] * 0.7,  # Reduced battery capacity for backup
@@ -244,342 +258,280 @@ def calculate_system_cost(daily_energy_kwh, location, backup_days, user_type, ba
         backup_only_monthly_savings = monthly_generator_cost * 0.6  # 60% of full savings
         backup_only_payback_years = backup_only_final_cost / (backup_only_monthly_savings * 12)
 
-        backup_only_costs = {
-            "components": {
-                "batteries": f"₦{backup_only_component_costs['batteries']:,.2f}",
-                "inverter": f"₦{backup_only_component_costs['inverter']:,.2f}",
-            },
-            "bos": f"₦{backup_only_bos:,.2f}",
-            "installation": f"₦{backup_only_installation:,.2f}",
-            "total": f"₦{backup_only_final_cost:,.2f}",
-            "monthly_savings": f"₦{backup_only_monthly_savings:,.2f}",
-            "payback_period": f"{backup_only_payback_years:.1f} years"
-        }
+        backup_only = BackupOnlyCost(
+            batteries_cost=backup_only_component_costs["batteries"],
+            inverter_cost=backup_only_component_costs["inverter"],
+            bos_cost=backup_only_bos,
+            installation_cost=backup_only_installation,
+            total_cost=backup_only_final_cost,
+            monthly_savings=backup_only_monthly_savings,
+            payback_years=backup_only_payback_years
+        )
 
-    return {
-        "system_type": system_type_info,
-        "solar_system": {
-            "total_capacity": f"{system_size_kw} kW",
-            "num_panels": f"{panel_count}",
-            "panel_type": "400 W monocrystalline",
-            "charge_controller": charge_controller_size,
-            "inverter_size": inverter_size # Added inverter size
-        },
-        "battery_system": {
-            "total_capacity": f"{battery_size_kwh} kWh",
-            "battery_type": battery_type,
-            "configuration": f"{math.ceil(battery_size_kwh / 5)} batteries in parallel"
-        },
-        "financial": {
-            "cost_breakdown": {
-                "solar_panels": f"₦{component_costs['solar_panels']:,.2f}",
-                "batteries": f"₦{component_costs['batteries']:,.2f}",
-                "inverter": f"₦{component_costs['inverter']:,.2f}",
-                "charge_controller": f"₦{component_costs['charge_controller']:,.2f}",
-                "bos": f"₦{bos_cost:,.2f}",
-                "installation": f"₦{installation_cost:,.2f}",
-                "total": f"₦{total_cost:,.2f}"
-            },
-            "backup_only_costs": backup_only_costs,  # Will be None for non-hybrid systems
-            "monthly_savings": f"₦{monthly_savings:,.2f}",
-            "payback_period": f"{payback_years:.1f} years"
-        },
-        "installation": {
-            "mounting": system_type_info["configuration"],
-            "estimated_area": f"{panel_count * 2} square meters",
-            "additional_notes": "Installation includes mounting hardware, wiring, and system configuration."
-        }
-    }
+    return SystemCost(
+        system_type=system_type_info['type'],
+        system_type_rationale=system_type_info['rationale'],
+        system_type_configuration=system_type_info['configuration'],
+        system_size_kw=system_size_kw,
+        panel_count=panel_count,
+        panel_type="400 W monocrystalline",
+        charge_controller_size=catalog.charge_controller_sizes[charge_controller_tier],
+        inverter_size=catalog.inverter_sizes[inverter_tier],
+        battery_size_kwh=battery_size_kwh,
+        battery_type=battery_type,
+        battery_count=math.ceil(battery_size_kwh / 5),
+        solar_panels_cost=component_costs["solar_panels"],
+        batteries_cost=component_costs["batteries"],
+        inverter_cost=component_costs["inverter"],
+        charge_controller_cost=component_costs["charge_controller"],
+        bos_cost=bos_cost,
+        installation_cost=installation_cost,
+        total_cost=total_cost,
+        monthly_savings=monthly_savings,
+        payback_years=payback_years,
+        backup_only=backup_only,
+        mounting=system_type_info["configuration"],
+        estimated_area_m2=panel_count * 2,
+        additional_notes="Installation includes mounting hardware, wiring, and system configuration.",
+        catalog_version=catalog.version,
+        peak_load_kw=load.peak_kw if load else None,
+        surge_load_kw=load.surge_kw if load else None
+    )
+
+def calculate_system_cost(daily_energy_kwh, location, backup_days, user_type, battery_type="lithium-ion"):
+    """Calculate complete solar system cost based on parameters, formatted for display"""
+    return format_system_cost(
+        compute_system_cost(daily_energy_kwh, location, backup_days, user_type, battery_type)
+    )
+
+def _recommendations_template():
+    """Return the compiled recommendations template.
+
+    Inside a request this comes from the app's Jinja environment, outside the
+    app (scripts, batch jobs) from a standalone environment over the same
+    templates folder. Either environment compiles it once and caches it,
+    recompiling an edited template only when its auto_reload is on.
+    """
+    global _standalone_jinja_env
+    if has_app_context():
+        return current_app.jinja_env.get_template(RECOMMENDATIONS_TEMPLATE)
+    if _standalone_jinja_env is None:
+        _standalone_jinja_env = Environment(
+            loader=FileSystemLoader(TEMPLATES_DIR),
+            autoescape=select_autoescape(),
+            auto_reload=False
+        )
+    return _standalone_jinja_env.get_template(RECOMMENDATIONS_TEMPLATE)
 
+@timed('html_render')
 def get_html_recommendations(recommendations_data):
     """Format the recommendations in HTML with proper styling"""
-    # Start with system type section
-    html_recommendations = f"""
-        <div class="results-card mb-4">
-            <div class="row g-4">
-                <div class="col-12">
-                    <div class="recommendation-section">
-                        <h4 class="section-title">Recommended System Type</h4>
-                        <div class="specification-list">
-                            <div class="spec-item">
-                                <span class="spec-label">System Type:</span>
-                                <span class="spec-value">{recommendations_data['system_type']['type'].replace('_', ' ').title()}</span>
-                            </div>
-                            <div class="spec-item">
-                                <span class="spec-label">Rationale:</span>
-                                <span class="spec-value">{recommendations_data['system_type']['rationale']}</span>
-                            </div>
-                            <div class="spec-item">
-                                <span class="spec-label">Configuration:</span>
-                                <span class="spec-value">{recommendations_data['system_type']['configuration']}</span>
-                            </div>
-                        </div>
-                    </div>
-                </div>
-            </div>
-        </div>
-    """
+    return _recommendations_template().render(rec=recommendations_data)
 
-    # Add solar and battery system sections
-    html_recommendations += f"""
-        <div class="results-card mb-4">
-            <div class="row g-4">
-                <div class="col-12">
-                    <div class="recommendation-section">
-                        <div class="row">
-                            <div class="col-md-6">
-                                <h4 class="section-title">Solar Panel System</h4>
-                                <div class="specification-list">
-                                    <div class="spec-item">
-                                        <span class="spec-label">Total Capacity:</span>
-                                        <span class="spec-value">{recommendations_data['solar_system']['total_capacity']}</span>
-                                    </div>
-                                    <div class="spec-item">
-                                        <span class="spec-label">Number of Panels:</span>
-                                        <span class="spec-value">{recommendations_data['solar_system']['num_panels']}</span>
-                                    </div>
-                                    <div class="spec-item">
-                                        <span class="spec-label">Panel Type:</span>
-                                        <span class="spec-value">{recommendations_data['solar_system']['panel_type']}</span>
-                                    </div>
-                                    <div class="spec-item">
-                                        <span class="spec-label">Charge Controller:</span>
-                                        <span class="spec-value">{recommendations_data['solar_system']['charge_controller']}</span>
-                                    </div>
-                                    <div class="spec-item">
-                                        <span class="spec-label">Inverter Size:</span>
-                                        <span class="spec-value">{recommendations_data['solar_system']['inverter_size']}</span>
-                                    </div>
-                                </div>
-                            </div>
-                            <div class="col-md-6">
-                                <h4 class="section-title">Battery System</h4>
-                                <div class="specification-list">
-                                    <div class="spec-item">
-                                        <span class="spec-label">Total Capacity:</span>
-                                        <span class="spec-value">{recommendations_data['battery_system']['total_capacity']}</span>
-                                    </div>
-                                    <div class="spec-item">
-                                        <span class="spec-label">Battery Type:</span>
-                                        <span class="spec-value">{recommendations_data['battery_system']['battery_type'].title()}</span>
-                                    </div>
-                                    <div class="spec-item">
-                                        <span class="spec-label">Configuration:</span>
-                                        <span class="spec-value">{recommendations_data['battery_system']['configuration']}</span>
-                                    </div>
-                                </div>
-                            </div>
-                        </div>
-                    </div>
-                </div>
-            </div>
-        </div>
-    """
+def _daily_energy_kwh(user_data, load):
+    """Daily backup energy of a submission: from its appliance list, else the submitted figure"""
+    return load.daily_energy_kwh if load else float(user_data['daily_energy'])
 
-    # Add cost breakdown section with conditional backup-only costs for hybrid systems
-    if recommendations_data['system_type']['type'] == 'hybrid':
-        html_recommendations += f"""
-        <div class="results-card mb-4">
-            <div class="row g-4">
-                <div class="col-12">
-                    <div class="recommendation-section">
-                        <h4 class="section-title">Cost Comparison</h4>
-                        <div class="row">
-                            <div class="col-md-6 mb-4">
-                                <div class="p-3 border rounded">
-                                    <h5 class="mb-3">Full Hybrid System</h5>
-                                    <div class="specification-list">
-                                        <div class="spec-item">
-                                            <span class="spec-label">Solar Panels:</span>
-                                            <span class="spec-value">{recommendations_data['financial']['cost_breakdown']['solar_panels']}</span>
-                                        </div>
-                                        <div class="spec-item">
-                                            <span class="spec-label">Batteries:</span>
-                                            <span class="spec-value">{recommendations_data['financial']['cost_breakdown']['batteries']}</span>
-                                        </div>
-                                        <div class="spec-item">
-                                            <span class="spec-label">Inverter:</span>
-                                            <span class="spec-value">{recommendations_data['financial']['cost_breakdown']['inverter']}</span>
-                                        </div>
-                                        <div class="spec-item">
-                                            <span class="spec-label">Charge Controller:</span>
-                                            <span class="spec-value">{recommendations_data['financial']['cost_breakdown']['charge_controller']}</span>
-                                        </div>
-                                        <div class="spec-item">
-                                            <span class="spec-label">Balance of System:</span>
-                                            <span class="spec-value">{recommendations_data['financial']['cost_breakdown']['bos']}</span>
-                                        </div>
-                                        <div class="spec-item">
-                                            <span class="spec-label">Installation:</span>
-                                            <span class="spec-value">{recommendations_data['financial']['cost_breakdown']['installation']}</span>
-                                        </div>
-                                        <div class="spec-item">
-                                            <span class="spec-label font-weight-bold">Total Cost:</span>
-                                            <span class="spec-value">{recommendations_data['financial']['cost_breakdown']['total']}</span>
-                                        </div>
-                                        <div class="spec-item">
-                                            <span class="spec-label">Monthly Savings:</span>
-                                            <span class="spec-value">{recommendations_data['financial']['monthly_savings']}</span>
-                                        </div>
-                                        <div class="spec-item">
-                                            <span class="spec-label">Payback Period:</span>
-                                            <span class="spec-value">{recommendations_data['financial']['payback_period']}</span>
-                                        </div>
-                                    </div>
-                                </div>
-                            </div>
-                            <div class="col-md-6 mb-4">
-                                <div class="p-3 border rounded">
-                                    <h5 class="mb-3">Backup-Only System</h5>
-                                    <div class="specification-list">
-                                        <div class="spec-item">
-                                            <span class="spec-label">Batteries:</span>
-                                            <span class="spec-value">{recommendations_data['financial']['backup_only_costs']['components']['batteries']}</span>
-                                        </div>
-                                        <div class="spec-item">
-                                            <span class="spec-label">Inverter:</span>
-                                            <span class="spec-value">{recommendations_data['financial']['backup_only_costs']['components']['inverter']}</span>
-                                        </div>
-                                        <div class="spec-item">
-                                            <span class="spec-label">Balance of System:</span>
-                                            <span class="spec-value">{recommendations_data['financial']['backup_only_costs']['bos']}</span>
-                                        </div>
-                                        <div class="spec-item">
-                                            <span class="spec-label">Installation:</span>
-                                            <span class="spec-value">{recommendations_data['financial']['backup_only_costs']['installation']}</span>
-                                        </div>
-                                        <div class="spec-item">
-                                            <span class="spec-label font-weight-bold">Total Cost:</span>
-                                            <span class="spec-value">{recommendations_data['financial']['backup_only_costs']['total']}</span>
-                                        </div>
-                                        <div class="spec-item">
-                                            <span class="spec-label">Monthly Savings:</span>
-                                            <span class="spec-value">{recommendations_data['financial']['backup_only_costs']['monthly_savings']}</span>
-                                        </div>
-                                        <div class="spec-item">
-                                            <span class="spec-label">Payback Period:</span>
-                                            <span class="spec-value">{recommendations_data['financial']['backup_only_costs']['payback_period']}</span>
-                                        </div>
-                                    </div>
-                                </div>
-                            </div>
-                        </div>
-                    </div>
-                </div>
-            </div>
-        </div>
-        """
-    else:
-        # For non-hybrid systems, show single cost breakdown
-        html_recommendations += f"""
-        <div class="results-card mb-4">
-            <div class="row g-4">
-                <div class="col-12">
-                    <div class="recommendation-section">
-                        <h4 class="section-title">Cost Breakdown</h4>
-                        <div class="specification-list">
-                            <div class="spec-item">
-                                <span class="spec-label">Solar Panels:</span>
-                                <span class="spec-value">{recommendations_data['financial']['cost_breakdown']['solar_panels']}</span>
-                            </div>
-                            <div class="spec-item">
-                                <span class="spec-label">Batteries:</span>
-                                <span class="spec-value">{recommendations_data['financial']['cost_breakdown']['batteries']}</span>
-                            </div>
-                            <div class="spec-item">
-                                <span class="spec-label">Inverter:</span>
-                                <span class="spec-value">{recommendations_data['financial']['cost_breakdown']['inverter']}</span>
-                            </div>
-                            <div class="spec-item">
-                                <span class="spec-label">Charge Controller:</span>
-                                <span class="spec-value">{recommendations_data['financial']['cost_breakdown']['charge_controller']}</span>
-                            </div>
-                            <div class="spec-item">
-                                <span class="spec-label">Balance of System:</span>
-                                <span class="spec-value">{recommendations_data['financial']['cost_breakdown']['bos']}</span>
-                            </div>
-                            <div class="spec-item">
-                                <span class="spec-label">Installation:</span>
-                                <span class="spec-value">{recommendations_data['financial']['cost_breakdown']['installation']}</span>
-                            </div>
-                            <div class="spec-item">
-                                <span class="spec-label font-weight-bold">Total Cost:</span>
-                                <span class="spec-value">{recommendations_data['financial']['cost_breakdown']['total']}</span>
-                            </div>
-                            <div class="spec-item">
-                                <span class="spec-label">Monthly Savings:</span>
-                                <span class="spec-value">{recommendations_data['financial']['monthly_savings']}</span>
-                            </div>
-                            <div class="spec-item">
-                                <span class="spec-label">Payback Period:</span>
-                                <span class="spec-value">{recommendations_data['financial']['payback_period']}</span>
-                            </div>
-                        </div>
-                    </div>
-                </div>
-            </div>
-        </div>
-        """
-
-    # Add installation details
-    html_recommendations += f"""
-        <div class="results-card">
-            <div class="row g-4">
-                <div class="col-12">
-                    <div class="recommendation-section">
-                        <h4 class="section-title">Installation Details</h4>
-                        <div class="specification-list">
-                            <div class="spec-item">
-                                <span class="spec-label">Mounting Type:</span>
-                                <span class="spec-value">{recommendations_data['installation']['mounting'].title()}</span>
-                            </div>
-                            <div class="spec-item">
-                                <span class="spec-label">Required Area:</span>
-                                <span class="spec-value">{recommendations_data['installation']['estimated_area']}</span>
-                            </div>
-                            <div class="spec-item installation-notes">
-                                <span class="spec-label">Additional Notes:</span>
-                                <p class="spec-value notes-text">{recommendations_data['installation']['additional_notes']}</p>
-                            </div>
-                        </div>
-                    </div>
-                </div>
-            </div>
-        </div>
+def submission_location(user_data, catalog=None):
+    """Catalog location a calculator submission is sized and simulated for.
+
+    The calculator posts the sun hours of the chosen location as ``location``
+    and its display name as ``location_name``, while API clients post the
+    name as ``location``. Returns the first that is a listed location, else
+    the default location.
     """
-    # Add loan application button at the bottom of recommendations
-    html_recommendations += """
-        <div class="text-center mt-5">
-            <p class="mb-4">Interested in financing your solar system? Apply for a loan today!</p>
-            <a href="/loan_application" class="btn btn-solar btn-lg">
-                Apply For a Loan
-            </a>
-        </div>
+    catalog = catalog or current_catalog()
+    for key in ('location', 'location_name'):
+        if user_data.get(key) in catalog.location_ids:
+            return user_data[key]
+    return DEFAULT_LOCATION
+
+def _compute_user_system_cost(user_data, load, location=None):
+    """Run the sizing rules for a calculator submission and its ApplianceLoad (or None)"""
+    # Default to 1 day backup period since we're calculating based on daily backup power
+    backup_days = 1
+
+    return compute_system_cost(
+        daily_energy_kwh=_daily_energy_kwh(user_data, load),
+        location=location or submission_location(user_data),
+        backup_days=backup_days,
+        user_type=user_data, # Pass the entire user_data dictionary
+        battery_type="lithium-ion",  # Default to lithium-ion batteries
+        load=load
+    )
+
+def get_system_recommendations(user_data, load=None):
+    """Get solar system recommendations using local calculation rules.
+
+    Daily energy and inverter size come from the submission's appliance
+    list, recomputed against the appliance catalog, rather than from the
+    browser's figures; ``load`` passes in an ApplianceLoad already computed.
     """
-    return html_recommendations
-
-def get_system_recommendations(user_data):
-    """Get solar system recommendations using local calculation rules"""
     try:
-        # Default to 1 day backup period since we're calculating based on daily backup power
-        backup_days = 1  
-
-        recommendations_data = calculate_system_cost(
-            daily_energy_kwh=float(user_data['daily_energy']),
-            location=user_data['location'],
-            backup_days=backup_days,
-            user_type=user_data, # Pass the entire user_data dictionary
-            battery_type="lithium-ion"  # Default to lithium-ion batteries
-        )
+        if load is None:
+            load = appliance_load(user_data.get('appliances'))
+        result = _compute_user_system_cost(user_data, load)
+        recommendations_data = format_system_cost(result)
 
         html_recommendations = get_html_recommendations(recommendations_data)
 
         return {
             'success': True,
-            'recommendations': html_recommendations
+            'recommendations': html_recommendations,
+            'catalog_version': result.catalog_version
         }
     except Exception as e:
         return {
             'success': False,
             'error': str(e)
-        }
\ No newline at end of file
+        }
+
+# Error for API inputs recommendation_cache_key cannot parse
+UNPARSEABLE_INPUT_ERROR = 'location must be a string and grid_hours and daily_energy numbers'
+
+def missing_api_fields(user_data):
+    """Inputs the API needs that a submission leaves out: location, grid_hours and appliances or daily_energy"""
+    missing_fields = [field for field in ('location', 'grid_hours') if user_data.get(field) in (None, '')]
+    if not user_data.get('appliances') and not user_data.get('daily_energy'):
+        missing_fields.append('appliances or daily_energy')
+    return missing_fields
+
+def get_structured_recommendations(user_data, load=None):
+    """Sizing and costs of a calculator submission as raw numbers, without rendering or simulation"""
+    if load is None:
+        load = appliance_load(user_data.get('appliances'))
+    return system_cost_to_json(_compute_user_system_cost(user_data, load))
+
+def simulate_system_cost(result, user_data, battery_type="lithium-ion", load=None, location=None):
+    """Simulate a sized system over a year of hourly weather, load and grid outages.
+
+    The load is the hourly demand of the submission's ApplianceLoad (``load``,
+    computed here if not given), the same catalog figures the system was
+    sized from, or a typical daily curve for the submitted daily energy.
+    ``location`` is the catalog location the system was sized for.
+    """
+    if load is None:
+        load = appliance_load(user_data.get('appliances'))
+    catalog = current_catalog()
+    location = location or submission_location(user_data, catalog)
+    battery = catalog.battery(battery_type)
+    simulation = simulate_energy_system(
+        pv_kw=result.system_size_kw,
+        battery_kwh=result.battery_size_kwh,
+        inverter_kw=inverter_rating_kw(result.inverter_size, catalog),
+        load_kw=load_profile(load.hourly_kw if load else None, _daily_energy_kwh(user_data, load)),
+        solar_kwh_per_kw=solar_profile(catalog.location_rows[catalog.location_id(location)][0]),
+        grid_available=grid_availability(float(user_data.get('grid_hours', 0))),
+        battery_efficiency=battery["efficiency"],
+        depth_of_discharge=battery["depth_of_discharge"]
+    )
+    return {name: value.item() for name, value in simulation.items()}
+
+def simulate_system_payback(result, user_data, samples, distributions=None, load=None, location=None):
+    """Sample the payback period of a sized system under uncertain fuel prices, sun and grid"""
+    catalog = current_catalog()
+    location = location or submission_location(user_data, catalog)
+    return simulate_payback(
+        total_cost=result.total_cost,
+        daily_energy_kwh=_daily_energy_kwh(user_data, load),
+        system_size_kw=result.system_size_kw,
+        sun_hours=catalog.location_rows[catalog.location_id(location)][0],
+        grid_hours=float(user_data.get('grid_hours', 0)),
+        samples=samples,
+        distributions=distributions
+    )
+
+def get_system_recommendations_data(user_data, uncertainty_samples=None, distributions=None):
+    """Get solar system recommendations as structured numbers, without rendering.
+
+    With ``uncertainty_samples`` the payback period is also sampled that many
+    times (Monte Carlo) and reported as P10/P50/P90.
+    """
+    try:
+        load = appliance_load(user_data.get('appliances'))
+        location = submission_location(user_data)
+        result = _compute_user_system_cost(user_data, load, location)
+        data = {
+            'success': True,
+            'recommendations': system_cost_to_json(result),
+            'simulation': simulate_system_cost(result, user_data, load=load, location=location)
+        }
+        if uncertainty_samples:
+            data['payback_uncertainty'] = simulate_system_payback(
+                result, user_data, uncertainty_samples, distributions, load, location)
+        return data
+    except Exception as e:
+        return {
+            'success': False,
+            'error': str(e)
+        }
+
+# Rendered recommendations, keyed on the normalized calculator inputs
+recommendation_cache = LRUCache(
+    maxsize=int(os.environ.get("RECOMMENDATION_CACHE_SIZE", 1024)),
+    ttl=float(os.environ.get("RECOMMENDATION_CACHE_TTL", 3600)),
+    version=lambda: current_catalog().generation
+)
+
+# Encoded API response bodies, keyed on their entity tag
+api_response_cache = LRUCache(
+    maxsize=int(os.environ.get("API_RESPONSE_CACHE_SIZE", 1024)),
+    ttl=float(os.environ.get("API_RESPONSE_CACHE_TTL", 3600)),
+    version=lambda: current_catalog().generation
+)
+
+def recommendation_cache_key(user_data, battery_type="lithium-ion", load=None):
+    """Normalize calculator inputs into a hashable cache key.
+
+    Only values that change the rendered output are kept apart: usage types
+    other than the ones the sizing rules look at behave identically, and grid
+    hours and daily energy are kept at full precision because both appear in
+    the output (the rationale text and the savings figures). With an
+    appliance list, its recomputed energy, peak and surge replace the
+    submitted daily energy; ``load`` passes in that ApplianceLoad if it was
+    already computed. Returns None for inputs that cannot be parsed, which
+    are never cached.
+    """
+    try:
+        if load is None:
+            load = appliance_load(user_data.get('appliances'))
+        daily_energy = _daily_energy_kwh(user_data, load)
+        grid_hours = float(user_data.get('grid_hours', 0))
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not isinstance(user_data.get('location'), str):
+        return None
+    # Submissions naming the same catalog location in different ways share an entry
+    location = submission_location(user_data)
+    usage_type = user_data.get('usage_type')
+    if usage_type not in ('dual', 'business', 'household'):
+        usage_type = None
+    peak_kw, surge_kw = (load.peak_kw, load.surge_kw) if load else (None, None)
+    return (location, usage_type, grid_hours, daily_energy, peak_kw, surge_kw, battery_type)
+
+def recommendation_etag(key):
+    """Strong entity tag for the recommendations computed from a cache key.
+
+    Hashes the normalized inputs with the content digests of the pricing and
+    appliance catalogs, so every worker process derives the same tag and it
+    changes whenever either catalog does.
+    """
+    fingerprint = repr((key, current_catalog().digest, current_appliance_catalog().digest))
+    return hashlib.blake2b(fingerprint.encode(), digest_size=16).hexdigest()
+
+def get_cached_system_recommendations(user_data):
+    """Get system recommendations, reusing a cached result for identical inputs"""
+    try:
+        load = appliance_load(user_data.get('appliances'))
+    except ValueError as e:
+        return {'success': False, 'error': str(e)}
+    key = recommendation_cache_key(user_data, load=load)
+    if key is not None:
+        cached = recommendation_cache.get(key)
+        if cached is not None:
+            return dict(cached)
+
+    result = get_system_recommendations(user_data, load)
+    if key is not None and result.get('success'):
+        recommendation_cache.set(key, dict(result))
+    return result
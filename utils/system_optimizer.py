@@ -0,0 +1,232 @@
+import math
+import os
+import threading
+
+import numpy as np
+
+from utils import system_calculator as sc
+from utils.appliance_load import appliance_load
+from utils.energy_simulation import grid_availability, load_profile, simulate_energy_system, solar_profile
+from utils.pricing_catalog import current_catalog
+
+# Default reliability target: load unmet in at most 1% of the hours of a year
+DEFAULT_LOLP_TARGET = float(os.environ.get('OPTIMIZER_LOLP_TARGET', 0.01))
+
+# Worker processes for the search, per web worker; 1 evaluates in-process. Every
+# gunicorn worker has its own pool, so by default the host's CPUs are shared
+# out between the WEB_CONCURRENCY workers (gunicorn's default for --workers)
+WEB_WORKERS = max(1, int(os.environ.get('WEB_CONCURRENCY', 1)))
+OPTIMIZER_WORKERS = int(os.environ.get('OPTIMIZER_WORKERS', max(1, (os.cpu_count() or 1) // WEB_WORKERS)))
+
+# Scenarios simulated per task, and the most grid points per sizing axis
+CHUNK_SIZE = 16
+MAX_AXIS_POINTS = 16
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the shared process pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # multiprocessing is only imported once a search needs the pool
+                from concurrent.futures import ProcessPoolExecutor
+                _pool = ProcessPoolExecutor(max_workers=OPTIMIZER_WORKERS)
+    return _pool
+
+
+def _axis(upper, base_step, start):
+    """Evenly spaced sizes from start to at least upper, in multiples of base_step"""
+    step = base_step * max(1, math.ceil((upper - start) / base_step / (MAX_AXIS_POINTS - 1)))
+    count = max(1, math.ceil((upper - start) / step - 1e-9) + 1)
+    return start + step * np.arange(count)
+
+
+def _inverter_tiers(peak_load_kw, catalog):
+    """Catalog inverter tiers worth searching, as indices in order of rating.
+
+    Every tier rated at or above the peak hourly load behaves identically in
+    the simulation, so only the smallest of those is kept; smaller tiers stay
+    in as cheaper, inverter-limited options.
+    """
+    covering = int(np.searchsorted(catalog.inverter_ratings_kw, peak_load_kw, side="left"))
+    return np.arange(min(covering, len(catalog.inverter_sizes) - 1) + 1)
+
+
+def _simulate_chunk(chunk):
+    """Process pool task: simulate one chunk of configurations"""
+    series, params = chunk
+    results = simulate_energy_system(**series, **params)
+    return {name: results[name] for name in
+            ('loss_of_load_probability', 'unmet_kwh', 'generator_fuel_cost', 'solar_fraction')}
+
+
+def _evaluate(series, params, workers):
+    """Simulate a wave of configurations, fanning chunks out to the process pool"""
+    size = len(params['pv_kw'])
+    chunks = [
+        (series, {name: values[i:i + CHUNK_SIZE] for name, values in params.items()})
+        for i in range(0, size, CHUNK_SIZE)
+    ]
+    if workers > 1 and len(chunks) > 1:
+        parts = list(get_pool().map(_simulate_chunk, chunks))
+    else:
+        parts = [_simulate_chunk(chunk) for chunk in chunks]
+    return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+
+def _candidate_grid(daily_energy_kwh, sun_hours, peak_load_kw, location, catalog):
+    """Every sizing combination with its total cost, as flat arrays"""
+    pv_axis = _axis(max(1.0, 2.5 * daily_energy_kwh / sun_hours), 0.5, 0.5)
+    battery_axis = _axis(max(2.0, 2 * daily_energy_kwh), 1.0, 0.0)
+    inverter_tiers = _inverter_tiers(peak_load_kw, catalog)
+
+    pv, battery, chemistry, inverter = (grid.reshape(-1) for grid in np.meshgrid(
+        pv_axis, battery_axis, np.arange(len(catalog.battery_types)), inverter_tiers, indexing='ij'))
+
+    # Same cost rules as compute_system_cost
+    location_id = catalog.location_id(location)
+    installation_factor = catalog.installation_factor[location_id]
+    controller_tier = np.searchsorted(catalog.charge_controller_breakpoints, (pv * 1000) / 48, side="left")
+    cost_per_kwh = np.array([catalog.battery(name)["cost_per_kwh"] for name in catalog.battery_types])
+    component_total = (pv * 1000 * catalog.cost_per_watt[location_id]
+                       + battery * cost_per_kwh[chemistry]
+                       + catalog.inverter_costs[inverter]
+                       + catalog.charge_controller_costs[controller_tier])
+    total_cost = component_total + component_total * 0.15 + component_total * (installation_factor - 1)
+
+    return {
+        'pv_kw': pv,
+        'battery_kwh': battery,
+        'chemistry': chemistry,
+        'inverter': inverter,
+        'total_cost': total_cost,
+    }, inverter_tiers
+
+
+def optimize_system(daily_energy_kwh, location, grid_hours, load=None, sun_hours=None,
+                    lolp_target=None, max_cost=None, workers=None):
+    """Search PV kW x battery kWh x chemistry x inverter tier for the cost/reliability trade-off.
+
+    Each configuration is priced with the calculator's cost rules and
+    simulated over a year (see utils.energy_simulation). Returns the Pareto
+    front of total cost against loss-of-load probability, cheapest first,
+    and the cheapest point on it that meets ``lolp_target``.
+
+    Configurations are simulated in waves in order of cost, so the search
+    can stop early: once some configuration never loses load, anything
+    costlier is dominated, and configurations whose inverter alone is too
+    small to avoid more lost hours than a cheaper option already achieves
+    are skipped without simulating. ``load`` is the ApplianceLoad whose
+    hourly demand is simulated; without it a typical daily curve is scaled
+    to ``daily_energy_kwh``.
+    """
+    lolp_target = DEFAULT_LOLP_TARGET if lolp_target is None else lolp_target
+    workers = OPTIMIZER_WORKERS if workers is None else workers
+    catalog = current_catalog()
+    sun_hours = sun_hours or catalog.location_rows[catalog.location_id(location)][0]
+
+    load = load_profile(load.hourly_kw if load else None, daily_energy_kwh)
+    grid = grid_availability(grid_hours)
+    series = {
+        'load_kw': load,
+        'solar_kwh_per_kw': solar_profile(sun_hours),
+        'grid_available': grid,
+    }
+    candidates, inverter_tiers = _candidate_grid(daily_energy_kwh, sun_hours, load.max(), location, catalog)
+
+    # Hours the inverter cannot cover during outages lower-bound each option's LOLP
+    outage_load = load[~grid]
+    inverter_kw = catalog.inverter_ratings_kw
+    inverter_floor = np.zeros(len(inverter_kw))
+    inverter_floor[inverter_tiers] = [
+        np.count_nonzero(outage_load > inverter_kw[tier] + 1e-9) / load.size for tier in inverter_tiers
+    ]
+    lolp_floor = inverter_floor[candidates['inverter']]
+
+    order = np.lexsort((lolp_floor, candidates['total_cost']))
+    battery_efficiency = np.array([catalog.battery(name)["efficiency"] for name in catalog.battery_types])
+    depth_of_discharge = np.array([catalog.battery(name)["depth_of_discharge"] for name in catalog.battery_types])
+
+    cost_bound = np.inf if max_cost is None else max_cost
+    best_lolp = np.inf
+    wave_size = max(1, workers) * CHUNK_SIZE
+    evaluated = []
+    position = 0
+    while position < order.size and candidates['total_cost'][order[position]] <= cost_bound:
+        wave = order[position:position + wave_size]
+        position += wave.size
+        wave = wave[(candidates['total_cost'][wave] <= cost_bound) & (lolp_floor[wave] < best_lolp)]
+        if not wave.size:
+            continue
+
+        results = _evaluate(series, {
+            'pv_kw': candidates['pv_kw'][wave],
+            'battery_kwh': candidates['battery_kwh'][wave],
+            'inverter_kw': inverter_kw[candidates['inverter'][wave]],
+            'battery_efficiency': battery_efficiency[candidates['chemistry'][wave]],
+            'depth_of_discharge': depth_of_discharge[candidates['chemistry'][wave]],
+        }, workers)
+        lolp = results['loss_of_load_probability']
+        best_lolp = min(best_lolp, lolp.min())
+        if (lolp == 0).any():
+            cost_bound = min(cost_bound, candidates['total_cost'][wave][lolp == 0].min())
+        evaluated.append((wave, results))
+
+    front = []
+    lowest_lolp = np.inf
+    if evaluated:
+        indices = np.concatenate([wave for wave, _ in evaluated])
+        results = {name: np.concatenate([part[name] for _, part in evaluated]) for name in evaluated[0][1]}
+        # Cheapest first; a point is on the front if it loses less load than everything cheaper
+        for i in np.lexsort((results['loss_of_load_probability'], candidates['total_cost'][indices])):
+            lolp = results['loss_of_load_probability'][i]
+            if lolp >= lowest_lolp:
+                continue
+            lowest_lolp = lolp
+            candidate = indices[i]
+            front.append({
+                'pv_kw': candidates['pv_kw'][candidate].item(),
+                'battery_kwh': candidates['battery_kwh'][candidate].item(),
+                'battery_type': catalog.battery_types[candidates['chemistry'][candidate]],
+                'inverter_size': catalog.inverter_sizes[candidates['inverter'][candidate]],
+                'total_cost': candidates['total_cost'][candidate].item(),
+                'loss_of_load_probability': lolp.item(),
+                'unmet_kwh': results['unmet_kwh'][i].item(),
+                'generator_fuel_cost': results['generator_fuel_cost'][i].item(),
+                'solar_fraction': results['solar_fraction'][i].item(),
+            })
+
+    recommended = next((point for point in front if point['loss_of_load_probability'] <= lolp_target), None)
+    return {
+        'front': front,
+        'recommended': recommended,
+        'lolp_target': lolp_target,
+        'candidates': int(order.size),
+        'simulated': int(sum(wave.size for wave, _ in evaluated)),
+        'catalog_version': catalog.version,
+    }
+
+
+def optimize_user_system(user_data, lolp_target=None):
+    """Run the optimizer for a calculator submission"""
+    try:
+        load = appliance_load(user_data.get('appliances'))
+        return {
+            'success': True,
+            'optimization': optimize_system(
+                daily_energy_kwh=load.daily_energy_kwh if load else float(user_data['daily_energy']),
+                location=sc.submission_location(user_data),
+                grid_hours=float(user_data.get('grid_hours', 0)),
+                load=load,
+                lolp_target=lolp_target
+            )
+        }
+    except Exception as e:
+        return {
+            'success': False,
+            'error': str(e)
+        }
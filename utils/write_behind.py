@@ -0,0 +1,363 @@
+import atexit
+import fcntl
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import uuid
+from collections import deque
+from datetime import datetime
+
+from utils import metrics
+from utils.database_pg import CALCULATOR_COLUMNS, CONTACT_COLUMNS, db_manager, oversized_fields
+from utils.db_engine import is_transient_disconnect
+
+# Off by default: saves then happen inside the request, as before
+WRITE_BEHIND_ENABLED = os.environ.get('WRITE_BEHIND_ENABLED', '0').lower() in ('1', 'true', 'yes')
+QUEUE_SIZE = int(os.environ.get('WRITE_BEHIND_QUEUE_SIZE', 10000))
+BATCH_SIZE = int(os.environ.get('WRITE_BEHIND_BATCH_SIZE', 500))
+SPOOL_DIR = os.environ.get(
+    'WRITE_BEHIND_SPOOL_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'spool')
+)
+# Without fsync a spooled save survives a process crash but not a power cut
+SPOOL_FSYNC = os.environ.get('WRITE_BEHIND_FSYNC', '0').lower() in ('1', 'true', 'yes')
+DEAD_LETTER_FILE = 'dead-letter.jsonl'
+MAX_RETRY_DELAY = 30
+SHUTDOWN_TIMEOUT = 5
+
+UPSERT_COLUMNS = {'calculator': CALCULATOR_COLUMNS, 'contact': CONTACT_COLUMNS}
+TIMESTAMP_COLUMNS = ('created_at', 'updated_at')
+
+# Spool entry recording that a lead's save of one kind went to the database
+# synchronously: saves of that kind for it spooled earlier are stale
+SYNCED = 'synced'
+
+
+def _encode(kind, values, *extra):
+    row = dict(values)
+    for column in TIMESTAMP_COLUMNS:
+        row[column] = row[column].isoformat()
+    return json.dumps([kind, row, *extra]) + '\n'
+
+
+def _decode(entry):
+    kind, row = entry
+    for column in TIMESTAMP_COLUMNS:
+        row[column] = datetime.fromisoformat(row[column])
+    return kind, row
+
+
+def _describe(error):
+    # The driver's message, without the statement and its (personal) parameters
+    return str(getattr(error, 'orig', None) or error).strip()
+
+
+class WriteBehindWriter:
+    """Saves calculator submissions and contact details from a background thread.
+
+    A save is appended to this process's spool file and put on a bounded
+    queue, and the request moves on. One worker thread per process takes
+    everything queued so far and upserts it in one transaction per kind of
+    save; while the database is unreachable it retries with backoff and the
+    queue fills up. When the queue is full, saves fall back to the
+    synchronous path, which slows requests down instead of dropping data;
+    saves of the same lead queued before are then skipped, so they cannot
+    overwrite it, and one the worker is already writing is committed before
+    the synchronous save. Any other database error splits the batch into single
+    saves, and those that still fail are appended to the dead-letter file
+    in the spool directory (one JSON ``[kind, row, error]`` per line)
+    instead of blocking the queue. Saves with text too long for its column
+    are never queued: db_manager rejects them.
+
+    The spool file is emptied whenever every save in it has been committed.
+    Spool files left behind by a process that died (their lock is free) are
+    taken over and replayed by the next process that starts a writer. The
+    upserts are idempotent, so replaying saves that were already committed
+    is harmless.
+
+    With the writer disabled every save goes straight to db_manager.
+    """
+
+    def __init__(self, enabled=WRITE_BEHIND_ENABLED, spool_dir=SPOOL_DIR,
+                 queue_size=QUEUE_SIZE, batch_size=BATCH_SIZE):
+        self.enabled = enabled
+        self.spool_dir = spool_dir
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.app = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._lock = threading.Lock()
+        # Notified when the worker has finished an attempt at writing the keys in _writing
+        self._written = threading.Condition(self._lock)
+        self._writing = set()
+        self.counts = {'enqueued': 0, 'committed': 0, 'overflow': 0, 'recovered': 0, 'dead_lettered': 0}
+        self.failed_batches = 0
+        self.pending = 0
+
+    def init_app(self, app):
+        self.app = app
+
+    def save_calculator_data(self, application_number, calculator_data):
+        if self.enabled and self._submit('calculator', db_manager.calculator_values(application_number, calculator_data)):
+            return True
+        return db_manager.save_calculator_data(application_number, calculator_data)
+
+    def save_application(self, name, email, phone, application_number):
+        if self.enabled and self._submit('contact', db_manager.contact_values(application_number, name, email, phone)):
+            return True
+        return db_manager.save_application(name, email, phone, application_number)
+
+    def _submit(self, kind, values):
+        """Spool and queue a save; False if it has to be written synchronously"""
+        if oversized_fields(values):
+            return False  # the synchronous save rejects it, and logs why
+        try:
+            self._ensure_started()
+            with self._lock:
+                # Only submitters add to the queue, and they hold the lock, so
+                # a queue that is not full now still has room below
+                if self._queue.full():
+                    self.counts['overflow'] += 1
+                    key = (kind, values['application_number'])
+                    self._synced[key] = self._sequence
+                    self._spool.write(json.dumps([SYNCED, *key]) + '\n')
+                    self._spool.flush()
+                    # The worker may have taken an older save of this lead
+                    # before the mark above; let it commit first, so the
+                    # synchronous save is the one that lands last
+                    while key in self._writing:
+                        self._written.wait()
+                    return False
+                self._spool.write(_encode(kind, values))
+                self._spool.flush()
+                if SPOOL_FSYNC:
+                    os.fsync(self._spool.fileno())
+                self._queue.put_nowait((self._sequence, kind, values))
+                self._sequence += 1
+                self.pending += 1
+                self.counts['enqueued'] += 1
+            return True
+        except Exception as e:
+            logging.error(f"Error queueing {kind} save: {str(e)}")
+            return False
+
+    def _ensure_started(self):
+        """Open the spool and start the worker once per process (gunicorn forks workers)"""
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(self.queue_size)
+            self._backlog = deque()
+            self._sequence = 0
+            self._synced = {}  # (kind, application_number) -> sequence of the first save queued after its sync save
+            self._stopping = threading.Event()
+            self._open_spool()
+            self._recover()
+            self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+            self._pid = os.getpid()
+
+    def _open_spool(self):
+        # Lock the file before giving it the name other processes look for,
+        # so it is never mistaken for an orphan
+        os.makedirs(self.spool_dir, exist_ok=True)
+        name = f'spool-{os.getpid()}-{uuid.uuid4().hex[:8]}.jsonl'
+        temporary = os.path.join(self.spool_dir, f'.{name}')
+        self._spool = open(temporary, 'a', encoding='utf-8')
+        fcntl.flock(self._spool, fcntl.LOCK_EX)
+        self._spool_path = os.path.join(self.spool_dir, name)
+        os.rename(temporary, self._spool_path)
+
+    def _recover(self):
+        """Take over spool files whose process has exited and queue their saves again"""
+        for path in sorted(glob.glob(os.path.join(self.spool_dir, 'spool-*.jsonl'))):
+            if path == self._spool_path:
+                continue
+            try:
+                orphan = open(path, encoding='utf-8')
+            except OSError:
+                continue  # already taken over by another process
+            with orphan:
+                try:
+                    fcntl.flock(orphan, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    continue  # its process is still running
+                if os.fstat(orphan.fileno()).st_nlink == 0:
+                    continue  # replayed and deleted by another process while we waited
+                lines = orphan.readlines()
+                saves = []
+                for number, line in enumerate(lines, 1):
+                    try:
+                        entry = json.loads(line)
+                        if entry[0] == SYNCED:
+                            _, kind, application_number = entry
+                            saves = [save for save in saves
+                                     if save[0] != kind or save[1]['application_number'] != application_number]
+                        else:
+                            saves.append(_decode(entry))
+                    except (ValueError, KeyError, TypeError, IndexError):
+                        # A line cut short by the crash; everything before it is intact
+                        logging.warning(f"Skipping unreadable line {number} of {path}")
+                # Copy into our own spool before deleting the orphan, so the
+                # saves are on disk somewhere at every point
+                for kind, values in saves:
+                    self._spool.write(_encode(kind, values))
+                self._spool.flush()
+                os.fsync(self._spool.fileno())
+                os.unlink(path)
+            for kind, values in saves:
+                self._backlog.append((self._sequence, kind, values))
+                self._sequence += 1
+            self.pending += len(saves)
+            self.counts['recovered'] += len(saves)
+            logging.info(f"Recovered {len(saves)} unsaved leads from {path}")
+
+    def _next_batch(self):
+        """Wait for a save, then take everything else already waiting (up to batch_size)"""
+        batch = [self._backlog.popleft() for _ in range(min(len(self._backlog), self.batch_size))]
+        while not batch:
+            try:
+                batch.append(self._queue.get(timeout=0.5))
+            except queue.Empty:
+                if self._stopping.is_set():
+                    return batch
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _latest_rows(self, batch):
+        """The saves of a batch to write, as {kind: {application_number: values}}.
+
+        updated_at is stamped now, when the rows are written, rather than
+        when they were queued or spooled: the lead rollups pick up changed
+        rows by updated_at, from where their last refresh got to. The leads
+        are marked as being written until _finish_writing.
+        """
+        now = datetime.utcnow()
+        # Saves of the same kind for the same application overwrite the same
+        # columns, so only the last one needs to be written
+        rows = {}
+        with self._lock:
+            for sequence, kind, values in batch:
+                key = (kind, values['application_number'])
+                if sequence < self._synced.get(key, -1):
+                    continue  # saved synchronously since
+                rows.setdefault(kind, {})[key[1]] = dict(values, updated_at=now)
+                self._writing.add(key)
+        return rows
+
+    def _finish_writing(self):
+        """Let synchronous saves waiting on the leads of this attempt go ahead"""
+        with self._lock:
+            self._writing.clear()
+            self._written.notify_all()
+
+    @metrics.timed('write_behind_batch')
+    def _write_batch(self, batch):
+        """Write a batch in one transaction per kind of save; returns the number of rows written"""
+        try:
+            with self.app.app_context():
+                written = 0
+                for kind, latest in self._latest_rows(batch).items():
+                    db_manager.upsert_rows(UPSERT_COLUMNS[kind], list(latest.values()))
+                    written += len(latest)
+                return written
+        finally:
+            self._finish_writing()
+
+    def _write_singly(self, batch):
+        """Write each save of a batch on its own, dead-lettering those the database rejects.
+
+        Returns the number of rows written. A lost connection is raised, so
+        the batch is retried.
+        """
+        try:
+            with self.app.app_context():
+                written = 0
+                for kind, latest in self._latest_rows(batch).items():
+                    for values in latest.values():
+                        try:
+                            db_manager.upsert_rows(UPSERT_COLUMNS[kind], [values])
+                            written += 1
+                        except Exception as e:
+                            if is_transient_disconnect(e):
+                                raise
+                            self._dead_letter(kind, values, _describe(e))
+                return written
+        finally:
+            self._finish_writing()
+
+    def _dead_letter(self, kind, values, error):
+        with open(os.path.join(self.spool_dir, DEAD_LETTER_FILE), 'a', encoding='utf-8') as dead_letters:
+            dead_letters.write(_encode(kind, values, error))
+            dead_letters.flush()
+            os.fsync(dead_letters.fileno())
+        self.counts['dead_lettered'] += 1
+        logging.error(f"Dead-lettered {kind} save for application {values['application_number']}: {error}")
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            delay = 0.5
+            singly = False
+            while True:
+                try:
+                    written = self._write_singly(batch) if singly else self._write_batch(batch)
+                    break
+                except Exception as e:
+                    self.failed_batches += 1
+                    if not singly and not is_transient_disconnect(e):
+                        # Retrying would fail the same way: find the saves at fault
+                        logging.error(f"Error writing {len(batch)} queued leads, writing them one at a time: {_describe(e)}")
+                        singly = True
+                        continue
+                    logging.error(f"Error writing {len(batch)} queued leads, retrying in {delay:g}s: {_describe(e)}")
+                    if self._stopping.wait(delay):
+                        return  # shutting down; the saves stay in the spool for the next start
+                    delay = min(delay * 2, MAX_RETRY_DELAY)
+            with self._lock:
+                self.pending -= len(batch)
+                self.counts['committed'] += written
+                if self.pending == 0:
+                    self._spool.truncate(0)
+                    self._synced.clear()
+
+    def stop(self, timeout=SHUTDOWN_TIMEOUT):
+        """Write out what is queued (for up to timeout seconds) and stop the worker"""
+        if self._pid != os.getpid():
+            return
+        self._stopping.set()
+        self._thread.join(timeout)
+        if self.pending:
+            logging.warning(f"{self.pending} queued leads left in {self._spool_path}; they are saved on the next start")
+
+    def stats(self):
+        return dict(self.counts, pending=self.pending, failed_batches=self.failed_batches)
+
+
+lead_writer = WriteBehindWriter()
+
+metrics.register_collector(
+    'solar_write_behind_pending', 'gauge', 'Queued lead saves not yet committed', (),
+    lambda: {(): lead_writer.pending})
+metrics.register_collector(
+    'solar_write_behind_saves_total', 'counter',
+    'Lead saves by outcome (committed: rows written by the worker, one per lead and kind of save in a batch; '
+    'overflow: the queue was full and the save ran synchronously; dead_lettered: rejected by the database)',
+    ('outcome',),
+    lambda: {(outcome,): count for outcome, count in lead_writer.counts.items()})
+metrics.register_collector(
+    'solar_write_behind_failed_batches_total', 'counter', 'Batch writes that failed and were retried or split', (),
+    lambda: {(): lead_writer.failed_batches})